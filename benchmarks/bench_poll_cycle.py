@@ -0,0 +1,253 @@
+"""
+Бенчмарк цикла опроса против локального fake_explorer
+
+    python benchmarks/bench_poll_cycle.py --wallets 100,10000 --chains ETH,TON
+    python benchmarks/bench_poll_cycle.py --wallets 100000 --latency-ms 50 --rate-limit 500 --error-rate 0.01
+
+Сервер fake_explorer.py запускается отдельным процессом (или задается --server),
+бот направляется на него через ETHERSCAN_API_URL / TONCENTER_API_URL. Для каждого
+размера реестр заполняется синтетическими кошельками (по одному чату на кошелек),
+первый цикл инициализирует курсоры, затем идут --cycles вызовов _check_wallets
+с этим реестром: _check_chain по всем сетям -> _prepare_notifications ->
+NotificationOutbox -> бот, который только считает сообщения.
+
+В отчете на каждый размер:
+  wallets/s     — проверенные кошельки в секунду за цикл опроса (все сети)
+  req/notif     — HTTP-запросов к API на одно уведомление
+  p50/p99       — задержка обнаружения: от появления транзакции на сервере
+                  до попадания кошелька в очередь уведомлений
+  balances/s    — пакетный запрос балансов get_wallet_balances (без кэша)
+  refused       — отказы сервера (429 и status=0) за размер
+  peak RSS      — пиковая память процесса бенчмарка
+
+Лимиты клиента по умолчанию сняты (ETHERSCAN_RATE_LIMIT и т.п.), чтобы мерить
+сам конвейер; любые переменные окружения бота можно задать явно.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.fake_explorer import add_arguments, created_at  # noqa: E402
+
+
+# Столбцы отчета: заголовок, поле строки, ширина, формат
+COLUMNS = [
+    ("wallets", "wallets", 9, "d"),
+    ("wallets/s", "wallets_per_second", 11, ".0f"),
+    ("req/notif", "requests_per_notification", 11, ".2f"),
+    ("p50 ms", "p50_ms", 9, ".0f"),
+    ("p99 ms", "p99_ms", 9, ".0f"),
+    ("notified", "notified", 10, "d"),
+    ("sent", "sent", 8, "d"),
+    ("failed", "failed", 8, "d"),
+    ("balances/s", "balances_per_second", 12, ".0f"),
+    ("refused", "refused", 9, "d"),
+    ("peak RSS MB", "peak_rss_mb", 13, ".1f"),
+]
+
+
+class CountingBot:
+    """Вместо Telegram: считает отправленные сообщения"""
+
+    def __init__(self):
+        self.sent = 0
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> None:
+        self.sent += 1
+
+
+def synthetic_address(blockchain: str, index: int) -> str:
+    if blockchain == "TON":
+        return f"0:{index + 1:064x}"
+    return f"0x{index + 1:040x}"
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдает килобайты, macOS — байты
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def server_stats(server: str, reset: bool = False) -> Dict:
+    with urllib.request.urlopen(f"{server}/stats{'?reset=1' if reset else ''}", timeout=5) as response:
+        return json.loads(response.read())
+
+
+def start_server(args: argparse.Namespace) -> tuple[subprocess.Popen, str]:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    command = [
+        sys.executable, os.path.join(ROOT, "benchmarks", "fake_explorer.py"),
+        "--port", str(port),
+        "--block-time", str(args.block_time),
+        "--activity", str(args.activity),
+        "--latency-ms", str(args.latency_ms),
+        "--jitter-ms", str(args.jitter_ms),
+        "--rate-limit", str(args.rate_limit),
+        "--error-rate", str(args.error_rate),
+        "--seed", str(args.seed),
+    ]
+    process = subprocess.Popen(command)
+    server = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 15
+    while True:
+        try:
+            server_stats(server)
+            return process, server
+        except OSError:
+            if time.monotonic() > deadline or process.poll() is not None:
+                process.terminate()
+                raise RuntimeError("fake explorer did not start")
+            time.sleep(0.1)
+
+
+def configure_environment(args: argparse.Namespace, server: str) -> None:
+    """Переменные окружения бота; заданные явно не переопределяются"""
+    evm_chains = [chain for chain in args.chains if chain != "TON"]
+    defaults = {
+        "ETHERSCAN_API_URL": f"{server}/v2/api",
+        "TONCENTER_API_URL": f"{server}/api/v2",
+        "EVM_CHAINS": ",".join(evm_chains) or "ETH",
+        "ETHERSCAN_RATE_LIMIT": "1000000",
+        "ETHERSCAN_BURST": "1000000",
+        "ETHERSCAN_DAILY_LIMIT": str(10 ** 12),
+        "ETHERSCAN_CONCURRENCY": str(args.concurrency),
+        "TONCENTER_RATE_LIMIT": "1000000",
+        "TONCENTER_BURST": "1000000",
+        "TONCENTER_DAILY_LIMIT": str(10 ** 12),
+        "TONCENTER_CONCURRENCY": str(args.concurrency),
+        "HTTP_POOL_LIMIT": str(args.concurrency * 2),
+        "HTTP_POOL_LIMIT_PER_HOST": str(args.concurrency * 2),
+        "TELEGRAM_GLOBAL_RATE": "1000000",
+        "TELEGRAM_CHAT_INTERVAL_SECONDS": "0",
+    }
+    for name, value in defaults.items():
+        os.environ.setdefault(name, value)
+
+
+async def run_cycle(notifications, bot: CountingBot, registry, latencies: List[float]):
+    """Цикл _check_wallets; отвод tap копит задержки обнаружения"""
+
+    def tap(wallet, txs) -> None:
+        now = time.time()
+        latencies.extend(now - created_at(tx.hash) for tx in txs)
+
+    return await notifications._check_wallets(bot, registry=registry, tap=tap)
+
+
+async def bench_size(args: argparse.Namespace, server: str, size: int) -> Dict:
+    from services import notifications
+    from services.registry import SubscriptionRegistry
+    from services.trackers import http_client
+
+    registry = SubscriptionRegistry()
+    for offset, chain in enumerate(args.chains):
+        for index in range(size):
+            registry.add(offset * size + index + 1, synthetic_address(chain, index), chain)
+    wallets = registry.wallets()
+
+    # Первый цикл только инициализирует курсоры
+    await run_cycle(notifications, CountingBot(), registry, [])
+    bot = CountingBot()
+    server_stats(server, reset=True)
+    requests_before = http_client.requests
+
+    latencies: List[float] = []
+    checked = notified = failed = 0
+    elapsed = 0.0
+    for _ in range(args.cycles):
+        started = time.monotonic()
+        reports = await run_cycle(notifications, bot, registry, latencies)
+        duration = time.monotonic() - started
+        elapsed += duration
+        checked += sum(report.checked for report in reports)
+        notified += sum(report.notified for report in reports)
+        failed += sum(report.failed for report in reports)
+        # Следующий цикл — не раньше, чем появится новый блок
+        await asyncio.sleep(max(0.0, args.block_time - duration))
+    poll_requests = http_client.requests - requests_before
+
+    balance_started = time.monotonic()
+    await notifications.get_wallet_balances(wallets, use_cache=False)
+    balance_elapsed = time.monotonic() - balance_started
+
+    stats = server_stats(server)
+    return {
+        "wallets": len(wallets),
+        "wallets_per_second": checked / elapsed if elapsed else 0.0,
+        "requests_per_notification": poll_requests / notified if notified else float("nan"),
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "notified": notified,
+        "sent": bot.sent,
+        "failed": failed,
+        "balances_per_second": len(wallets) / balance_elapsed if balance_elapsed else 0.0,
+        "refused": stats.get("refused", 0),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+async def run(args: argparse.Namespace, server: str) -> None:
+    from services.trackers import http_client
+
+    await http_client.start()
+    print("".join(f"{title:>{width}}" for title, _, width, _ in COLUMNS))
+    try:
+        for size in args.wallets:
+            row = await bench_size(args, server, size)
+            print("".join(f"{row[key]:>{width}{spec}}" for _, key, width, spec in COLUMNS), flush=True)
+    finally:
+        await http_client.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--wallets", default="100,10000", help="размеры через запятую: 100,10000,100000")
+    parser.add_argument("--chains", default="ETH,TON", help="TON и EVM-сети из EVM_CHAINS через запятую")
+    parser.add_argument("--cycles", type=int, default=3, help="измеряемых циклов на размер")
+    parser.add_argument("--concurrency", type=int, default=32, help="воркеров опроса на сеть")
+    parser.add_argument("--server", help="уже запущенный fake_explorer, например http://127.0.0.1:8799")
+    parser.add_argument("--log-level", default="ERROR")
+    add_arguments(parser)
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format="%(levelname)s %(name)s: %(message)s")
+    args.wallets = [int(size) for size in args.wallets.split(",")]
+    args.chains = [chain.strip().upper() for chain in args.chains.split(",") if chain.strip()]
+
+    process = None
+    server = args.server
+    if server is None:
+        process, server = start_server(args)
+    try:
+        configure_environment(args, server)
+        asyncio.run(run(args, server))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
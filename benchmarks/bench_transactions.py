@@ -0,0 +1,129 @@
+"""
+Микробенчмарк модели транзакций: словари против Transaction со __slots__
+
+    python benchmarks/bench_transactions.py --count 100000
+
+Сравниваются прежний путь (stdlib json + словарь на транзакцию) и текущий
+(json_loads с orjson, если он установлен, + Transaction): время разбора
+ответа txlist и память, которую занимают разобранные транзакции.
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from blockchain.evm_tracker import EVMWalletTracker  # noqa: E402
+from utils.network import json_loads, orjson  # noqa: E402
+
+ADDRESS = "0x742d35cc6634c0532925a3b844bc9e7595f0beb0"
+
+
+def build_payload(count: int) -> bytes:
+    """Ответ txlist Etherscan с count транзакциями"""
+    rng = random.Random(42)
+    result = []
+    for i in range(count):
+        incoming = rng.random() < 0.5
+        other = "0x" + "".join(rng.choice("0123456789abcdef") for _ in range(40))
+        result.append({
+            "blockNumber": str(19_000_000 + i // 4),
+            "timeStamp": str(1_700_000_000 + i * 3),
+            "hash": "0x" + "".join(rng.choice("0123456789abcdef") for _ in range(64)),
+            "from": other if incoming else ADDRESS,
+            "to": ADDRESS if incoming else other,
+            "value": str(rng.randrange(10 ** 21)),
+            "gas": "21000",
+            "gasPrice": str(rng.randrange(10 ** 11)),
+            "isError": "0",
+            "txreceipt_status": "1",
+            "input": "0x",
+            "confirmations": str(rng.randrange(1, 10_000)),
+        })
+    return json.dumps({"status": "1", "message": "OK", "result": result}).encode()
+
+
+def legacy_parse(tx: Dict, address: str) -> Dict:
+    """Разбор транзакции в словарь, как трекеры делали до модели Transaction"""
+    value = int(tx.get("value", 0)) / 1_000_000_000_000_000_000
+    is_incoming = tx.get("to", "").lower() == address.lower()
+    tx_status = tx.get("txreceipt_status")
+    status = "unknown" if tx_status is None else "success" if tx_status == "1" else "failed"
+    return {
+        "type": "incoming" if is_incoming else "outgoing",
+        "amount": value,
+        "from": tx.get("from", "Unknown"),
+        "to": tx.get("to", "Unknown"),
+        "timestamp": int(tx.get("timeStamp", 0)),
+        "hash": tx.get("hash", "N/A"),
+        "status": status,
+        "block_number": int(tx.get("blockNumber", 0)),
+    }
+
+
+def best_time(func: Callable[[], object], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def retained_bytes(build: Callable[[], List]) -> int:
+    """Память, которую занимает результат build() после сборки мусора"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return after - before
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    payload = build_payload(args.count)
+    tracker = EVMWalletTracker(blockchain="ETH", chain_id="1", currency="ETH", explorer_url="https://etherscan.io")
+    rows = json.loads(payload)["result"]
+
+    paths = {
+        "dict + json": lambda: [legacy_parse(tx, ADDRESS) for tx in json.loads(payload.decode())["result"]],
+        "Transaction + json": lambda: [
+            tracker._parse_transaction(tx, ADDRESS) for tx in json.loads(payload.decode())["result"]
+        ],
+        f"Transaction + {'orjson' if orjson else 'json'}": lambda: [
+            tracker._parse_transaction(tx, ADDRESS) for tx in json_loads(payload)["result"]
+        ],
+    }
+    print(f"{args.count} transactions, payload {len(payload) / 1e6:.1f} MB, orjson={'yes' if orjson else 'no'}")
+    print(f"{'path':<24}{'parse, ms':>12}{'memory, MB':>14}{'bytes/tx':>12}")
+    baseline = None
+    for name, func in paths.items():
+        elapsed = best_time(func, args.repeat)
+        model = legacy_parse if name.startswith("dict") else tracker._parse_transaction
+        memory = retained_bytes(lambda: [model(tx, ADDRESS) for tx in rows])
+        baseline = baseline or elapsed
+        print(
+            f"{name:<24}{elapsed * 1000:>12.1f}{memory / 1e6:>14.1f}{memory / args.count:>12.0f}"
+            f"   x{baseline / elapsed:.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""
+Локальный сервер, имитирующий Etherscan API v2 и toncenter API v2
+
+    python benchmarks/fake_explorer.py --port 8799 --latency-ms 40 --rate-limit 200
+
+Бот направляется на него переменными окружения:
+
+    ETHERSCAN_API_URL=http://127.0.0.1:8799/v2/api
+    TONCENTER_API_URL=http://127.0.0.1:8799/api/v2
+
+Транзакции генерируются детерминированно: каждые --block-time секунд
+появляется новый блок, и каждый адрес получает в нем перевод с вероятностью
+--activity. В хеш транзакции зашито время ее появления (первые 16 hex-цифр —
+микросекунды Unix time), по нему бенчмарк считает задержку обнаружения.
+Перегрузка провайдера имитируется задержкой ответа, token bucket на
+--rate-limit запросов/с и случайными отказами --error-rate: поровну HTTP 429
+и ответов status=0 "Max rate limit reached" (для toncenter — ok=false, code 429).
+Счетчики запросов и отказов отдает GET /stats (?reset=1 обнуляет их).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import time
+import zlib
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional
+
+from aiohttp import web
+
+# Номер блока в момент запуска сервера; истории до него нет
+BASE_BLOCK = 20_000_000
+# Шаг logical time TON между блоками
+TON_LT_PER_BLOCK = 1_000_000
+BALANCEMULTI_MAX_ADDRESSES = 20
+
+
+@dataclass
+class ExplorerOptions:
+    block_time: float = 1.0
+    activity: float = 0.05
+    latency_ms: float = 20.0
+    jitter_ms: float = 5.0
+    rate_limit: float = 0.0
+    error_rate: float = 0.0
+    seed: int = 1
+
+
+def created_at(tx_hash: str) -> float:
+    """Время появления синтетической транзакции (Unix time) по ее хешу"""
+    digits = tx_hash[2:] if tx_hash.startswith("0x") else tx_hash
+    return int(digits[:16], 16) / 1_000_000
+
+
+class FakeExplorer:
+    """Состояние сервера: часы блоков, генератор транзакций, лимиты и счетчики"""
+
+    def __init__(self, options: ExplorerOptions):
+        self.options = options
+        self.started = time.time()
+        self.stats: Counter = Counter()
+        self._rng = random.Random(options.seed)
+        self._threshold = int(options.activity * 2 ** 32)
+        self._tokens = options.rate_limit
+        self._updated_at = time.monotonic()
+        self._refusals = 0
+
+    def head(self) -> int:
+        return BASE_BLOCK + int((time.time() - self.started) / self.options.block_time)
+
+    def _digest(self, address: str, block: int) -> int:
+        return zlib.crc32(f"{self.options.seed}:{address.lower()}:{block}".encode())
+
+    def _active_blocks(self, address: str, first: int, last: int) -> Iterator[int]:
+        for block in range(max(first, BASE_BLOCK + 1), last + 1):
+            if self._digest(address, block) < self._threshold:
+                yield block
+
+    def _hash(self, address: str, block: int) -> str:
+        created_us = int((self.started + (block - BASE_BLOCK) * self.options.block_time) * 1_000_000)
+        return f"{created_us:016x}{block:016x}{zlib.crc32(address.lower().encode()):032x}"
+
+    def _balance(self, address: str) -> int:
+        return zlib.crc32(address.lower().encode()) * 10 ** 9
+
+    async def admit(self) -> Optional[str]:
+        """Задержка ответа и решение об отказе: None, "http" (429) или "body" (ошибка в теле)"""
+        self.stats["requests"] += 1
+        refused = False
+        if self.options.rate_limit > 0:
+            now = time.monotonic()
+            self._tokens = min(
+                self.options.rate_limit,
+                self._tokens + (now - self._updated_at) * self.options.rate_limit,
+            )
+            self._updated_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+            else:
+                refused = True
+        if not refused and self.options.error_rate > 0:
+            refused = self._rng.random() < self.options.error_rate
+        delay = self.options.latency_ms + self._rng.uniform(-1, 1) * self.options.jitter_ms
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        if not refused:
+            return None
+        self.stats["refused"] += 1
+        self._refusals += 1
+        return "http" if self._refusals % 2 else "body"
+
+    # --- Etherscan API v2 ---
+
+    def evm_transactions(self, address: str, first: int, last: int) -> List[Dict]:
+        head = self.head()
+        result = []
+        for block in self._active_blocks(address, first, min(last, head)):
+            digest = self._digest(address, block)
+            other = f"0x{digest:040x}"
+            incoming = digest & 1
+            result.append({
+                "blockNumber": str(block),
+                "timeStamp": str(int(self.started + (block - BASE_BLOCK) * self.options.block_time)),
+                "hash": "0x" + self._hash(address, block),
+                "from": other if incoming else address,
+                "to": address if incoming else other,
+                "value": str(digest * 10 ** 6),
+                "gas": "21000",
+                "gasPrice": "1000000000",
+                "isError": "0",
+                "txreceipt_status": "1",
+                "input": "0x",
+                "confirmations": str(head - block + 1),
+            })
+        return result
+
+    async def etherscan(self, request: web.Request) -> web.Response:
+        refusal = await self.admit()
+        if refusal == "http":
+            return web.Response(status=429, text="Too Many Requests")
+        if refusal == "body":
+            return web.json_response({"status": "0", "message": "NOTOK", "result": "Max rate limit reached"})
+
+        query = request.query
+        action = query.get("action", "")
+        self.stats[f"etherscan.{action}"] += 1
+        if action == "eth_blockNumber":
+            return web.json_response({"jsonrpc": "2.0", "id": 1, "result": hex(self.head())})
+        if action == "balance":
+            return web.json_response(
+                {"status": "1", "message": "OK", "result": str(self._balance(query.get("address", "")))}
+            )
+        if action == "balancemulti":
+            addresses = query.get("address", "").split(",")[:BALANCEMULTI_MAX_ADDRESSES]
+            return web.json_response({
+                "status": "1",
+                "message": "OK",
+                "result": [
+                    {"account": address, "balance": str(self._balance(address))} for address in addresses
+                ],
+            })
+        if action == "txlist":
+            txs = self.evm_transactions(
+                query.get("address", ""),
+                int(query.get("startblock", 0)),
+                int(query.get("endblock", 99999999)),
+            )
+            if query.get("sort") == "desc":
+                txs.reverse()
+            page, offset = int(query.get("page", 1)), int(query.get("offset", 10_000))
+            txs = txs[(page - 1) * offset:page * offset]
+            if not txs:
+                return web.json_response({"status": "0", "message": "No transactions found", "result": []})
+            return web.json_response({"status": "1", "message": "OK", "result": txs})
+        return web.json_response({"status": "0", "message": "NOTOK", "result": f"Unknown action {action}"})
+
+    # --- toncenter API v2 ---
+
+    def ton_transactions(self, params: Dict) -> List[Dict]:
+        """getTransactions: от новых к старым, lt/hash включительно, to_lt не включая"""
+        address = params.get("address", "")
+        result = []
+        for block in reversed(list(self._active_blocks(address, BASE_BLOCK + 1, self.head()))):
+            digest = self._digest(address, block)
+            other = f"0:{digest:064x}"
+            value = str(digest * 10 ** 3)
+            incoming = digest & 1
+            result.append({
+                "utime": int(self.started + (block - BASE_BLOCK) * self.options.block_time),
+                "transaction_id": {
+                    "lt": str(block * TON_LT_PER_BLOCK + digest % 1000),
+                    "hash": self._hash(address, block),
+                },
+                "in_msg": {"source": other, "destination": address, "value": value if incoming else "0"},
+                "out_msgs": [] if incoming else [{"source": address, "destination": other, "value": value}],
+            })
+        if params.get("lt"):
+            result = [tx for tx in result if int(tx["transaction_id"]["lt"]) <= int(params["lt"])]
+        if params.get("to_lt"):
+            result = [tx for tx in result if int(tx["transaction_id"]["lt"]) > int(params["to_lt"])]
+        return result[:int(params.get("limit", 10))]
+
+    def toncenter_call(self, method: str, params: Dict) -> Dict:
+        self.stats[f"toncenter.{method}"] += 1
+        if method == "getAddressBalance":
+            return {"ok": True, "result": str(self._balance(params.get("address", "")))}
+        if method == "getTransactions":
+            return {"ok": True, "result": self.ton_transactions(params)}
+        return {"ok": False, "error": f"Unknown method {method}", "code": 404}
+
+    async def toncenter(self, request: web.Request) -> web.Response:
+        refusal = await self.admit()
+        if refusal == "http":
+            return web.Response(status=429, text="Too Many Requests")
+        if refusal == "body":
+            return web.json_response({"ok": False, "error": "Ratelimit exceed", "code": 429})
+        return web.json_response(self.toncenter_call(request.match_info["method"], dict(request.query)))
+
+    async def toncenter_batch(self, request: web.Request) -> web.Response:
+        calls = await request.json()
+        refusal = await self.admit()
+        if refusal == "http":
+            return web.Response(status=429, text="Too Many Requests")
+        self.stats["toncenter.jsonRPC"] += 1
+        responses = []
+        for call in calls:
+            if refusal == "body":
+                response = {"ok": False, "error": "Ratelimit exceed", "code": 429}
+            else:
+                response = self.toncenter_call(call.get("method", ""), call.get("params") or {})
+            responses.append({**response, "jsonrpc": "2.0", "id": call.get("id")})
+        return web.json_response(responses)
+
+    async def stats_handler(self, request: web.Request) -> web.Response:
+        stats = dict(self.stats, head=self.head())
+        if request.query.get("reset"):
+            self.stats.clear()
+        return web.json_response(stats)
+
+
+def build_app(options: ExplorerOptions) -> web.Application:
+    explorer = FakeExplorer(options)
+    app = web.Application()
+    app.router.add_get("/v2/api", explorer.etherscan)
+    app.router.add_post("/api/v2/jsonRPC", explorer.toncenter_batch)
+    app.router.add_get("/api/v2/{method}", explorer.toncenter)
+    app.router.add_get("/stats", explorer.stats_handler)
+    return app
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = ExplorerOptions()
+    parser.add_argument("--block-time", type=float, default=defaults.block_time, help="секунд на блок")
+    parser.add_argument("--activity", type=float, default=defaults.activity, help="доля адресов с переводом")
+    parser.add_argument("--latency-ms", type=float, default=defaults.latency_ms)
+    parser.add_argument("--jitter-ms", type=float, default=defaults.jitter_ms)
+    parser.add_argument("--rate-limit", type=float, default=defaults.rate_limit, help="запросов/с, 0 — нет")
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate, help="доля случайных отказов")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+
+
+def options_from_args(args: argparse.Namespace) -> ExplorerOptions:
+    return ExplorerOptions(
+        block_time=args.block_time,
+        activity=args.activity,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        rate_limit=args.rate_limit,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8799)
+    add_arguments(parser)
+    args = parser.parse_args()
+    web.run_app(build_app(options_from_args(args)), host=args.host, port=args.port, print=None, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,28 @@
 """
 Пакет для работы с различными блокчейнами
 """
+from .models import Transaction
 from .ton_tracker import TONWalletTracker
+from .evm_tracker import EVMWalletTracker
 from .eth_tracker import ETHWalletTracker
 from .bsc_tracker import BSCWalletTracker
+from .sources import (
+    EVMHeadsSource,
+    PollingSource,
+    TonStreamSource,
+    TransactionEvent,
+    TransactionSource,
+)
 
-__all__ = ['TONWalletTracker', 'ETHWalletTracker', 'BSCWalletTracker']
+__all__ = [
+    'Transaction',
+    'TONWalletTracker',
+    'EVMWalletTracker',
+    'ETHWalletTracker',
+    'BSCWalletTracker',
+    'TransactionEvent',
+    'TransactionSource',
+    'PollingSource',
+    'TonStreamSource',
+    'EVMHeadsSource',
+]
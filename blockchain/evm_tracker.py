@@ -0,0 +1,449 @@
+"""
+Модуль для работы с EVM-сетями через Etherscan API v2
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.metrics import rate_limit_wait_seconds, record_provider_request
+from utils.network import (
+    HttpClient,
+    QuotaExceededError,
+    SingleFlight,
+    TokenBucketRateLimiter,
+    TTLCache,
+    read_json,
+)
+from utils.validators import address_key, is_valid_eth_address
+
+from .models import INCOMING, OUTGOING, Transaction
+
+logger = logging.getLogger(__name__)
+
+# Endpoint Etherscan API v2, общий для всех сетей
+ETHERSCAN_API_URL = "https://api.etherscan.io/v2/api"
+# Максимум адресов в одном запросе balancemulti
+BALANCEMULTI_MAX_ADDRESSES = 20
+# Размер страницы txlist при инкрементальном опросе
+TXLIST_PAGE_SIZE = 100
+# API отдает не больше page * offset = 10000 записей на один диапазон блоков
+TXLIST_MAX_RESULT_WINDOW = 10_000
+# Нативная валюта EVM-сетей считается в wei
+EVM_DECIMALS = 18
+
+def _is_rate_limited(data: object) -> bool:
+    """Etherscan сообщает о превышении лимита в теле ответа с HTTP 200"""
+    return (
+        isinstance(data, dict)
+        and data.get("status") == "0"
+        and "rate limit" in str(data.get("result", "")).lower()
+    )
+
+
+class EVMWalletTracker:
+    """Класс для отслеживания кошельков любой сети Etherscan API v2
+
+    Сеть задается параметрами chainid, валюты и эксплорера. Ключ API v2
+    общий для всех сетей, поэтому трекеры сетей с одним ключом должны
+    получать один и тот же rate_limiter.
+    """
+    
+    def __init__(
+        self,
+        blockchain: str,
+        chain_id: str,
+        currency: str,
+        explorer_url: str,
+        api_key: Optional[str] = None,
+        cache_ttl_seconds: int = 30,
+        cache_max_entries: Optional[int] = 10_000,
+        cache_max_bytes: Optional[int] = None,
+        rate_limit_min_interval: float = 0.25,
+        http_client: Optional[HttpClient] = None,
+        rate_limiter: Optional[TokenBucketRateLimiter] = None,
+        single_flight: Optional[SingleFlight] = None,
+        base_url: Optional[str] = None,
+    ):
+        # base_url переопределяется для совместимых API и локального тестового сервера
+        self.base_url = base_url or ETHERSCAN_API_URL
+        self.api_key = api_key or "YourApiKeyToken"  # Можно работать без ключа с лимитами
+        self.blockchain = blockchain
+        self.chain_id = str(chain_id)
+        self.currency = currency
+        self.explorer_url = explorer_url
+        self._http = http_client or HttpClient()
+        self._owns_http = http_client is None
+        self._balance_cache = TTLCache(cache_ttl_seconds, cache_max_entries, cache_max_bytes)
+        self._tx_cache = TTLCache(cache_ttl_seconds, cache_max_entries, cache_max_bytes)
+        self._rate_limiter = rate_limiter or TokenBucketRateLimiter(rate=1 / rate_limit_min_interval)
+        self._single_flight = single_flight or SingleFlight()
+    
+    def is_valid_address(self, address: str) -> bool:
+        """Проверка валидности адреса EVM-сети"""
+        return is_valid_eth_address(address)
+
+    async def _request_json(self, params: Dict) -> Optional[Dict]:
+        action = params.get("action", "")
+        started = time.monotonic()
+        try:
+            await self._rate_limiter.wait()
+        except QuotaExceededError as e:
+            record_provider_request("etherscan", self.blockchain, action, "quota", started)
+            logger.warning("%s API quota exceeded for %s: %s", self.blockchain, action, e)
+            return None
+        waited = time.monotonic()
+        rate_limit_wait_seconds.labels("etherscan", self.blockchain).observe(waited - started)
+        status = "error"
+        try:
+            session = await self._http.get_session()
+            async with session.get(self.base_url, params=params) as response:
+                status = str(response.status)
+                if response.status != 200:
+                    logger.warning("%s API status=%s for %s", self.blockchain, response.status, action)
+                    return None
+                data = await read_json(response)
+            if _is_rate_limited(data):
+                status = "rate_limited"
+            return data
+        finally:
+            record_provider_request("etherscan", self.blockchain, action, status, waited)
+
+    def caches(self) -> Dict[str, TTLCache]:
+        return {"balance": self._balance_cache, "transactions": self._tx_cache}
+
+    def cache_stats(self) -> Dict[str, Dict[str, int]]:
+        return {name: cache.stats() for name, cache in self.caches().items()}
+
+    async def close(self) -> None:
+        """Закрытие собственного пула соединений (общий пул закрывается владельцем)"""
+        if self._owns_http:
+            await self._http.close()
+    
+    async def get_balance(self, address: str, use_cache: bool = True) -> Optional[Dict]:
+        """Получение баланса кошелька в валюте сети"""
+        key = address_key(self.blockchain, address)
+        cache_key = ("balance", key)
+        if use_cache:
+            cached = self._balance_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        return await self._single_flight.do(
+            (self.blockchain, "balance", key),
+            lambda: self._fetch_balance(address, cache_key),
+        )
+
+    async def _fetch_balance(self, address: str, cache_key: tuple) -> Optional[Dict]:
+        try:
+            params = {
+                "chainid": self.chain_id,
+                "module": "account",
+                "action": "balance",
+                "address": address,
+                "tag": "latest",
+                "apikey": self.api_key,
+            }
+
+            data = await self._request_json(params)
+            if data and data.get("status") == "1":
+                result = self._build_balance(int(data.get("result", 0)))
+                self._balance_cache.set(cache_key, result)
+                return result
+            if data and data.get("status") == "0":
+                logger.warning("%s API error: %s", self.blockchain, data.get("message", "Unknown error"))
+        except Exception:
+            logger.exception("Ошибка получения баланса %s", self.blockchain)
+        
+        return None
+    
+    async def get_balances(
+        self, addresses: Iterable[str], use_cache: bool = True
+    ) -> Dict[str, Optional[Dict]]:
+        """Получение балансов нескольких кошельков пачками через balancemulti
+
+        Разные записи одного адреса запрашиваются один раз; в ответе каждая
+        из них остается ключом в том виде, в каком была передана.
+        """
+        balances: Dict[str, Optional[Dict]] = {}
+        # Канонический ключ -> все переданные записи этого адреса
+        missing: Dict[bytes, List[str]] = {}
+        for address in dict.fromkeys(addresses):
+            key = address_key(self.blockchain, address)
+            cached = self._balance_cache.get(("balance", key)) if use_cache else None
+            if cached is not None:
+                balances[address] = cached
+            else:
+                missing.setdefault(key, []).append(address)
+
+        unique = [aliases[0] for aliases in missing.values()]
+        batches = [
+            tuple(unique[i:i + BALANCEMULTI_MAX_ADDRESSES])
+            for i in range(0, len(unique), BALANCEMULTI_MAX_ADDRESSES)
+        ]
+        results = await asyncio.gather(
+            *(
+                self._single_flight.do(
+                    (self.blockchain, "balancemulti", batch),
+                    lambda batch=batch: self._fetch_balances(batch),
+                )
+                for batch in batches
+            )
+        )
+        for result in results:
+            balances.update(result)
+        for aliases in missing.values():
+            for alias in aliases[1:]:
+                balances[alias] = balances.get(aliases[0])
+        return balances
+
+    async def _fetch_balances(self, addresses: tuple[str, ...]) -> Dict[str, Optional[Dict]]:
+        balances: Dict[str, Optional[Dict]] = dict.fromkeys(addresses)
+        try:
+            params = {
+                "chainid": self.chain_id,
+                "module": "account",
+                "action": "balancemulti",
+                "address": ",".join(addresses),
+                "tag": "latest",
+                "apikey": self.api_key,
+            }
+
+            data = await self._request_json(params)
+            if data and data.get("status") == "1":
+                # API может вернуть адрес в другом регистре
+                by_key = {address_key(self.blockchain, address): address for address in addresses}
+                for item in data.get("result", []):
+                    key = address_key(self.blockchain, str(item.get("account", "")))
+                    address = by_key.get(key)
+                    if address is None:
+                        continue
+                    result = self._build_balance(int(item.get("balance", 0)))
+                    self._balance_cache.set(("balance", key), result)
+                    balances[address] = result
+            if data and data.get("status") == "0":
+                logger.warning("%s API error: %s", self.blockchain, data.get("message", "Unknown error"))
+        except Exception:
+            logger.exception("Ошибка получения балансов %s", self.blockchain)
+
+        return balances
+
+    def _build_balance(self, balance_wei: int) -> Dict:
+        return {
+            "balance": balance_wei / 1_000_000_000_000_000_000,
+            "currency": self.currency,
+            "balance_raw": balance_wei,
+        }
+    
+    async def get_transactions(
+        self, address: str, limit: int = 5, use_cache: bool = True
+    ) -> List[Transaction]:
+        """Получение последних транзакций"""
+        key = address_key(self.blockchain, address)
+        cache_key = ("tx", key, limit)
+        if use_cache:
+            cached = self._tx_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        return await self._single_flight.do(
+            (self.blockchain, "transactions", key, limit),
+            lambda: self._fetch_transactions(address, limit, cache_key),
+        )
+
+    async def _fetch_transactions(self, address: str, limit: int, cache_key: tuple) -> List[Transaction]:
+        transactions = []
+        try:
+            params = {
+                "chainid": self.chain_id,
+                "module": "account",
+                "action": "txlist",
+                "address": address,
+                "startblock": 0,
+                "endblock": 99999999,
+                "page": 1,
+                "offset": limit,
+                "sort": "desc",
+                "apikey": self.api_key,
+            }
+
+            data = await self._request_json(params)
+            if data and data.get("status") == "1":
+                txs = data.get("result", [])
+                owner = address.lower()
+                for tx in txs:
+                    transactions.append(self._parse_transaction(tx, owner))
+            if data and data.get("status") == "0":
+                logger.warning("%s API error: %s", self.blockchain, data.get("message", "Unknown error"))
+        
+        except Exception:
+            logger.exception("Ошибка получения транзакций %s", self.blockchain)
+        
+        result = transactions[:limit]
+        self._tx_cache.set(cache_key, result)
+        return result
+    
+    async def get_transactions_since(
+        self, address: str, last_block: int, page_size: int = TXLIST_PAGE_SIZE
+    ) -> Tuple[List[Transaction], int]:
+        """Все транзакции после блока last_block по возрастанию и новый курсор
+
+        Страницы txlist запрашиваются, пока не будут получены все новые
+        транзакции. Если опрос оборвался на середине, возвращаются только
+        полностью прочитанные блоки, а курсор указывает на последний из них.
+        """
+        return await self._single_flight.do(
+            (
+                self.blockchain,
+                "transactions_since",
+                address_key(self.blockchain, address),
+                last_block,
+                page_size,
+            ),
+            lambda: self._fetch_transactions_since(address, last_block, page_size),
+        )
+
+    async def _fetch_transactions_since(
+        self, address: str, last_block: int, page_size: int
+    ) -> Tuple[List[Transaction], int]:
+        transactions: List[Transaction] = []
+        seen_hashes: set[str] = set()
+        start_block = last_block + 1
+        page = 1
+        complete = False
+        owner = address.lower()
+        try:
+            while True:
+                params = {
+                    "chainid": self.chain_id,
+                    "module": "account",
+                    "action": "txlist",
+                    "address": address,
+                    "startblock": start_block,
+                    "endblock": 99999999,
+                    "page": page,
+                    "offset": page_size,
+                    "sort": "asc",
+                    "apikey": self.api_key,
+                }
+                data = await self._request_json(params)
+                if not data:
+                    break
+                if data.get("status") != "1":
+                    if data.get("message") == "No transactions found":
+                        complete = True
+                    else:
+                        logger.warning("%s API error: %s", self.blockchain, data.get("message", "Unknown error"))
+                    break
+
+                txs = data.get("result", [])
+                for tx in txs:
+                    parsed = self._parse_transaction(tx, owner)
+                    if parsed.hash in seen_hashes:
+                        continue
+                    seen_hashes.add(parsed.hash)
+                    transactions.append(parsed)
+
+                if len(txs) < page_size:
+                    complete = True
+                    break
+
+                page += 1
+                if page * page_size > TXLIST_MAX_RESULT_WINDOW:
+                    # Сдвигаем окно на последний блок; дубли отсекаются по хешу
+                    next_start = transactions[-1].block_number
+                    if next_start == start_block:
+                        logger.warning(
+                            "%s txlist window exhausted within block %s", self.blockchain, start_block
+                        )
+                        break
+                    start_block = next_start
+                    page = 1
+        except Exception:
+            logger.exception("Ошибка инкрементального получения транзакций %s", self.blockchain)
+
+        if not transactions:
+            return [], last_block
+        if complete:
+            return transactions, max(last_block, transactions[-1].block_number)
+
+        # Последний блок мог быть прочитан не полностью — оставляем его на следующий опрос
+        boundary = transactions[-1].block_number
+        finished = [tx for tx in transactions if tx.block_number < boundary]
+        return finished, max(last_block, boundary - 1)
+
+    async def get_block_number(self) -> Optional[int]:
+        """Номер последнего блока сети"""
+        try:
+            params = {
+                "chainid": self.chain_id,
+                "module": "proxy",
+                "action": "eth_blockNumber",
+                "apikey": self.api_key,
+            }
+            data = await self._request_json(params)
+            result = data.get("result") if data else None
+            if isinstance(result, str) and result.startswith("0x"):
+                return int(result, 16)
+            logger.warning("%s API error: %s", self.blockchain, result if data else "empty response")
+        except Exception:
+            logger.exception("Ошибка получения номера блока %s", self.blockchain)
+        return None
+
+    async def get_block(self, number: int) -> Optional[Dict]:
+        """Блок с полными транзакциями (proxy eth_getBlockByNumber)"""
+        try:
+            params = {
+                "chainid": self.chain_id,
+                "module": "proxy",
+                "action": "eth_getBlockByNumber",
+                "tag": hex(number),
+                "boolean": "true",
+                "apikey": self.api_key,
+            }
+            data = await self._request_json(params)
+            result = data.get("result") if data else None
+            if isinstance(result, dict):
+                return result
+            logger.warning("%s API error for block %s: %s", self.blockchain, number, result)
+        except Exception:
+            logger.exception("Ошибка получения блока %s", self.blockchain)
+        return None
+
+    def parse_block_transaction(self, tx: Dict, address: str, timestamp: int) -> Transaction:
+        """Транзакция из блока (статус без receipt неизвестен)"""
+        to_address = tx.get("to") or "Unknown"
+        return Transaction(
+            INCOMING if to_address.lower() == address.lower() else OUTGOING,
+            int(tx.get("value", "0x0"), 16),
+            EVM_DECIMALS,
+            tx.get("from", "Unknown"),
+            to_address,
+            timestamp,
+            tx.get("hash", "N/A"),
+            "unknown",
+            None,
+            int(tx.get("blockNumber", "0x0"), 16),
+        )
+
+    def _parse_transaction(self, tx: Dict, owner: str) -> Transaction:
+        """Транзакция txlist; owner — адрес кошелька в нижнем регистре"""
+        to_address = tx.get("to", "Unknown")
+        tx_status = tx.get("txreceipt_status")
+        status = "unknown" if tx_status is None else "success" if tx_status == "1" else "failed"
+
+        # Аргументы позиционные: на глубоких страницах именованные заметно медленнее
+        return Transaction(
+            INCOMING if to_address.lower() == owner else OUTGOING,
+            int(tx.get("value", 0)),
+            EVM_DECIMALS,
+            tx.get("from", "Unknown"),
+            to_address,
+            int(tx.get("timeStamp", 0)),
+            tx.get("hash", "N/A"),
+            status,
+            None,
+            int(tx.get("blockNumber", 0)),
+        )
+    
+    def get_explorer_link(self, address: str) -> str:
+        """Получение ссылки на explorer"""
+        return f"{self.explorer_url}/address/{address}"
@@ -0,0 +1,86 @@
+"""
+Общая модель транзакции для всех трекеров
+"""
+from __future__ import annotations
+
+from typing import Optional
+
+INCOMING = "incoming"
+OUTGOING = "outgoing"
+
+
+class Transaction:
+    """Перевод с точки зрения отслеживаемого кошелька
+
+    __slots__ вместо словаря: у записи нет __dict__ и хешированных ключей,
+    поэтому в кэшах и на глубоких страницах она занимает в несколько раз
+    меньше памяти. Сумма хранится целым числом в минимальных единицах сети
+    (нанотоны, wei) и переводится в float только при отображении.
+    Курсор опроса — lt для TON и block_number для EVM-сетей.
+    """
+
+    __slots__ = (
+        "type",
+        "amount_raw",
+        "decimals",
+        "from_address",
+        "to_address",
+        "timestamp",
+        "hash",
+        "status",
+        "lt",
+        "block_number",
+    )
+
+    def __init__(
+        self,
+        type: str,
+        amount_raw: int,
+        decimals: int,
+        from_address: str = "Unknown",
+        to_address: str = "Unknown",
+        timestamp: int = 0,
+        hash: str = "N/A",
+        status: Optional[str] = None,
+        lt: Optional[int] = None,
+        block_number: Optional[int] = None,
+    ):
+        self.type = type
+        self.amount_raw = amount_raw
+        self.decimals = decimals
+        self.from_address = from_address
+        self.to_address = to_address
+        self.timestamp = timestamp
+        self.hash = hash
+        self.status = status
+        self.lt = lt
+        self.block_number = block_number
+
+    @property
+    def amount(self) -> float:
+        return self.amount_raw / 10 ** self.decimals
+
+    @property
+    def incoming(self) -> bool:
+        return self.type == INCOMING
+
+    @property
+    def counterparty(self) -> str:
+        """Отправитель входящего перевода или получатель исходящего"""
+        return self.from_address if self.incoming else self.to_address
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Transaction):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return (
+            f"Transaction({self.type}, {self.amount_raw}e-{self.decimals}, "
+            f"hash={self.hash!r}, lt={self.lt}, block={self.block_number})"
+        )
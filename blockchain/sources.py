@@ -0,0 +1,339 @@
+"""
+Источники событий о новых транзакциях: опрос API и потоковые подписки
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional
+
+import aiohttp
+
+from utils.network import HttpClient, json_loads
+from utils.validators import address_key, evm_address_key
+
+from .models import Transaction
+
+logger = logging.getLogger(__name__)
+
+# Пауза перед переподключением потока растет вдвое до этого предела
+RECONNECT_MAX_DELAY_SECONDS = 60.0
+# Сколько пропущенных блоков догонять после переподключения к EVM-узлу
+EVM_MAX_BLOCK_GAP = 20
+
+
+@dataclass
+class TransactionEvent:
+    """Новые транзакции одного адреса в порядке возрастания"""
+    blockchain: str
+    address: str
+    transactions: List[Transaction] = field(default_factory=list)
+
+
+class TransactionSource(ABC):
+    """Источник событий о транзакциях отслеживаемых адресов
+
+    Набор адресов задается через watch() и может меняться на ходу.
+    События могут повторяться (например, после переподключения), поэтому
+    потребитель отсекает уже обработанное по собственному курсору кошелька.
+    """
+
+    def __init__(self, blockchain: str):
+        self.blockchain = blockchain
+        # Канонический ключ адреса -> адрес в том виде, в каком его передали в watch()
+        self._addresses: Dict[bytes, str] = {}
+
+    def watch(self, addresses: Iterable[str]) -> None:
+        """Замена набора отслеживаемых адресов"""
+        self._addresses = {address_key(self.blockchain, address): address for address in addresses}
+
+    @abstractmethod
+    def events(self) -> AsyncIterator[TransactionEvent]:
+        """Бесконечный поток событий; при обрыве соединения источник переподключается сам"""
+
+    async def close(self) -> None:
+        """Освобождение ресурсов источника"""
+
+
+class PollingSource(TransactionSource):
+    """Источник поверх обычного опроса трекера
+
+    Раз в interval_seconds для каждого адреса вызывается
+    tracker.get_transactions_since() с курсором, который возвращает cursor_of
+    (last_lt для TON, last_block для EVM). Адреса без курсора пропускаются.
+    """
+
+    def __init__(
+        self,
+        blockchain: str,
+        tracker,
+        cursor_of: Callable[[str], Any],
+        interval_seconds: float = 60.0,
+        concurrency: int = 1,
+    ):
+        super().__init__(blockchain)
+        self._tracker = tracker
+        self._cursor_of = cursor_of
+        self._interval = interval_seconds
+        self._concurrency = max(1, concurrency)
+
+    async def events(self) -> AsyncIterator[TransactionEvent]:
+        semaphore = asyncio.Semaphore(self._concurrency)
+
+        async def poll(address: str) -> Optional[TransactionEvent]:
+            cursor = self._cursor_of(address)
+            if cursor is None:
+                return None
+            async with semaphore:
+                try:
+                    result = await self._tracker.get_transactions_since(address, cursor)
+                except Exception:
+                    logger.exception("Failed to poll %s %s", self.blockchain, address)
+                    return None
+            if not result[0]:
+                return None
+            return TransactionEvent(self.blockchain, address, result[0])
+
+        while True:
+            started = asyncio.get_running_loop().time()
+            results = await asyncio.gather(*(poll(address) for address in list(self._addresses.values())))
+            for event in results:
+                if event is not None:
+                    yield event
+            elapsed = asyncio.get_running_loop().time() - started
+            await asyncio.sleep(max(0.0, self._interval - elapsed))
+
+
+class _WebSocketSource(TransactionSource):
+    """Общая логика потоковых источников: подключение и переподключение с паузой"""
+
+    def __init__(self, blockchain: str, url: str, http_client: HttpClient):
+        super().__init__(blockchain)
+        self._url = url
+        self._http = http_client
+        self._ws: Optional[aiohttp.ClientWebSocketResponse] = None
+        self.reconnects = 0
+
+    async def events(self) -> AsyncIterator[TransactionEvent]:
+        delay = 1.0
+        while True:
+            try:
+                session = await self._http.get_session()
+                async with session.ws_connect(self._url, heartbeat=30.0) as ws:
+                    self._ws = ws
+                    logger.info("%s stream connected to %s", self.blockchain, self._url)
+                    await self._on_connected(ws)
+                    delay = 1.0
+                    async for event in self._read(ws):
+                        yield event
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("%s stream error", self.blockchain)
+            finally:
+                self._ws = None
+            self.reconnects += 1
+            logger.warning("%s stream disconnected, reconnecting in %.0fs", self.blockchain, delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY_SECONDS)
+
+    async def close(self) -> None:
+        if self._ws is not None and not self._ws.closed:
+            await self._ws.close()
+
+    async def _on_connected(self, ws: aiohttp.ClientWebSocketResponse) -> None:
+        """Отправка подписки сразу после подключения"""
+
+    @abstractmethod
+    def _read(self, ws: aiohttp.ClientWebSocketResponse) -> AsyncIterator[TransactionEvent]:
+        """Разбор сообщений открытого соединения"""
+
+
+class TonStreamSource(_WebSocketSource):
+    """Подписка на транзакции адресов через потоковый API toncenter (websocket)
+
+    После подключения отправляется {"operation": "subscribe", "addresses": [...],
+    "types": ["transactions"]}; при изменении набора адресов подписка
+    обновляется. Транзакции приходят в формате API v3 и приводятся к формату
+    getTransactions, чтобы разбирать их тем же кодом, что и при опросе.
+    """
+
+    def __init__(self, url: str, tracker, http_client: HttpClient):
+        super().__init__("TON", url, http_client)
+        self._tracker = tracker
+        self._subscribe_id = 0
+        # Ссылки на фоновые обновления подписки, чтобы задачи не собрал сборщик мусора
+        self._subscribing: set[asyncio.Task] = set()
+
+    def watch(self, addresses: Iterable[str]) -> None:
+        super().watch(addresses)
+        if self._ws is not None and not self._ws.closed:
+            task = asyncio.get_running_loop().create_task(self._subscribe(self._ws))
+            self._subscribing.add(task)
+            task.add_done_callback(self._subscribed)
+
+    def _subscribed(self, task: asyncio.Task) -> None:
+        self._subscribing.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("TON stream subscription update failed: %r", task.exception())
+
+    async def close(self) -> None:
+        for task in list(self._subscribing):
+            task.cancel()
+        await super().close()
+
+    async def _on_connected(self, ws: aiohttp.ClientWebSocketResponse) -> None:
+        await self._subscribe(ws)
+
+    async def _subscribe(self, ws: aiohttp.ClientWebSocketResponse) -> None:
+        self._subscribe_id += 1
+        message = {
+            "operation": "subscribe",
+            "id": str(self._subscribe_id),
+            "addresses": list(self._addresses.values()),
+            "types": ["transactions"],
+        }
+        try:
+            await ws.send_json(message)
+        except Exception:
+            logger.exception("Failed to update TON stream subscription")
+
+    async def _read(self, ws: aiohttp.ClientWebSocketResponse) -> AsyncIterator[TransactionEvent]:
+        async for message in ws:
+            if message.type != aiohttp.WSMsgType.TEXT:
+                if message.type == aiohttp.WSMsgType.ERROR:
+                    break
+                continue
+            data = json_loads(message.data)
+            if data.get("type") != "transactions":
+                continue
+            address_book = data.get("address_book", {})
+            by_account: Dict[str, List[Transaction]] = {}
+            for tx in data.get("transactions", []):
+                # account приходит в raw-форме 0:hex; ключ у нее тот же, что у EQ/UQ
+                address = self._addresses.get(address_key("TON", tx.get("account", "")))
+                if address is None:
+                    continue
+                by_account.setdefault(address, []).extend(
+                    self._tracker._parse_transaction(self._to_v2(tx, address_book))
+                )
+            for address, transactions in by_account.items():
+                transactions.sort(key=lambda tx: tx.lt)
+                yield TransactionEvent("TON", address, transactions)
+
+    @staticmethod
+    def _friendly(address: str, address_book: Dict[str, Dict]) -> str:
+        return address_book.get(address, {}).get("user_friendly", address)
+
+    @classmethod
+    def _to_v2(cls, tx: Dict, address_book: Dict[str, Dict]) -> Dict:
+        """Транзакция API v3 в формате getTransactions API v2"""
+        def message(msg: Optional[Dict]) -> Dict:
+            msg = msg or {}
+            return {
+                "source": cls._friendly(msg.get("source") or "", address_book) or "Unknown",
+                "destination": cls._friendly(msg.get("destination") or "", address_book) or "Unknown",
+                "value": msg.get("value") or "0",
+            }
+
+        return {
+            "utime": tx.get("now", 0),
+            "transaction_id": {"lt": tx.get("lt", 0), "hash": tx.get("hash", "N/A")},
+            "in_msg": message(tx.get("in_msg")),
+            "out_msgs": [message(msg) for msg in tx.get("out_msgs", [])],
+        }
+
+
+class EVMHeadsSource(_WebSocketSource):
+    """Подписка eth_subscribe("newHeads") на websocket JSON-RPC узла EVM-сети
+
+    По каждому новому заголовку блок с полными транзакциями запрашивается
+    через тот же сокет (eth_getBlockByNumber), а поля from/to сверяются с
+    набором отслеживаемых адресов. Блоки, пропущенные за время
+    переподключения, догоняются (не более EVM_MAX_BLOCK_GAP).
+    """
+
+    def __init__(self, blockchain: str, url: str, tracker, http_client: HttpClient):
+        super().__init__(blockchain, url, http_client)
+        self._tracker = tracker
+        self._request_id = 0
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._last_block: Optional[int] = None
+
+    async def _call(self, ws: aiohttp.ClientWebSocketResponse, method: str, params: List) -> Any:
+        self._request_id += 1
+        request_id = self._request_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            await ws.send_json({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params})
+            return await future
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def _read(self, ws: aiohttp.ClientWebSocketResponse) -> AsyncIterator[TransactionEvent]:
+        heads: asyncio.Queue = asyncio.Queue()
+        reader = asyncio.create_task(self._dispatch(ws, heads))
+        try:
+            await self._call(ws, "eth_subscribe", ["newHeads"])
+            while True:
+                head = await heads.get()
+                if head is None:
+                    break
+                number = int(head.get("number", "0x0"), 16)
+                first = number if self._last_block is None else self._last_block + 1
+                first = max(first, number - EVM_MAX_BLOCK_GAP + 1)
+                for block_number in range(first, number + 1):
+                    block = await self._call(ws, "eth_getBlockByNumber", [hex(block_number), True])
+                    if block:
+                        for event in self._match_block(block):
+                            yield event
+                    self._last_block = block_number
+        finally:
+            reader.cancel()
+            await asyncio.gather(reader, return_exceptions=True)
+
+    async def _dispatch(self, ws: aiohttp.ClientWebSocketResponse, heads: asyncio.Queue) -> None:
+        """Раздача ответов на запросы и постановка заголовков блоков в очередь"""
+        try:
+            async for message in ws:
+                if message.type != aiohttp.WSMsgType.TEXT:
+                    if message.type == aiohttp.WSMsgType.ERROR:
+                        break
+                    continue
+                data = json_loads(message.data)
+                if data.get("method") == "eth_subscription":
+                    await heads.put(data.get("params", {}).get("result", {}))
+                    continue
+                future = self._pending.get(data.get("id"))
+                if future is None or future.done():
+                    continue
+                if "error" in data:
+                    future.set_exception(RuntimeError(str(data["error"])))
+                else:
+                    future.set_result(data.get("result"))
+        finally:
+            # Ожидающие ответа запросы завершаются ошибкой, чтобы сработало переподключение
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("websocket closed"))
+            await heads.put(None)
+
+    def _match_block(self, block: Dict) -> List[TransactionEvent]:
+        timestamp = int(block.get("timestamp", "0x0"), 16)
+        matched: Dict[str, List[Transaction]] = {}
+        for tx in block.get("transactions", []):
+            if not isinstance(tx, dict):
+                continue
+            for party in {evm_address_key(tx.get("from") or ""), evm_address_key(tx.get("to") or "")}:
+                address = self._addresses.get(party)
+                if address is not None:
+                    matched.setdefault(address, []).append(
+                        self._tracker.parse_block_transaction(tx, address, timestamp)
+                    )
+        return [
+            TransactionEvent(self.blockchain, address, transactions)
+            for address, transactions in matched.items()
+        ]
@@ -1,25 +1,143 @@
 """
 Модуль для работы с TON blockchain через Tonscan API
 """
-import aiohttp
+import asyncio
 import logging
-from typing import Dict, List, Optional
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
 
-from utils.network import AsyncRateLimiter, TTLCache
-from utils.validators import is_valid_ton_address
+from utils.metrics import rate_limit_wait_seconds, record_provider_request
+from utils.network import (
+    HttpClient,
+    QuotaExceededError,
+    SingleFlight,
+    TokenBucketRateLimiter,
+    TTLCache,
+    read_json,
+)
+from utils.validators import address_key, is_valid_ton_address
+
+from .models import INCOMING, OUTGOING, Transaction
 
 logger = logging.getLogger(__name__)
 
+# HTTP API v2 toncenter
+TONCENTER_API_URL = "https://toncenter.com/api/v2"
+# Размер страницы getTransactions при инкрементальном опросе
+TX_PAGE_SIZE = 50
+# Ограничение глубины: при большем разрыве старые транзакции пропускаются
+TX_MAX_PAGES = 40
+# Суммы TON приходят в нанотонах
+TON_DECIMALS = 9
+
+
+def _is_rate_limited(data: object) -> bool:
+    """toncenter отвечает на превышение лимита ok=false с кодом 429"""
+    return isinstance(data, dict) and data.get("ok") is False and data.get("code") == 429
+
+
+class JsonRpcBatcher:
+    """Сбор вызовов toncenter в пакетные JSON-RPC запросы
+
+    Вызовы, пришедшие в течение окна window_seconds (или пока не набрано
+    max_batch_size), уходят одним запросом; каждый вызывающий получает свой ответ.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[List[Dict]], Awaitable[Optional[List[Dict]]]],
+        window_seconds: float = 0.05,
+        max_batch_size: int = 20,
+    ):
+        self._send = send
+        self._window_seconds = window_seconds
+        self._max_batch_size = max_batch_size
+        self._pending: List[tuple[Dict, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._dispatching: set[asyncio.Task] = set()
+        self._next_id = 0
+        self.calls = 0
+        self.batches = 0
+
+    async def call(self, method: str, params: Dict[str, Any]) -> Optional[Dict]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._next_id += 1
+        request = {"jsonrpc": "2.0", "id": self._next_id, "method": method, "params": params}
+        self._pending.append((request, future))
+        self.calls += 1
+        if len(self._pending) >= self._max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self._window_seconds, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        self.batches += 1
+        task = asyncio.create_task(self._dispatch(batch))
+        self._dispatching.add(task)
+        task.add_done_callback(self._dispatching.discard)
+
+    async def _dispatch(self, batch: List[tuple[Dict, asyncio.Future]]) -> None:
+        try:
+            responses = await self._send([request for request, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        by_id = {
+            response.get("id"): response
+            for response in responses or []
+            if isinstance(response, dict)
+        }
+        for request, future in batch:
+            if not future.done():
+                future.set_result(by_id.get(request["id"]))
+
+    def stats(self) -> Dict[str, int]:
+        return {"calls": self.calls, "batches": self.batches}
+
+
 class TONWalletTracker:
     """Класс для отслеживания TON кошельков"""
     
-    def __init__(self, cache_ttl_seconds: int = 30, rate_limit_min_interval: float = 0.25):
-        self.base_url = "https://toncenter.com/api/v2"
+    def __init__(
+        self,
+        cache_ttl_seconds: int = 30,
+        cache_max_entries: Optional[int] = 10_000,
+        cache_max_bytes: Optional[int] = None,
+        rate_limit_min_interval: float = 0.25,
+        http_client: Optional[HttpClient] = None,
+        rate_limiter: Optional[TokenBucketRateLimiter] = None,
+        single_flight: Optional[SingleFlight] = None,
+        batch_window_seconds: float = 0.05,
+        batch_max_size: int = 1,
+        base_url: Optional[str] = None,
+    ):
+        self.base_url = base_url or TONCENTER_API_URL
         self.explorer_url = "https://tonscan.org"
-        self._timeout = aiohttp.ClientTimeout(total=10)
-        self._balance_cache = TTLCache(cache_ttl_seconds)
-        self._tx_cache = TTLCache(cache_ttl_seconds)
-        self._rate_limiter = AsyncRateLimiter(rate_limit_min_interval)
+        self._http = http_client or HttpClient()
+        self._owns_http = http_client is None
+        self._balance_cache = TTLCache(cache_ttl_seconds, cache_max_entries, cache_max_bytes)
+        self._tx_cache = TTLCache(cache_ttl_seconds, cache_max_entries, cache_max_bytes)
+        self._rate_limiter = rate_limiter or TokenBucketRateLimiter(rate=1 / rate_limit_min_interval)
+        self._single_flight = single_flight or SingleFlight()
+        # batch_max_size=1 отключает пакетную отправку: каждый вызов идет отдельным GET
+        self._batcher: Optional[JsonRpcBatcher] = None
+        if batch_max_size > 1:
+            self._batcher = JsonRpcBatcher(
+                self._send_batch,
+                window_seconds=batch_window_seconds,
+                max_batch_size=batch_max_size,
+            )
     
     def is_valid_address(self, address: str) -> bool:
         """Проверка валидности TON адреса"""
@@ -27,22 +145,89 @@ class TONWalletTracker:
         return is_valid_ton_address(address)
 
     async def _request_json(self, endpoint: str, params: Dict) -> Optional[Dict]:
-        await self._rate_limiter.wait()
-        url = f"{self.base_url}/{endpoint}"
-        async with aiohttp.ClientSession(timeout=self._timeout) as session:
+        if self._batcher is not None:
+            return await self._batcher.call(endpoint, params)
+        started = time.monotonic()
+        try:
+            await self._rate_limiter.wait()
+        except QuotaExceededError as e:
+            record_provider_request("toncenter", "TON", endpoint, "quota", started)
+            logger.warning("TON API quota exceeded for %s: %s", endpoint, e)
+            return None
+        waited = time.monotonic()
+        rate_limit_wait_seconds.labels("toncenter", "TON").observe(waited - started)
+        status = "error"
+        try:
+            url = f"{self.base_url}/{endpoint}"
+            session = await self._http.get_session()
             async with session.get(url, params=params) as response:
+                status = str(response.status)
                 if response.status != 200:
                     logger.warning("TON API status=%s for %s", response.status, endpoint)
                     return None
-                return await response.json()
+                data = await read_json(response)
+            if _is_rate_limited(data):
+                status = "rate_limited"
+            return data
+        finally:
+            record_provider_request("toncenter", "TON", endpoint, status, waited)
+
+    async def _send_batch(self, requests: List[Dict]) -> Optional[List[Dict]]:
+        started = time.monotonic()
+        try:
+            await self._rate_limiter.wait()
+        except QuotaExceededError as e:
+            record_provider_request("toncenter", "TON", "jsonRPC", "quota", started)
+            logger.warning("TON API quota exceeded for jsonRPC batch: %s", e)
+            return None
+        waited = time.monotonic()
+        rate_limit_wait_seconds.labels("toncenter", "TON").observe(waited - started)
+        status = "error"
+        try:
+            session = await self._http.get_session()
+            async with session.post(f"{self.base_url}/jsonRPC", json=requests) as response:
+                status = str(response.status)
+                if response.status != 200:
+                    logger.warning("TON API status=%s for jsonRPC batch of %s", response.status, len(requests))
+                    return None
+                data = await read_json(response)
+            if not isinstance(data, list):
+                logger.warning("TON API returned non-batch jsonRPC response: %s", data)
+                return None
+            if any(_is_rate_limited(response) for response in data):
+                status = "rate_limited"
+            return data
+        finally:
+            record_provider_request("toncenter", "TON", "jsonRPC", status, waited)
+
+    def batch_stats(self) -> Dict[str, int]:
+        return self._batcher.stats() if self._batcher is not None else {}
+
+    def caches(self) -> Dict[str, TTLCache]:
+        return {"balance": self._balance_cache, "transactions": self._tx_cache}
+
+    def cache_stats(self) -> Dict[str, Dict[str, int]]:
+        return {name: cache.stats() for name, cache in self.caches().items()}
+
+    async def close(self) -> None:
+        """Закрытие собственного пула соединений (общий пул закрывается владельцем)"""
+        if self._owns_http:
+            await self._http.close()
     
     async def get_balance(self, address: str, use_cache: bool = True) -> Optional[Dict]:
         """Получение баланса TON кошелька"""
-        cache_key = f"balance:{address}"
+        key = address_key("TON", address)
+        cache_key = ("balance", key)
         if use_cache:
             cached = self._balance_cache.get(cache_key)
             if cached is not None:
                 return cached
+        return await self._single_flight.do(
+            ("TON", "balance", key),
+            lambda: self._fetch_balance(address, cache_key),
+        )
+
+    async def _fetch_balance(self, address: str, cache_key: tuple) -> Optional[Dict]:
         try:
             params = {"address": address}
             data = await self._request_json("getAddressBalance", params)
@@ -62,17 +247,33 @@ class TONWalletTracker:
         
         return None
     
+    async def get_balances(
+        self, addresses: Iterable[str], use_cache: bool = True
+    ) -> Dict[str, Optional[Dict]]:
+        """Получение балансов нескольких кошельков (с батчингом — одним JSON-RPC запросом)"""
+        unique = list(dict.fromkeys(addresses))
+        results = await asyncio.gather(
+            *(self.get_balance(address, use_cache=use_cache) for address in unique)
+        )
+        return dict(zip(unique, results))
+    
     async def get_transactions(
         self, address: str, limit: int = 5, use_cache: bool = True
-    ) -> List[Dict]:
+    ) -> List[Transaction]:
         """Получение последних транзакций"""
-        transactions = []
-        cache_key = f"tx:{address}:{limit}"
+        key = address_key("TON", address)
+        cache_key = ("tx", key, limit)
         if use_cache:
             cached = self._tx_cache.get(cache_key)
             if cached is not None:
                 return cached
-        
+        return await self._single_flight.do(
+            ("TON", "transactions", key, limit),
+            lambda: self._fetch_transactions(address, limit, cache_key),
+        )
+
+    async def _fetch_transactions(self, address: str, limit: int, cache_key: tuple) -> List[Transaction]:
+        transactions = []
         try:
             params = {"address": address, "limit": limit}
             data = await self._request_json("getTransactions", params)
@@ -80,35 +281,7 @@ class TONWalletTracker:
                 txs = data.get("result", [])
 
                 for tx in txs:
-                    in_msg = tx.get("in_msg", {})
-                    out_msgs = tx.get("out_msgs", [])
-
-                    # Входящая транзакция
-                    if in_msg.get("value"):
-                        value = int(in_msg.get("value", 0)) / 1_000_000_000
-                        transactions.append(
-                            {
-                                "type": "incoming",
-                                "amount": value,
-                                "from": in_msg.get("source", "Unknown"),
-                                "timestamp": tx.get("utime", 0),
-                                "hash": tx.get("transaction_id", {}).get("hash", "N/A"),
-                            }
-                        )
-
-                    # Исходящие транзакции
-                    for out_msg in out_msgs:
-                        if out_msg.get("value"):
-                            value = int(out_msg.get("value", 0)) / 1_000_000_000
-                            transactions.append(
-                                {
-                                    "type": "outgoing",
-                                    "amount": value,
-                                    "to": out_msg.get("destination", "Unknown"),
-                                    "timestamp": tx.get("utime", 0),
-                                    "hash": tx.get("transaction_id", {}).get("hash", "N/A"),
-                                }
-                            )
+                    transactions.extend(self._parse_transaction(tx))
         
         except Exception:
             logger.exception("Ошибка получения транзакций TON")
@@ -117,6 +290,119 @@ class TONWalletTracker:
         self._tx_cache.set(cache_key, result)
         return result
     
+    async def get_transactions_since(
+        self, address: str, last_lt: Optional[int], page_size: int = TX_PAGE_SIZE
+    ) -> Tuple[List[Transaction], Optional[int], Optional[str]]:
+        """Транзакции с logical time больше last_lt по возрастанию и новый курсор (lt, hash)
+
+        Страницы запрашиваются от новых к старым по (lt, hash), пока не будет
+        достигнут сохраненный курсор. При last_lt=None только определяется
+        курсор последней транзакции (0, если транзакций еще нет).
+        Если опрос оборвался, курсор не сдвигается и новые транзакции
+        будут запрошены повторно.
+        """
+        return await self._single_flight.do(
+            ("TON", "transactions_since", address_key("TON", address), last_lt, page_size),
+            lambda: self._fetch_transactions_since(address, last_lt, page_size),
+        )
+
+    async def _fetch_transactions_since(
+        self, address: str, last_lt: Optional[int], page_size: int
+    ) -> Tuple[List[Transaction], Optional[int], Optional[str]]:
+        limit = 1 if last_lt is None else page_size
+        params: Dict[str, Any] = {"address": address, "limit": limit}
+        if last_lt:
+            params["to_lt"] = last_lt
+
+        new_raw: List[Dict] = []
+        seen: set[Tuple[int, str]] = set()
+        complete = False
+        try:
+            for _ in range(TX_MAX_PAGES):
+                data = await self._request_json("getTransactions", params)
+                if not data or not data.get("ok"):
+                    break
+                txs = data.get("result", [])
+                for tx in txs:
+                    tx_id = self._transaction_id(tx)
+                    if tx_id in seen:
+                        continue
+                    if last_lt is not None and tx_id[0] <= last_lt:
+                        complete = True
+                        break
+                    seen.add(tx_id)
+                    new_raw.append(tx)
+                if complete or last_lt is None or len(txs) < page_size:
+                    complete = True
+                    break
+                # Следующая страница начинается с последней полученной транзакции включительно
+                params["lt"], params["hash"] = self._transaction_id(txs[-1])
+            else:
+                logger.warning(
+                    "TON history gap for %s: more than %s pages since lt=%s",
+                    address, TX_MAX_PAGES, last_lt,
+                )
+                complete = True
+        except Exception:
+            logger.exception("Ошибка инкрементального получения транзакций TON")
+
+        if not complete:
+            return [], last_lt, None
+        if not new_raw:
+            return [], last_lt if last_lt is not None else 0, None
+
+        newest_lt, newest_hash = self._transaction_id(new_raw[0])
+        if last_lt is None:
+            return [], newest_lt, newest_hash
+
+        transactions: List[Transaction] = []
+        for tx in reversed(new_raw):
+            transactions.extend(self._parse_transaction(tx))
+        return transactions, newest_lt, newest_hash
+
+    @staticmethod
+    def _transaction_id(tx: Dict) -> Tuple[int, str]:
+        tx_id = tx.get("transaction_id", {})
+        return int(tx_id.get("lt", 0)), tx_id.get("hash", "N/A")
+
+    def _parse_transaction(self, tx: Dict) -> List[Transaction]:
+        """Разбор транзакции TON на входящий и исходящие переводы"""
+        transactions = []
+        in_msg = tx.get("in_msg", {})
+        out_msgs = tx.get("out_msgs", [])
+        lt, tx_hash = self._transaction_id(tx)
+        timestamp = tx.get("utime", 0)
+
+        # Входящая транзакция
+        if in_msg.get("value"):
+            transactions.append(
+                Transaction(
+                    type=INCOMING,
+                    amount_raw=int(in_msg.get("value", 0)),
+                    decimals=TON_DECIMALS,
+                    from_address=in_msg.get("source", "Unknown"),
+                    timestamp=timestamp,
+                    hash=tx_hash,
+                    lt=lt,
+                )
+            )
+
+        # Исходящие транзакции
+        for out_msg in out_msgs:
+            if out_msg.get("value"):
+                transactions.append(
+                    Transaction(
+                        type=OUTGOING,
+                        amount_raw=int(out_msg.get("value", 0)),
+                        decimals=TON_DECIMALS,
+                        to_address=out_msg.get("destination", "Unknown"),
+                        timestamp=timestamp,
+                        hash=tx_hash,
+                        lt=lt,
+                    )
+                )
+        return transactions
+    
     def get_explorer_link(self, address: str) -> str:
         """Получение ссылки на explorer"""
         return f"{self.explorer_url}/address/{address}"
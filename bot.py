@@ -4,13 +4,20 @@
 import asyncio
 import logging
 import os
+import signal
 from logging.handlers import RotatingFileHandler
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
 
 from config import config
 from handlers import router
-from services.notifications import monitor_wallets
+from services.notifications import (
+    keep_tracked_wallets_in_sync,
+    lead_monitoring,
+    load_tracked_wallets,
+)
+from services.state import LeaderElection, build_state_backend
+from services.trackers import cache_sweeper, http_client, single_flight, ton_tracker, trackers
+from services.web_server import HealthState, build_health_app, build_webhook_app, start_site
 
 # Настройка логирования
 log_level = getattr(logging, config.log_level.upper(), logging.INFO)
@@ -28,22 +35,60 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 notification_task: asyncio.Task | None = None
+sync_task: asyncio.Task | None = None
+state_backend = build_state_backend()
+# Опрос сетей ведет одна реплика на шард; с локальным хранилищем аренда всегда своя
+leader_election = LeaderElection(
+    state_backend,
+    "monitor" if config.replica_shards <= 1 else f"monitor:{config.replica_shard}/{config.replica_shards}",
+    config.leader_lease_seconds,
+)
+health = HealthState()
+health.add_detail("mode", lambda: config.bot_mode)
+health.add_detail("leader", lambda: leader_election.is_leader)
 
 
-async def on_startup(bot: Bot):
-    global notification_task
+async def on_startup(bot: Bot, dispatcher: Dispatcher):
+    global notification_task, sync_task
+    await http_client.start()
+    cache_sweeper.start()
+    await state_backend.open()
+    await load_tracked_wallets(state_backend)
+    if state_backend.shared:
+        sync_task = asyncio.create_task(
+            keep_tracked_wallets_in_sync(config.state_sync_interval_seconds)
+        )
     notification_task = asyncio.create_task(
-        monitor_wallets(bot, config.notify_interval_seconds)
+        lead_monitoring(bot, config.notify_interval_seconds, leader_election)
     )
+    if config.bot_mode == "webhook":
+        # Секрет проверяется на каждом запросе: чужие POST на WEBHOOK_PATH получают 401
+        await bot.set_webhook(
+            config.webhook_url.rstrip("/") + config.webhook_path,
+            secret_token=config.webhook_secret,
+            max_connections=config.webhook_max_connections,
+            allowed_updates=dispatcher.resolve_used_update_types(),
+        )
+    health.ready = True
 
 
 async def on_shutdown(bot: Bot):
-    if notification_task:
-        notification_task.cancel()
-        try:
-            await notification_task
-        except asyncio.CancelledError:
-            pass
+    health.ready = False
+    for task in (notification_task, sync_task):
+        if task:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+    await state_backend.close()
+    logger.info("HTTP pool stats: %s", http_client.stats())
+    logger.info("Single-flight stats: %s", single_flight.stats())
+    logger.info("TON jsonRPC batch stats: %s", ton_tracker.batch_stats())
+    for blockchain, tracker in trackers.items():
+        logger.info("%s cache stats: %s", blockchain, tracker.cache_stats())
+    await cache_sweeper.stop()
+    await http_client.close()
 
 async def main():
     """Основная функция запуска бота"""
@@ -57,7 +102,7 @@ async def main():
     
     # Инициализация бота и диспетчера
     bot = Bot(token=config.bot_token)
-    dp = Dispatcher(storage=MemoryStorage())
+    dp = Dispatcher(storage=state_backend.fsm_storage())
     
     # Регистрация роутеров
     dp.include_router(router)
@@ -68,14 +113,62 @@ async def main():
     logger.info("Нажмите Ctrl+C для остановки")
     
     try:
-        # Запуск polling
-        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+        if config.bot_mode == "webhook":
+            await run_webhook(dp, bot)
+        else:
+            await run_polling(dp, bot)
     except Exception as e:
         logger.error(f"Ошибка при работе бота: {e}")
     finally:
         await bot.session.close()
         logger.info("👋 Бот остановлен")
 
+
+async def run_polling(dp: Dispatcher, bot: Bot):
+    """Long polling; при заданном HEALTH_PORT рядом работают /healthz и /readyz"""
+    health_runner = None
+    if config.health_port:
+        health_runner = await start_site(build_health_app(health), config.webhook_host, config.health_port)
+    try:
+        # Вебхук, оставшийся от запуска в режиме webhook, не дал бы получать обновления
+        await bot.delete_webhook()
+        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+    finally:
+        if health_runner is not None:
+            await health_runner.cleanup()
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot):
+    """Прием обновлений на aiohttp-сервере до SIGINT/SIGTERM
+
+    При остановке сначала снимается готовность и закрывается порт, затем
+    дорабатываются начатые обновления и только после этого выполняется
+    on_shutdown. Вебхук у Telegram не удаляется: обновления, пришедшие
+    во время перезапуска, дождутся следующего процесса или другой реплики.
+    """
+    app = build_webhook_app(
+        dp,
+        bot,
+        health,
+        path=config.webhook_path,
+        secret_token=config.webhook_secret,
+        max_concurrent_updates=config.webhook_max_concurrent_updates,
+        shutdown_timeout=config.shutdown_timeout_seconds,
+    )
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    runner = await start_site(app, config.webhook_host, config.webhook_port)
+    try:
+        await stop.wait()
+        logger.info("Stopping webhook server")
+        health.ready = False
+    finally:
+        await runner.cleanup()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.remove_signal_handler(sig)
+
 if __name__ == "__main__":
     try:
         asyncio.run(main())
@@ -1,6 +1,7 @@
 """
 Конфигурация бота для загрузки переменных окружения
 """
+import math
 import os
 from dotenv import load_dotenv
 from dataclasses import dataclass
@@ -28,28 +29,248 @@ def _get_float_env(name: str, default: float) -> float:
         return default
 
 
+def _get_optional_int_env(name: str) -> int | None:
+    value = os.getenv(name)
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+@dataclass
+class ProviderQuota:
+    """Квота API провайдера: запросов в секунду, размер всплеска, суточный лимит
+    и число параллельных воркеров опроса"""
+    rate: float
+    burst: int
+    daily_limit: int | None
+    concurrency: int
+
+    @classmethod
+    def from_env(cls, prefix: str, default_rate: float, default_burst: int):
+        rate = _get_float_env(f'{prefix}_RATE_LIMIT', default_rate)
+        burst = _get_int_env(f'{prefix}_BURST', default_burst)
+        return cls(
+            rate=rate,
+            burst=burst,
+            daily_limit=_get_optional_int_env(f'{prefix}_DAILY_LIMIT'),
+            # По умолчанию столько воркеров, сколько запросов квота дает за секунду
+            concurrency=_get_int_env(f'{prefix}_CONCURRENCY', max(1, math.ceil(rate), burst)),
+        )
+
+    def split(self, parts: int) -> "ProviderQuota":
+        """Доля квоты для одного из parts процессов, работающих с тем же ключом API"""
+        parts = max(1, parts)
+        return ProviderQuota(
+            rate=self.rate / parts,
+            burst=max(1, self.burst // parts),
+            daily_limit=self.daily_limit // parts if self.daily_limit is not None else None,
+            concurrency=max(1, math.ceil(self.concurrency / parts)),
+        )
+
+
+# Сети Etherscan API v2: идентификатор в боте -> (chainid, название, валюта, эксплорер, префикс переменных)
+KNOWN_EVM_CHAINS = {
+    "ETH": ("1", "Ethereum", "ETH", "https://etherscan.io", "ETH"),
+    "BNB": ("56", "BSC", "BNB", "https://bscscan.com", "BSC"),
+    "POL": ("137", "Polygon", "POL", "https://polygonscan.com", "POLYGON"),
+    "ARB": ("42161", "Arbitrum", "ETH", "https://arbiscan.io", "ARBITRUM"),
+    "OP": ("10", "Optimism", "ETH", "https://optimistic.etherscan.io", "OPTIMISM"),
+    "BASE": ("8453", "Base", "ETH", "https://basescan.org", "BASE"),
+}
+# Отдельные ключи обозревателей времен API v1; без них сеть работает с ETHERSCAN_API_KEY
+LEGACY_EVM_KEY_PREFIXES = {"BNB": "BSCSCAN"}
+
+
+@dataclass
+class EVMChain:
+    """EVM-сеть, доступная через Etherscan API v2
+
+    Сети с одним ключом API делят его квоту: у них одинаковые api_key и quota.
+    """
+    blockchain: str
+    chain_id: str
+    name: str
+    currency: str
+    explorer_url: str
+    api_key: str | None
+    quota: ProviderQuota
+    monitor_mode: str
+    ws_url: str | None
+
+
+def _load_evm_chains(
+    names: list[str], etherscan_api_key: str | None, etherscan_quota: ProviderQuota, default_rate: float
+) -> list[EVMChain]:
+    """Сети из EVM_CHAINS; неизвестную сеть можно описать как EVM_CHAIN_<ID>=chainid,валюта,эксплорер,название"""
+    chains = []
+    for blockchain in names:
+        custom = os.getenv(f'EVM_CHAIN_{blockchain}')
+        if custom:
+            chain_id, currency, explorer_url, *name = [part.strip() for part in custom.split(',')]
+            spec = (chain_id, name[0] if name else blockchain, currency, explorer_url, blockchain)
+        else:
+            spec = KNOWN_EVM_CHAINS.get(blockchain)
+        if spec is None:
+            continue
+        chain_id, name, currency, explorer_url, env_prefix = spec
+        api_key, quota = etherscan_api_key, etherscan_quota
+        legacy_prefix = LEGACY_EVM_KEY_PREFIXES.get(blockchain)
+        if legacy_prefix and os.getenv(f'{legacy_prefix}_API_KEY'):
+            api_key = os.getenv(f'{legacy_prefix}_API_KEY')
+            quota = ProviderQuota.from_env(legacy_prefix, default_rate, 5)
+        chains.append(EVMChain(
+            blockchain=blockchain,
+            chain_id=chain_id,
+            name=name,
+            currency=currency,
+            explorer_url=explorer_url,
+            api_key=api_key,
+            quota=quota,
+            # "poll", "blocks" или "stream", как у ETH_MONITOR_MODE
+            monitor_mode=os.getenv(f'{env_prefix}_MONITOR_MODE', 'poll').lower(),
+            ws_url=os.getenv(f'{env_prefix}_WS_URL'),
+        ))
+    return chains
+
+
 @dataclass
 class Config:
     """Класс конфигурации бота"""
     bot_token: str
     etherscan_api_key: str | None
-    bscscan_api_key: str | None
+    etherscan_api_url: str
+    toncenter_api_url: str
     notify_interval_seconds: int
+    poll_min_interval_seconds: float
+    poll_max_interval_seconds: float
+    poll_backoff_factor: float
+    ton_monitor_mode: str
+    ton_stream_url: str | None
+    evm_chain_names: list[str]
+    evm_chains: list[EVMChain]
+    block_scan_interval_seconds: float
+    block_reorg_depth: int
+    block_scan_max_blocks: int
+    monitor_workers: int
     cache_ttl_seconds: int
+    cache_max_entries: int
+    cache_max_bytes: int | None
+    cache_sweep_interval_seconds: float
     rate_limit_min_interval: float
+    etherscan_quota: ProviderQuota
+    toncenter_quota: ProviderQuota
+    ton_batch_window_ms: int
+    ton_batch_max_size: int
+    http_pool_limit: int
+    http_pool_limit_per_host: int
+    http_dns_cache_ttl: int
+    http_keepalive_timeout: float
+    http_timeout_seconds: float
+    telegram_global_rate: float
+    telegram_chat_interval_seconds: float
+    outbox_workers: int
+    database_path: str
+    database_flush_interval_seconds: float
+    state_backend: str
+    redis_url: str
+    redis_prefix: str
+    state_sync_interval_seconds: float
+    leader_lease_seconds: float
+    replica_shard: int
+    replica_shards: int
+    bot_mode: str
+    webhook_url: str | None
+    webhook_path: str
+    webhook_secret: str | None
+    webhook_host: str
+    webhook_port: int
+    webhook_max_connections: int
+    webhook_max_concurrent_updates: int
+    health_port: int | None
+    shutdown_timeout_seconds: float
+    portfolio_deadline_seconds: float
     log_dir: str
     log_level: str
     
     @classmethod
     def from_env(cls):
         """Загрузка конфигурации из переменных окружения"""
+        rate_limit_min_interval = _get_float_env('RATE_LIMIT_MIN_INTERVAL', 0.25)
+        # Без явной квоты провайдера скорость берется из RATE_LIMIT_MIN_INTERVAL
+        default_rate = 1 / rate_limit_min_interval if rate_limit_min_interval > 0 else 4.0
+        etherscan_api_key = os.getenv('ETHERSCAN_API_KEY')
+        etherscan_quota = ProviderQuota.from_env('ETHERSCAN', default_rate, 5)
+        evm_chain_names = [
+            name.strip().upper() for name in os.getenv('EVM_CHAINS', 'ETH,BNB').split(',') if name.strip()
+        ]
         return cls(
             bot_token=os.getenv('BOT_TOKEN', ''),
-            etherscan_api_key=os.getenv('ETHERSCAN_API_KEY'),
-            bscscan_api_key=os.getenv('BSCSCAN_API_KEY'),
+            etherscan_api_key=etherscan_api_key,
+            # Адреса API переопределяются для прокси и локального сервера бенчмарков
+            etherscan_api_url=os.getenv('ETHERSCAN_API_URL', 'https://api.etherscan.io/v2/api'),
+            toncenter_api_url=os.getenv('TONCENTER_API_URL', 'https://toncenter.com/api/v2'),
             notify_interval_seconds=_get_int_env('NOTIFY_INTERVAL_SECONDS', 60),
+            poll_min_interval_seconds=_get_float_env('POLL_MIN_INTERVAL_SECONDS', 15.0),
+            poll_max_interval_seconds=_get_float_env('POLL_MAX_INTERVAL_SECONDS', 600.0),
+            poll_backoff_factor=_get_float_env('POLL_BACKOFF_FACTOR', 1.5),
+            # "poll" — опрос по каждому кошельку, "blocks" — сканирование новых блоков (EVM),
+            # "stream" — потоковая подписка (TON_STREAM_URL, ETH_WS_URL, BSC_WS_URL);
+            # режимы EVM-сетей задаются в EVMChain
+            ton_monitor_mode=os.getenv('TON_MONITOR_MODE', 'poll').lower(),
+            ton_stream_url=os.getenv('TON_STREAM_URL'),
+            # Отслеживаемые EVM-сети; все работают через один endpoint Etherscan API v2
+            evm_chain_names=evm_chain_names,
+            evm_chains=_load_evm_chains(evm_chain_names, etherscan_api_key, etherscan_quota, default_rate),
+            block_scan_interval_seconds=_get_float_env('BLOCK_SCAN_INTERVAL_SECONDS', 5.0),
+            block_reorg_depth=_get_int_env('BLOCK_REORG_DEPTH', 6),
+            block_scan_max_blocks=_get_int_env('BLOCK_SCAN_MAX_BLOCKS', 20),
+            # 0 — мониторинг в процессе бота, N > 0 — N отдельных процессов по шардам кошельков
+            monitor_workers=_get_int_env('MONITOR_WORKERS', 0),
             cache_ttl_seconds=_get_int_env('CACHE_TTL_SECONDS', 30),
-            rate_limit_min_interval=_get_float_env('RATE_LIMIT_MIN_INTERVAL', 0.25),
+            cache_max_entries=_get_int_env('CACHE_MAX_ENTRIES', 10_000),
+            cache_max_bytes=_get_optional_int_env('CACHE_MAX_BYTES'),
+            cache_sweep_interval_seconds=_get_float_env('CACHE_SWEEP_INTERVAL_SECONDS', 30.0),
+            rate_limit_min_interval=rate_limit_min_interval,
+            etherscan_quota=etherscan_quota,
+            toncenter_quota=ProviderQuota.from_env('TONCENTER', default_rate, 1),
+            ton_batch_window_ms=_get_int_env('TON_BATCH_WINDOW_MS', 50),
+            ton_batch_max_size=_get_int_env('TON_BATCH_MAX_SIZE', 20),
+            http_pool_limit=_get_int_env('HTTP_POOL_LIMIT', 100),
+            http_pool_limit_per_host=_get_int_env('HTTP_POOL_LIMIT_PER_HOST', 10),
+            http_dns_cache_ttl=_get_int_env('HTTP_DNS_CACHE_TTL', 300),
+            http_keepalive_timeout=_get_float_env('HTTP_KEEPALIVE_TIMEOUT', 30.0),
+            http_timeout_seconds=_get_float_env('HTTP_TIMEOUT_SECONDS', 10.0),
+            telegram_global_rate=_get_float_env('TELEGRAM_GLOBAL_RATE', 30.0),
+            telegram_chat_interval_seconds=_get_float_env('TELEGRAM_CHAT_INTERVAL_SECONDS', 1.0),
+            outbox_workers=_get_int_env('OUTBOX_WORKERS', 8),
+            database_path=os.getenv('DATABASE_PATH', 'data/wallet_tracker.db'),
+            database_flush_interval_seconds=_get_float_env('DATABASE_FLUSH_INTERVAL_SECONDS', 1.0),
+            # "local" — SQLite и FSM в памяти, "redis" — общее состояние для нескольких реплик
+            state_backend=os.getenv('STATE_BACKEND', 'local').lower(),
+            redis_url=os.getenv('REDIS_URL', 'redis://localhost:6379/0'),
+            redis_prefix=os.getenv('REDIS_PREFIX', 'wallet_tracker'),
+            state_sync_interval_seconds=_get_float_env('STATE_SYNC_INTERVAL_SECONDS', 5.0),
+            leader_lease_seconds=_get_float_env('LEADER_LEASE_SECONDS', 15.0),
+            # Реплика опрашивает только кошельки своего шарда REPLICA_SHARD из REPLICA_SHARDS
+            replica_shard=_get_int_env('REPLICA_SHARD', 0),
+            replica_shards=_get_int_env('REPLICA_SHARDS', 1),
+            # "polling" — long polling, "webhook" — прием обновлений на WEBHOOK_HOST:WEBHOOK_PORT
+            bot_mode=os.getenv('BOT_MODE', 'polling').lower(),
+            webhook_url=os.getenv('WEBHOOK_URL'),
+            webhook_path=os.getenv('WEBHOOK_PATH', '/webhook'),
+            webhook_secret=os.getenv('WEBHOOK_SECRET'),
+            webhook_host=os.getenv('WEBHOOK_HOST', '0.0.0.0'),
+            webhook_port=_get_int_env('WEBHOOK_PORT', 8080),
+            webhook_max_connections=_get_int_env('WEBHOOK_MAX_CONNECTIONS', 40),
+            webhook_max_concurrent_updates=_get_int_env('WEBHOOK_MAX_CONCURRENT_UPDATES', 32),
+            # В режиме polling /healthz и /readyz доступны только при заданном HEALTH_PORT
+            health_port=_get_optional_int_env('HEALTH_PORT'),
+            shutdown_timeout_seconds=_get_float_env('SHUTDOWN_TIMEOUT_SECONDS', 10.0),
+            # Общий срок сводки по адресу во всех сетях
+            portfolio_deadline_seconds=_get_float_env('PORTFOLIO_DEADLINE_SECONDS', 8.0),
             log_dir=os.getenv('LOG_DIR', 'logs'),
             log_level=os.getenv('LOG_LEVEL', 'INFO'),
         )
@@ -58,6 +279,18 @@ class Config:
         """Проверка обязательных параметров"""
         if not self.bot_token:
             raise ValueError("BOT_TOKEN не установлен в .env файле")
+        unknown = set(self.evm_chain_names) - {chain.blockchain for chain in self.evm_chains}
+        if unknown:
+            raise ValueError(
+                f"Неизвестные сети в EVM_CHAINS: {', '.join(sorted(unknown))} "
+                "(опишите их в EVM_CHAIN_<ID>=chainid,валюта,эксплорер)"
+            )
+        if self.bot_mode not in ("polling", "webhook"):
+            raise ValueError("BOT_MODE должен быть polling или webhook")
+        if self.bot_mode == "webhook" and not self.webhook_url:
+            raise ValueError("WEBHOOK_URL обязателен в режиме webhook")
+        if self.bot_mode == "webhook" and not self.webhook_secret:
+            raise ValueError("WEBHOOK_SECRET обязателен в режиме webhook")
         return True
 
 # Глобальный экземпляр конфигурации
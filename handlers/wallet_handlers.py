@@ -1,22 +1,37 @@
 """
 Обработчики команд Telegram бота
 """
+import asyncio
+
 from aiogram import Router, F
 from aiogram.filters import Command, CommandStart
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
-from services.trackers import ton_tracker, eth_tracker, bsc_tracker
+from services.portfolio import lookup_portfolio
+from services.trackers import evm_chains, evm_trackers, ton_tracker
 from services.notifications import (
     add_tracked_wallet,
+    get_wallet_balances,
     list_tracked_wallets,
     remove_tracked_wallet,
 )
-from utils import format_wallet_info, detect_blockchain
+from utils import BLOCKCHAIN_EMOJI, format_portfolio, format_wallet_info, detect_blockchain
 
 router = Router()
 
+def _evm_keyboard(prefix: str, address: str, blockchains=None) -> InlineKeyboardMarkup:
+    """Кнопки выбора EVM-сети, по две в ряд; callback_data: {prefix}_{сеть}_{адрес}"""
+    buttons = [
+        InlineKeyboardButton(
+            text=f"{BLOCKCHAIN_EMOJI.get(blockchain, '💼')} {evm_chains[blockchain].name}",
+            callback_data=f"{prefix}_{blockchain}_{address}",
+        )
+        for blockchain in (blockchains or evm_trackers)
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=[buttons[i:i + 2] for i in range(0, len(buttons), 2)])
+
 # Состояния для FSM
 class WalletStates(StatesGroup):
     waiting_for_address = State()
@@ -47,7 +62,7 @@ async def cmd_help(message: Message):
     help_text = (
         "📖 <b>Справка по использованию</b>\n\n"
         "<b>Поддерживаемые блокчейны:</b>\n"
-        "• TON - адреса начинаются с EQ или UQ (48 символов)\n"
+        "• TON - адреса начинаются с EQ или UQ (48 символов) или raw-форма 0:...\n"
         "• Ethereum - адреса начинаются с 0x (42 символа)\n"
         "• BSC - адреса начинаются с 0x (42 символа)\n\n"
         "<b>Как использовать:</b>\n"
@@ -85,10 +100,16 @@ async def cmd_list(message: Message):
         await message.answer("Список отслеживаемых кошельков пуст.", parse_mode="HTML")
         return
 
+    balances = await get_wallet_balances(wallets)
+
     lines = ["<b>Отслеживаемые кошельки:</b>"]
     for wallet in wallets:
         short_address = f"{wallet.address[:8]}...{wallet.address[-6:]}"
-        lines.append(f"• {wallet.blockchain}: <code>{short_address}</code>")
+        line = f"• {wallet.blockchain}: <code>{short_address}</code>"
+        balance_data = balances.get((wallet.blockchain, wallet.address))
+        if balance_data:
+            line += f" — {balance_data['balance']:.6f} {balance_data['currency']}"
+        lines.append(line)
 
     await message.answer("\n".join(lines), parse_mode="HTML")
 
@@ -124,25 +145,19 @@ async def process_wallet_address(message: Message, state: FSMContext):
         await message.answer(
             "❌ Неверный формат адреса!\n\n"
             "Поддерживаемые форматы:\n"
-            "• TON: EQ... или UQ... (48 символов)\n"
+            "• TON: EQ..., UQ... (48 символов) или 0:...\n"
             "• ETH/BSC: 0x... (42 символа)\n\n"
             "Попробуй еще раз:",
             parse_mode="HTML"
         )
         return
     
-    # Если адрес похож на ETH/BSC, предлагаем выбрать сеть
+    # Если адрес похож на EVM-адрес, предлагаем выбрать сеть
     if blockchain == 'ETH' and address.startswith('0x'):
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [
-                InlineKeyboardButton(text="⟠ Ethereum", callback_data=f"track_eth_{address}"),
-                InlineKeyboardButton(text="🟡 BSC", callback_data=f"track_bsc_{address}")
-            ]
-        ])
         await message.answer(
-            "🤔 Этот адрес может быть как Ethereum, так и BSC.\n"
+            "🤔 Этот адрес может существовать в нескольких EVM-сетях.\n"
             "Выбери сеть:",
-            reply_markup=keyboard,
+            reply_markup=_evm_keyboard("track", address),
             parse_mode="HTML"
         )
         await state.clear()
@@ -164,20 +179,27 @@ async def process_untrack_address(message: Message, state: FSMContext):
         await message.answer("Кошелек не найден в списке отслеживания.", parse_mode="HTML")
     await state.clear()
 
+# Кнопки, отправленные до перехода на таблицу EVM-сетей, несут track_eth_/track_bsc_
+LEGACY_CALLBACK_CHAINS = {"eth": "ETH", "bsc": "BNB"}
+
+
 @router.callback_query(F.data.startswith("track_"))
 async def process_blockchain_choice(callback: CallbackQuery):
     """Обработка выбора блокчейна"""
     data_parts = callback.data.split("_", 2)
-    blockchain = data_parts[1]
+    if len(data_parts) != 3:
+        await callback.answer("❌ Некорректная кнопка", show_alert=True)
+        return
+    blockchain = LEGACY_CALLBACK_CHAINS.get(data_parts[1], data_parts[1])
     address = data_parts[2]
-    
+
+    # Сообщение с кнопками не трогаем, пока не ясно, что сеть обрабатывается
+    if blockchain not in evm_trackers:
+        await callback.answer("❌ Эта сеть сейчас не подключена, отправьте адрес заново", show_alert=True)
+        return
+
     await callback.message.edit_text("⏳ Загружаю данные...")
-    
-    if blockchain == "eth":
-        await process_eth_wallet(callback.message, address)
-    elif blockchain == "bsc":
-        await process_bsc_wallet(callback.message, address)
-    
+    await process_evm_wallet(callback.message, address, blockchain)
     await callback.answer()
 
 async def process_ton_wallet(message: Message, address: str):
@@ -201,43 +223,60 @@ async def process_ton_wallet(message: Message, address: str):
     await status_msg.edit_text(wallet_info, parse_mode="HTML", disable_web_page_preview=True)
     await _register_wallet(message, address, "TON")
 
-async def process_eth_wallet(message: Message, address: str):
-    """Обработка Ethereum кошелька"""
+async def process_evm_wallet(message: Message, address: str, blockchain: str):
+    """Обработка кошелька EVM-сети"""
+    tracker = evm_trackers[blockchain]
     # Получаем данные
-    balance_data = await eth_tracker.get_balance(address)
-    transactions = await eth_tracker.get_transactions(address, limit=5)
-    explorer_link = eth_tracker.get_explorer_link(address)
+    balance_data, transactions = await asyncio.gather(
+        tracker.get_balance(address),
+        tracker.get_transactions(address, limit=5),
+    )
+    explorer_link = tracker.get_explorer_link(address)
     
     # Форматируем и отправляем
     wallet_info = format_wallet_info(
         address=address,
-        blockchain='ETH',
+        blockchain=blockchain,
         balance_data=balance_data,
         transactions=transactions,
         explorer_link=explorer_link
     )
     
     await message.answer(wallet_info, parse_mode="HTML", disable_web_page_preview=True)
-    await _register_wallet(message, address, "ETH")
+    await _register_wallet(message, address, blockchain)
 
-async def process_bsc_wallet(message: Message, address: str):
-    """Обработка BSC кошелька"""
-    # Получаем данные
-    balance_data = await bsc_tracker.get_balance(address)
-    transactions = await bsc_tracker.get_transactions(address, limit=5)
-    explorer_link = bsc_tracker.get_explorer_link(address)
-    
-    # Форматируем и отправляем
-    wallet_info = format_wallet_info(
-        address=address,
-        blockchain='BNB',
-        balance_data=balance_data,
-        transactions=transactions,
-        explorer_link=explorer_link
+
+async def process_evm_portfolio(message: Message, address: str):
+    """Сводка по 0x-адресу сразу во всех EVM-сетях с кнопками отслеживания"""
+    status_msg = await message.answer("⏳ Проверяю адрес во всех сетях...")
+    portfolio = await lookup_portfolio(address)
+
+    # Сети с активностью идут первыми
+    chains = sorted(portfolio.chains, key=lambda view: not view.active)
+    await status_msg.edit_text(
+        format_portfolio(portfolio),
+        reply_markup=_evm_keyboard("watch", address, [view.blockchain for view in chains]),
+        parse_mode="HTML",
+        disable_web_page_preview=True,
+    )
+
+
+@router.callback_query(F.data.startswith("watch_"))
+async def process_watch_choice(callback: CallbackQuery):
+    """Включение отслеживания из сводки по адресу"""
+    data_parts = callback.data.split("_", 2)
+    # Кнопки сводки строятся только для 0x-адресов; подделанный адрес не должен стать подпиской
+    if len(data_parts) != 3 or detect_blockchain(data_parts[2]) != 'ETH':
+        await callback.answer("❌ Некорректная кнопка", show_alert=True)
+        return
+    _, blockchain, address = data_parts
+    if blockchain not in evm_trackers:
+        await callback.answer("❌ Эта сеть сейчас не подключена, отправьте адрес заново", show_alert=True)
+        return
+    added = await add_tracked_wallet(callback.message.chat.id, address, blockchain)
+    await callback.answer(
+        f"{blockchain}: уведомления включены" if added else f"{blockchain}: кошелек уже отслеживается"
     )
-    
-    await message.answer(wallet_info, parse_mode="HTML", disable_web_page_preview=True)
-    await _register_wallet(message, address, "BNB")
 
 
 async def _register_wallet(message: Message, address: str, blockchain: str) -> None:
@@ -264,16 +303,5 @@ async def handle_direct_address(message: Message):
     if blockchain == 'TON':
         await process_ton_wallet(message, address)
     elif blockchain == 'ETH':
-        # Предлагаем выбрать сеть
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [
-                InlineKeyboardButton(text="⟠ Ethereum", callback_data=f"track_eth_{address}"),
-                InlineKeyboardButton(text="🟡 BSC", callback_data=f"track_bsc_{address}")
-            ]
-        ])
-        await message.answer(
-            "🤔 Этот адрес может быть как Ethereum, так и BSC.\n"
-            "Выбери сеть:",
-            reply_markup=keyboard,
-            parse_mode="HTML"
-        )
+        # Адрес может существовать в любой EVM-сети: проверяем все сразу
+        await process_evm_portfolio(message, address)
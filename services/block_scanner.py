@@ -0,0 +1,178 @@
+"""
+Режим мониторинга EVM-сетей по блокам
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from blockchain.models import Transaction
+from services.registry import SubscriptionRegistry, TrackedWallet, WalletKey
+from utils.validators import evm_address_key
+
+logger = logging.getLogger(__name__)
+
+# Сколько хешей недавно обработанных транзакций помнить для отсечения дублей после реорга
+_SEEN_TXS_LIMIT = 50_000
+
+
+class BlockScanner:
+    """Следование за головой EVM-сети
+
+    Каждый новый блок запрашивается один раз с полными транзакциями, а поля
+    from/to сверяются с хеш-индексом отслеживаемых адресов, поэтому стоимость
+    цикла зависит от числа новых блоков, а не от размера списка кошельков.
+    Неглубокие реорганизации (до reorg_depth блоков) обнаруживаются по
+    parentHash: сканер откатывается и перечитывает ветку заново.
+    """
+
+    def __init__(
+        self,
+        blockchain: str,
+        tracker,
+        registry: SubscriptionRegistry,
+        reorg_depth: int = 6,
+        max_blocks_per_cycle: int = 20,
+        concurrency: int = 4,
+        owns: Optional[Callable[[WalletKey], bool]] = None,
+    ):
+        self._blockchain = blockchain
+        self._tracker = tracker
+        self._registry = registry
+        self._reorg_depth = reorg_depth
+        self._max_blocks_per_cycle = max_blocks_per_cycle
+        self._concurrency = concurrency
+        self._owns = owns
+        self._recent: OrderedDict[int, str] = OrderedDict()
+        # Хеши совпавших транзакций по блокам из _recent: при откате они забываются
+        self._block_txs: Dict[int, List[str]] = {}
+        self._seen_txs: OrderedDict[str, None] = OrderedDict()
+        # Канонический адрес (20 байт) -> кошелек
+        self._index: Dict[bytes, TrackedWallet] = {}
+        self._index_version = -1
+        self.head: Optional[int] = None
+        self.reorgs = 0
+        # Кошельки, чьи курсоры откатил последний scan(); их нужно сохранить
+        self.rolled_back: List[TrackedWallet] = []
+
+    async def start(self) -> Optional[int]:
+        """Привязка к текущей голове сети; сканирование начнется со следующего блока"""
+        self.head = await self._tracker.get_block_number()
+        return self.head
+
+    async def scan(self) -> List[Tuple[TrackedWallet, List[Transaction]]]:
+        """Чтение новых блоков; возвращает кошельки с новыми транзакциями"""
+        self.rolled_back = []
+        if self.head is None and await self.start() is None:
+            return []
+        latest = await self._tracker.get_block_number()
+        if latest is None or latest <= self.head:
+            return []
+
+        self._refresh_index()
+        target = min(latest, self.head + self._max_blocks_per_cycle)
+        numbers = list(range(self.head + 1, target + 1))
+        semaphore = asyncio.Semaphore(self._concurrency)
+
+        async def fetch(number: int) -> Optional[dict]:
+            async with semaphore:
+                return await self._tracker.get_block(number)
+
+        blocks = await asyncio.gather(*(fetch(number) for number in numbers))
+
+        found: Dict[WalletKey, Tuple[TrackedWallet, List[Transaction]]] = {}
+        for number, block in zip(numbers, blocks):
+            if block is None:
+                # Блок еще не доступен — продолжим с него в следующем цикле
+                break
+            parent = self._recent.get(number - 1)
+            if parent is not None and block.get("parentHash") != parent:
+                self._rewind(number, found)
+                break
+            self._block_txs[number] = self._match_block(block, found)
+            self._recent[number] = block.get("hash", "")
+            while len(self._recent) > self._reorg_depth:
+                oldest, _ = self._recent.popitem(last=False)
+                self._block_txs.pop(oldest, None)
+            self.head = number
+
+        for wallet, txs in found.values():
+            wallet.last_block = max(wallet.last_block or 0, txs[-1].block_number)
+            wallet.last_seen_hash = txs[-1].hash
+        return list(found.values())
+
+    def _rewind(
+        self, number: int, found: Dict[WalletKey, Tuple[TrackedWallet, List[Transaction]]]
+    ) -> None:
+        """Откат на один блок при несовпадении parentHash
+
+        Курсоры кошельков возвращаются ниже высоты отброшенного блока: иначе
+        замещающий блок той же высоты был бы пропущен как уже обработанный.
+        Забываются только транзакции этого блока, еще не отданные из scan();
+        уже разосланные остаются в _seen_txs, чтобы их повтор в замещающем
+        блоке не дал второго уведомления.
+        """
+        self.reorgs += 1
+        orphaned = number - 1
+        dropped = self._recent.pop(orphaned, None)
+        if dropped is None:
+            # Ветка глубже, чем мы помним: принимаем новую цепочку как есть
+            logger.warning("%s reorg deeper than %s blocks at %s", self._blockchain, self._reorg_depth, number)
+            self._recent.clear()
+            self._block_txs.clear()
+            return
+        logger.info("%s reorg detected at block %s, rescanning", self._blockchain, orphaned)
+        pending = {tx.hash for _, txs in found.values() for tx in txs if tx.block_number >= orphaned}
+        for tx_hash in self._block_txs.pop(orphaned, ()):
+            if tx_hash in pending:
+                self._seen_txs.pop(tx_hash, None)
+        for key, (_, txs) in list(found.items()):
+            txs[:] = [tx for tx in txs if tx.block_number < orphaned]
+            if not txs:
+                del found[key]
+        for wallet in self._index.values():
+            if wallet.last_block is not None and wallet.last_block >= orphaned:
+                wallet.last_block = orphaned - 1
+                self.rolled_back.append(wallet)
+        self.head = orphaned - 1
+
+    def _refresh_index(self) -> None:
+        if self._index_version == self._registry.version:
+            return
+        self._index = {
+            wallet.canonical: wallet
+            for wallet in self._registry.wallets(self._blockchain)
+            if self._owns is None or self._owns(wallet.key)
+        }
+        self._index_version = self._registry.version
+
+    def _match_block(
+        self, block: dict, found: Dict[WalletKey, Tuple[TrackedWallet, List[Transaction]]]
+    ) -> List[str]:
+        """Сверка транзакций блока с индексом; возвращает хеши совпавших"""
+        matched_hashes: List[str] = []
+        timestamp = int(block.get("timestamp", "0x0"), 16)
+        block_number = int(block.get("number", "0x0"), 16)
+        for tx in block.get("transactions", []):
+            if not isinstance(tx, dict):
+                continue
+            tx_hash = tx.get("hash", "")
+            if tx_hash in self._seen_txs:
+                continue
+            matched = False
+            for party in {evm_address_key(tx.get("from") or ""), evm_address_key(tx.get("to") or "")}:
+                wallet = self._index.get(party)
+                # Транзакции до курсора кошелька уже обработаны опросом txlist
+                if wallet is None or (wallet.last_block or 0) >= block_number:
+                    continue
+                parsed = self._tracker.parse_block_transaction(tx, wallet.address, timestamp)
+                found.setdefault(wallet.key, (wallet, []))[1].append(parsed)
+                matched = True
+            if matched:
+                matched_hashes.append(tx_hash)
+                self._seen_txs[tx_hash] = None
+                if len(self._seen_txs) > _SEEN_TXS_LIMIT:
+                    self._seen_txs.popitem(last=False)
+        return matched_hashes
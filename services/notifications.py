@@ -5,142 +5,828 @@ from __future__ import annotations
 
 import asyncio
 import logging
+import time
 from dataclasses import dataclass
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Iterable, List, Optional
 
 from aiogram import Bot
 
-from services.trackers import ton_tracker, eth_tracker, bsc_tracker
-from utils import format_transaction
+from blockchain import EVMHeadsSource, PollingSource, TonStreamSource, Transaction, TransactionSource
+from config import config
+from services.block_scanner import BlockScanner
+from services.outbox import NotificationOutbox
+from services.registry import SubscriptionRegistry, TrackedWallet, WalletKey, wallet_key
+from services.scheduler import PollScheduler
+from services.sharding import ShardCoordinator, shard_of
+from services.state import LeaderElection, StateBackend
+from services.trackers import evm_chains, http_client, monitor_concurrency, trackers
+from utils import format_balance, format_transaction
+from utils.metrics import CYCLE_BUCKETS, metrics
 
 logger = logging.getLogger(__name__)
 
 
+# Сколько транзакций показывать в одном уведомлении
+MAX_TXS_PER_NOTIFICATION = 10
+# Сколько изменившихся кошельков объединять в один запрос балансов
+BALANCE_BATCH_SIZE = 20
+
+
+poll_cycle_seconds = metrics.histogram(
+    "poll_cycle_duration_seconds", "Duration of one poll cycle over all wallets of a chain", ("blockchain",),
+    buckets=CYCLE_BUCKETS,
+)
+wallets_checked = metrics.counter("poll_wallets_checked_total", "Wallets polled", ("blockchain",))
+wallets_failed = metrics.counter("poll_wallets_failed_total", "Wallet polls that raised", ("blockchain",))
+wallets_notified = metrics.counter(
+    "poll_wallets_notified_total", "Wallet polls that found new transactions", ("blockchain",)
+)
+tracked_wallets = metrics.gauge("tracked_wallets", "Unique tracked wallets", ("blockchain",))
+
+
 @dataclass
-class TrackedWallet:
-    address: str
+class CycleReport:
+    """Итоги одного цикла опроса сети"""
     blockchain: str
-    last_seen_hash: Optional[str] = None
+    checked: int
+    failed: int
+    notified: int
+    duration: float
+
+_registry = SubscriptionRegistry()
+# Хранилище подписок и курсоров; подключается через load_tracked_wallets
+_store: Optional[StateBackend] = None
+# Версия подписок в хранилище, с которой последний раз сверялся реестр
+_synced_version: Optional[int] = None
+# Счетчик локальных изменений подписок: сверка не должна затирать несохраненное
+_local_changes = 0
+# Процесс-шард вместо хранилища передает сохраняемые курсоры родителю
+_cursor_listener: Optional[Callable[[TrackedWallet], None]] = None
+
 
+def _collect_wallet_metrics() -> None:
+    counts = dict.fromkeys(trackers, 0)
+    for wallet in _registry.wallets():
+        counts[wallet.blockchain] = counts.get(wallet.blockchain, 0) + 1
+    for blockchain, count in counts.items():
+        tracked_wallets.labels(blockchain).set(count)
 
-_tracked_wallets: Dict[int, List[TrackedWallet]] = {}
-_lock = asyncio.Lock()
+
+metrics.add_collector(_collect_wallet_metrics)
 
 
 def _get_tracker(blockchain: str):
-    if blockchain == "TON":
-        return ton_tracker
-    if blockchain == "ETH":
-        return eth_tracker
-    if blockchain == "BNB":
-        return bsc_tracker
-    raise ValueError(f"Unknown blockchain: {blockchain}")
+    tracker = trackers.get(blockchain)
+    if tracker is None:
+        raise ValueError(f"Unknown blockchain: {blockchain}")
+    return tracker
 
 
 def list_tracked_wallets(chat_id: int) -> List[TrackedWallet]:
-    return list(_tracked_wallets.get(chat_id, []))
+    return _registry.wallets_for_chat(chat_id)
+
+
+def _owns(key: WalletKey) -> bool:
+    """Входит ли кошелек в шард, который опрашивает эта реплика"""
+    if config.replica_shards <= 1:
+        return True
+    return shard_of(key, config.replica_shards, salt="replica:") == config.replica_shard
+
+
+def _monitored_wallets(blockchain: str, registry: Optional[SubscriptionRegistry] = None) -> List[TrackedWallet]:
+    registry = _registry if registry is None else registry
+    return [wallet for wallet in registry.wallets(blockchain) if _owns(wallet.key)]
+
+
+async def load_tracked_wallets(store: StateBackend) -> int:
+    """Загрузка подписок и курсоров из хранилища; дальнейшие изменения пишутся в него"""
+    global _store
+    wallets, subscriptions = await store.load()
+    by_key: Dict[WalletKey, TrackedWallet] = {}
+    for wallet in wallets:
+        # Старые записи одного адреса в разных формах: берем самый свежий курсор
+        known = by_key.get(wallet.key)
+        position = wallet.last_lt or wallet.last_block or 0
+        if known is None or position > (known.last_lt or known.last_block or 0):
+            by_key[wallet.key] = wallet
+    for chat_id, blockchain, address in subscriptions:
+        stored = by_key.get(wallet_key(blockchain, address))
+        if stored is not None:
+            _registry.restore(stored)
+        wallet, _ = _registry.add(chat_id, address, blockchain)
+        if wallet.address != address:
+            # Подписка на другую запись того же адреса (UQ вместо EQ, другой регистр):
+            # в хранилище остается одна строка на кошелек
+            store.remove_subscription(chat_id, blockchain, address)
+            store.add_subscription(chat_id, blockchain, wallet.address)
+    for stored in wallets:
+        wallet = _registry.get(stored.key)
+        if wallet is None or wallet.address != stored.address:
+            store.remove_wallet(stored)
+    _store = store
+    logger.info(
+        "Loaded %s subscriptions for %s wallets from storage", len(subscriptions), len(_registry)
+    )
+    return len(subscriptions)
 
 
 async def add_tracked_wallet(chat_id: int, address: str, blockchain: str) -> bool:
-    async with _lock:
-        wallets = _tracked_wallets.setdefault(chat_id, [])
-        for wallet in wallets:
-            if wallet.address == address and wallet.blockchain == blockchain:
-                return False
+    global _local_changes
+    wallet, added = _registry.add(chat_id, address, blockchain)
+    if not added:
+        return False
+    _local_changes += 1
+    if _store is not None:
+        _store.add_subscription(chat_id, blockchain, wallet.address)
+
+    # Курсор общий для всех подписчиков: инициализируется только для нового кошелька
+    if not _has_cursor(wallet):
+        try:
+            await _init_cursor(wallet)
+        except Exception:
+            logger.exception("Failed to initialize last seen tx for %s", address)
+        _save_cursor(wallet)
 
-        wallet = TrackedWallet(address=address, blockchain=blockchain)
-        wallets.append(wallet)
+    return True
 
-    tracker = _get_tracker(blockchain)
-    try:
-        txs = await tracker.get_transactions(address, limit=1, use_cache=False)
-        if txs:
-            wallet.last_seen_hash = txs[0].get("hash")
-    except Exception:
-        logger.exception("Failed to initialize last seen tx for %s", address)
 
+async def remove_tracked_wallet(chat_id: int, address: str) -> bool:
+    global _local_changes
+    removed = _registry.remove_address(chat_id, address)
+    _local_changes += len(removed)
+    if _store is not None:
+        for wallet in removed:
+            _store.remove_subscription(chat_id, wallet.blockchain, wallet.address)
+            if _registry.get(wallet.key) is None:
+                _store.remove_wallet(wallet)
+    return bool(removed)
+
+
+async def sync_tracked_wallets() -> bool:
+    """Применение подписок, добавленных и удаленных другими репликами
+
+    Возвращает True, если реестр сверен с хранилищем. Если за время чтения
+    на этой реплике изменились подписки, сверка откладывается до следующего раза.
+    """
+    global _synced_version
+    if _store is None:
+        return False
+    await _store.flush()
+    version = await _store.version()
+    if version == _synced_version:
+        return True
+    local_changes = _local_changes
+    wallets, subscriptions = await _store.load()
+    if local_changes != _local_changes:
+        return False
+
+    by_key = {wallet.key: wallet for wallet in wallets}
+    # Сверка по каноническим ключам: реплики могли записать адрес в разной форме
+    wanted = {
+        (chat_id, wallet_key(blockchain, address)): address
+        for chat_id, blockchain, address in subscriptions
+    }
+    current = {
+        (chat_id, wallet_key(blockchain, address))
+        for chat_id, blockchain, address in _registry.subscriptions()
+    }
+    for chat_id, key in current - wanted.keys():
+        _registry.remove(chat_id, key)
+    for chat_id, key in wanted.keys() - current:
+        stored = by_key.get(key)
+        if stored is not None:
+            _registry.restore(stored)
+        _registry.add(chat_id, wanted[(chat_id, key)], key[0])
+    _synced_version = version
     return True
 
 
-async def remove_tracked_wallet(chat_id: int, address: str) -> bool:
-    async with _lock:
-        wallets = _tracked_wallets.get(chat_id, [])
-        removed = False
-        for wallet in list(wallets):
-            if wallet.address == address:
-                wallets.remove(wallet)
-                removed = True
-        return removed
-    return False
+async def keep_tracked_wallets_in_sync(interval_seconds: float) -> None:
+    while True:
+        try:
+            await sync_tracked_wallets()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Failed to sync subscriptions with state backend")
+        await asyncio.sleep(interval_seconds)
+
+
+async def refresh_cursors() -> None:
+    """Курсоры из хранилища: их могла сдвинуть реплика, которая опрашивала сети до нас"""
+    if _store is None:
+        return
+    wallets, _ = await _store.load()
+    for stored in wallets:
+        wallet = _registry.get(stored.key)
+        if wallet is not None:
+            wallet.last_seen_hash = stored.last_seen_hash
+            wallet.last_block = stored.last_block
+            wallet.last_lt = stored.last_lt
+
+
+def _cursor_state(wallet: TrackedWallet) -> tuple:
+    return (wallet.last_seen_hash, wallet.last_block, wallet.last_lt)
+
+
+def _save_cursor(wallet: TrackedWallet) -> None:
+    if _store is not None:
+        _store.save_wallet(wallet)
+    if _cursor_listener is not None:
+        _cursor_listener(wallet)
+
+
+def set_cursor_listener(listener: Optional[Callable[[TrackedWallet], None]]) -> None:
+    """Получатель всех изменений курсоров (процесс-шард мониторинга)"""
+    global _cursor_listener
+    _cursor_listener = listener
+
+
+async def _init_cursor(wallet: TrackedWallet) -> None:
+    """Инициализация курсора по последней транзакции кошелька"""
+    tracker = _get_tracker(wallet.blockchain)
+    if wallet.blockchain == "TON":
+        _, wallet.last_lt, last_hash = await tracker.get_transactions_since(wallet.address, None)
+        if last_hash:
+            wallet.last_seen_hash = last_hash
+        return
+
+    txs = await tracker.get_transactions(wallet.address, limit=1, use_cache=False)
+    if txs:
+        wallet.last_seen_hash = txs[0].hash
+        wallet.last_block = txs[0].block_number
+    else:
+        # У кошелька еще нет транзакций: отсчитываем от текущей головы сети
+        wallet.last_block = await tracker.get_block_number()
+
+
+def _has_cursor(wallet: TrackedWallet) -> bool:
+    if wallet.blockchain == "TON":
+        return wallet.last_lt is not None
+    return wallet.last_block is not None
+
+
+async def _fetch_new_transactions(wallet: TrackedWallet) -> List[Transaction]:
+    """Транзакции кошелька, появившиеся с прошлого опроса, по возрастанию"""
+    before = _cursor_state(wallet)
+    try:
+        return await _advance_cursor(wallet)
+    finally:
+        if _cursor_state(wallet) != before:
+            _save_cursor(wallet)
+
+
+async def _advance_cursor(wallet: TrackedWallet) -> List[Transaction]:
+    if not _has_cursor(wallet):
+        await _init_cursor(wallet)
+        return []
+
+    tracker = _get_tracker(wallet.blockchain)
+    if wallet.blockchain == "TON":
+        txs, wallet.last_lt, last_hash = await tracker.get_transactions_since(
+            wallet.address, wallet.last_lt
+        )
+        if last_hash:
+            wallet.last_seen_hash = last_hash
+        return txs
+
+    txs, wallet.last_block = await tracker.get_transactions_since(
+        wallet.address, wallet.last_block
+    )
+    if txs:
+        wallet.last_seen_hash = txs[-1].hash
+    return txs
+
+
+def _cursor_of(blockchain: str, address: str):
+    wallet = _registry.get(wallet_key(blockchain, address))
+    if wallet is None:
+        return None
+    return wallet.last_lt if blockchain == "TON" else wallet.last_block
+
+
+def _apply_event(wallet: TrackedWallet, txs: List[Transaction]) -> List[Transaction]:
+    """Транзакции события новее курсора кошелька; курсор сдвигается на последнюю из них"""
+    field = "lt" if wallet.blockchain == "TON" else "block_number"
+    cursor = wallet.last_lt if wallet.blockchain == "TON" else wallet.last_block
+    if cursor is not None:
+        txs = [tx for tx in txs if getattr(tx, field) > cursor]
+    if not txs:
+        return []
+    if wallet.blockchain == "TON":
+        wallet.last_lt = txs[-1].lt
+    else:
+        wallet.last_block = txs[-1].block_number
+    wallet.last_seen_hash = txs[-1].hash
+    return txs
+
+
+async def get_wallet_balances(
+    wallets: Iterable[TrackedWallet], use_cache: bool = True
+) -> Dict[tuple[str, str], Optional[dict]]:
+    """Балансы кошельков одним пакетным запросом на каждую сеть"""
+    by_blockchain: Dict[str, List[str]] = {}
+    for wallet in wallets:
+        by_blockchain.setdefault(wallet.blockchain, []).append(wallet.address)
+
+    blockchains = list(by_blockchain)
+    results = await asyncio.gather(
+        *(
+            _get_tracker(blockchain).get_balances(by_blockchain[blockchain], use_cache=use_cache)
+            for blockchain in blockchains
+        ),
+        return_exceptions=True,
+    )
+
+    balances: Dict[tuple[str, str], Optional[dict]] = {}
+    for blockchain, result in zip(blockchains, results):
+        if isinstance(result, BaseException):
+            logger.error("Failed to fetch %s balances: %r", blockchain, result)
+            continue
+        for address, balance in result.items():
+            balances[(blockchain, address)] = balance
+    return balances
 
 
 def _build_notification_message(
-    wallet: TrackedWallet, transactions: List[dict], explorer_link: str
+    wallet: TrackedWallet,
+    transactions: List[Transaction],
+    explorer_link: str,
+    balance_data: Optional[dict] = None,
 ) -> str:
     short_address = f"{wallet.address[:8]}...{wallet.address[-6:]}"
-    message = (
-        f"Новые транзакции для <b>{wallet.blockchain}</b> "
-        f"<code>{short_address}</code>\n\n"
-    )
+    blocks = [f"Новые транзакции для <b>{wallet.blockchain}</b> <code>{short_address}</code>"]
 
-    for tx in transactions:
-        message += f"{format_transaction(tx, wallet.blockchain)}\n\n"
+    hidden = len(transactions) - MAX_TXS_PER_NOTIFICATION
+    if hidden > 0:
+        blocks.append(f"…и еще {hidden} более ранних транзакций")
+        transactions = transactions[-MAX_TXS_PER_NOTIFICATION:]
 
-    message += f'<a href="{explorer_link}">Открыть в Explorer</a>'
-    return message
+    # Транзакции берутся из общего кэша отрисовки: одну и ту же видят многие кошельки
+    blocks.extend(format_transaction(tx, wallet.blockchain) for tx in transactions)
 
+    if balance_data:
+        blocks.append(format_balance(balance_data))
+    blocks.append(f'<a href="{explorer_link}">Открыть в Explorer</a>')
+    return "\n\n".join(blocks)
 
-async def _check_wallets(bot: Bot) -> None:
-    items: List[tuple[int, TrackedWallet]] = []
-    async with _lock:
-        for chat_id, wallets in _tracked_wallets.items():
-            for wallet in wallets:
-                items.append((chat_id, wallet))
 
-    for chat_id, wallet in items:
-        tracker = _get_tracker(wallet.blockchain)
-        try:
-            txs = await tracker.get_transactions(wallet.address, limit=5, use_cache=False)
-        except Exception:
-            logger.exception("Failed to fetch transactions for %s", wallet.address)
-            continue
-
-        if not txs:
-            continue
+def _build_outbox(bot: Bot) -> NotificationOutbox:
+    return NotificationOutbox(
+        bot,
+        global_rate=config.telegram_global_rate,
+        per_chat_interval=config.telegram_chat_interval_seconds,
+        workers=config.outbox_workers,
+    )
 
-        new_txs: List[dict] = []
-        for tx in txs:
-            tx_hash = tx.get("hash")
-            if wallet.last_seen_hash and tx_hash == wallet.last_seen_hash:
-                break
-            new_txs.append(tx)
 
-        if not new_txs:
+async def _prepare_notifications(
+    found: asyncio.Queue, outbox: NotificationOutbox, registry: Optional[SubscriptionRegistry] = None
+) -> None:
+    """Сборка уведомлений по мере обнаружения новых транзакций; None завершает работу"""
+    registry = _registry if registry is None else registry
+    finished = False
+    while not finished:
+        batch = [await found.get()]
+        while not found.empty() and len(batch) < BALANCE_BATCH_SIZE:
+            batch.append(found.get_nowait())
+        if batch[-1] is None:
+            finished = True
+            batch.pop()
+        if not batch:
             continue
 
-        wallet.last_seen_hash = new_txs[0].get("hash")
-        explorer_link = tracker.get_explorer_link(wallet.address)
-        message = _build_notification_message(wallet, new_txs, explorer_link)
-
+        # Балансы изменившихся кошельков запрашиваются пачками, а не по одному;
+        # без балансов уведомления все равно уходят
         try:
-            await bot.send_message(
-                chat_id,
-                message,
-                parse_mode="HTML",
-                disable_web_page_preview=True,
-            )
+            balances = await get_wallet_balances((wallet for wallet, _ in batch), use_cache=False)
         except Exception:
-            logger.exception("Failed to send notification to chat %s", chat_id)
+            logger.exception("Failed to fetch balances for %s notifications", len(batch))
+            balances = {}
+        # Ошибка одного уведомления не должна останавливать остальные: опрос продолжает наполнять found
+        for wallet, new_txs in batch:
+            try:
+                tracker = _get_tracker(wallet.blockchain)
+                message = _build_notification_message(
+                    wallet,
+                    new_txs,
+                    tracker.get_explorer_link(wallet.address),
+                    balances.get((wallet.blockchain, wallet.address)),
+                )
+                # Сообщение собирается и режется на части один раз для всех подписчиков
+                outbox.broadcast(registry.subscribers(wallet.key), message)
+            except Exception:
+                logger.exception("Failed to prepare notification for %s", wallet.address)
+
+
+async def _check_chain(
+    blockchain: str,
+    found: asyncio.Queue,
+    registry: Optional[SubscriptionRegistry] = None,
+    tap: Optional[Callable[[TrackedWallet, List[Transaction]], None]] = None,
+) -> CycleReport:
+    """Один цикл опроса сети пулом воркеров с ограниченной параллельностью
+
+    Кошельки с новыми транзакциями попадают в очередь found как (wallet, txs);
+    tap, если задан, получает ту же пару в момент обнаружения.
+    """
+    started = time.monotonic()
+    # Каждый уникальный кошелек опрашивается один раз, результат рассылается подписчикам
+    wallets = _monitored_wallets(blockchain, registry)
+    pending = iter(wallets)
+    failed = notified = 0
+
+    async def worker() -> None:
+        nonlocal failed, notified
+        for wallet in pending:
+            try:
+                new_txs = await _fetch_new_transactions(wallet)
+            except Exception:
+                logger.exception("Failed to fetch transactions for %s", wallet.address)
+                failed += 1
+                continue
+            if new_txs:
+                notified += 1
+                if tap is not None:
+                    tap(wallet, new_txs)
+                await found.put((wallet, new_txs))
+
+    workers = min(monitor_concurrency.get(blockchain, 1), len(wallets))
+    await asyncio.gather(*(worker() for _ in range(workers)))
+
+    duration = time.monotonic() - started
+    poll_cycle_seconds.labels(blockchain).observe(duration)
+    return CycleReport(
+        blockchain=blockchain,
+        checked=len(wallets),
+        failed=failed,
+        notified=notified,
+        duration=duration,
+    )
 
 
-async def monitor_wallets(bot: Bot, interval_seconds: int) -> None:
-    logger.info("Notification loop started with interval=%s seconds", interval_seconds)
+def _log_report(report: CycleReport, interval_seconds: Optional[float] = None) -> None:
+    """Отчет о цикле (для адаптивного опроса — об окне между отчетами) в лог и метрики"""
+    wallets_checked.labels(report.blockchain).inc(report.checked)
+    wallets_failed.labels(report.blockchain).inc(report.failed)
+    wallets_notified.labels(report.blockchain).inc(report.notified)
+    logger.info(
+        "%s poll cycle: checked=%s failed=%s notified=%s duration=%.2fs",
+        report.blockchain,
+        report.checked,
+        report.failed,
+        report.notified,
+        report.duration,
+    )
+    if interval_seconds is not None and report.duration > interval_seconds:
+        logger.warning(
+            "%s poll cycle took %.2fs, longer than the %ss interval",
+            report.blockchain,
+            report.duration,
+            interval_seconds,
+        )
+
+
+async def _check_wallets(
+    bot: Bot,
+    registry: Optional[SubscriptionRegistry] = None,
+    tap: Optional[Callable[[TrackedWallet, List[Transaction]], None]] = None,
+) -> List[CycleReport]:
+    """Однократный опрос всех сетей параллельно
+
+    registry по умолчанию — реестр модуля; tap вызывается для каждой пары
+    (wallet, txs) в момент обнаружения (бенчмарк замеряет так задержку).
+    """
+    outbox = _build_outbox(bot)
+    outbox.start()
+    found: asyncio.Queue = asyncio.Queue()
+    preparing = asyncio.create_task(_prepare_notifications(found, outbox, registry))
+    try:
+        try:
+            reports = await asyncio.gather(
+                *(_check_chain(blockchain, found, registry, tap) for blockchain in trackers)
+            )
+        finally:
+            await found.put(None)
+        await preparing
+        await outbox.join()
+    finally:
+        await outbox.stop()
+    for report in reports:
+        _log_report(report)
+    return list(reports)
+
+
+async def _monitor_chain(blockchain: str, interval_seconds: int, found: asyncio.Queue) -> None:
+    """Непрерывный опрос одной сети по адаптивному расписанию
+
+    Кошельки извлекаются из PollScheduler по мере наступления их времени
+    проверки и раздаются пулу воркеров; медленный провайдер не задерживает
+    другие сети. Раз в interval_seconds в лог пишется отчет за прошедшее окно.
+    """
+    scheduler = PollScheduler(
+        base_interval=interval_seconds,
+        min_interval=config.poll_min_interval_seconds,
+        max_interval=config.poll_max_interval_seconds,
+        backoff_factor=config.poll_backoff_factor,
+    )
+    concurrency = monitor_concurrency.get(blockchain, 1)
+    # Очередь размером с пул: диспетчер не забегает вперед свободных воркеров
+    due_queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+    checked = failed = notified = 0
+
+    async def worker() -> None:
+        nonlocal checked, failed, notified
+        while True:
+            key = await due_queue.get()
+            active = False
+            wallet = _registry.get(key)
+            if wallet is not None:
+                checked += 1
+                try:
+                    new_txs = await _fetch_new_transactions(wallet)
+                except Exception:
+                    logger.exception("Failed to fetch transactions for %s", wallet.address)
+                    failed += 1
+                else:
+                    if new_txs:
+                        active = True
+                        notified += 1
+                        await found.put((wallet, new_txs))
+            scheduler.reschedule(key, active)
+
+    tasks = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    window_started = next_sync = time.monotonic()
+    next_report = window_started + interval_seconds
+    try:
+        while True:
+            try:
+                now = time.monotonic()
+                if now >= next_sync:
+                    # Кошельки с курсором (из хранилища, от родителя после перезапуска шарда)
+                    # проверяются сразу при появлении в расписании, чтобы догнать пропущенное
+                    wallets = _monitored_wallets(blockchain)
+                    for wallet in wallets:
+                        if wallet.key not in scheduler and _has_cursor(wallet):
+                            scheduler.add(wallet.key, now, delay=0)
+                    scheduler.sync((wallet.key for wallet in wallets), now)
+                    next_sync = now + config.poll_min_interval_seconds
+                if now >= next_report:
+                    _log_report(
+                        CycleReport(blockchain, checked, failed, notified, now - window_started)
+                    )
+                    checked = failed = notified = 0
+                    window_started, next_report = now, now + interval_seconds
+
+                due = scheduler.pop_due(now, limit=1)
+                if due:
+                    await due_queue.put(due[0])
+                    continue
+
+                wake_at = min(next_sync, next_report)
+                next_due = scheduler.next_due()
+                if next_due is not None:
+                    wake_at = min(wake_at, next_due)
+                await asyncio.sleep(max(0.0, wake_at - now))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("%s notification loop error", blockchain)
+                await asyncio.sleep(1)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _monitor_chain_blocks(blockchain: str, interval_seconds: int, found: asyncio.Queue) -> None:
+    """Непрерывный мониторинг EVM-сети по новым блокам
+
+    Голова сети фиксируется до догоняющего прохода по txlist, поэтому
+    транзакции, пришедшие за время простоя, не теряются, а пересечение
+    двух источников отсекается курсором last_block кошелька.
+    """
+    scanner = BlockScanner(
+        blockchain,
+        _get_tracker(blockchain),
+        _registry,
+        reorg_depth=config.block_reorg_depth,
+        max_blocks_per_cycle=config.block_scan_max_blocks,
+        concurrency=monitor_concurrency.get(blockchain, 1),
+        owns=_owns,
+    )
+    await scanner.start()
+    _log_report(await _check_chain(blockchain, found))
+    blocks = notified = 0
+    window_started = time.monotonic()
     while True:
+        await asyncio.sleep(config.block_scan_interval_seconds)
         try:
-            await asyncio.sleep(interval_seconds)
-            await _check_wallets(bot)
+            head = scanner.head
+            matches = await scanner.scan()
         except asyncio.CancelledError:
-            logger.info("Notification loop stopped")
             raise
         except Exception:
-            logger.exception("Notification loop error")
+            logger.exception("%s block scan error", blockchain)
+            continue
+        if head is not None and scanner.head is not None:
+            blocks += max(0, scanner.head - head)
+        # После реорга курсоры откатываются ниже отброшенного блока
+        for wallet in scanner.rolled_back:
+            _save_cursor(wallet)
+        for wallet, new_txs in matches:
+            _save_cursor(wallet)
+            notified += 1
+            await found.put((wallet, new_txs))
+
+        now = time.monotonic()
+        if now - window_started >= interval_seconds:
+            logger.info(
+                "%s block scan: head=%s blocks=%s notified=%s reorgs=%s in %.2fs",
+                blockchain,
+                scanner.head,
+                blocks,
+                notified,
+                scanner.reorgs,
+                now - window_started,
+            )
+            blocks = notified = 0
+            window_started = now
+
+
+def _build_source(blockchain: str, interval_seconds: int) -> TransactionSource:
+    """Потоковый источник сети; без адреса потока — источник поверх опроса"""
+    tracker = _get_tracker(blockchain)
+    if blockchain == "TON":
+        url = config.ton_stream_url
+    else:
+        url = evm_chains[blockchain].ws_url
+    if url and blockchain == "TON":
+        return TonStreamSource(url, tracker, http_client)
+    if url:
+        return EVMHeadsSource(blockchain, url, tracker, http_client)
+    logger.warning("%s stream URL is not configured, using polling source", blockchain)
+    return PollingSource(
+        blockchain,
+        tracker,
+        lambda address: _cursor_of(blockchain, address),
+        interval_seconds=interval_seconds,
+        concurrency=monitor_concurrency.get(blockchain, 1),
+    )
+
+
+async def _monitor_chain_source(blockchain: str, interval_seconds: int, found: asyncio.Queue) -> None:
+    """Непрерывный мониторинг сети по событиям источника транзакций
+
+    Перед подпиской выполняется один догоняющий проход опросом, чтобы не
+    потерять транзакции за время простоя. Повторы событий отсекаются
+    курсором кошелька, поэтому источник может безопасно переподключаться.
+    """
+    source = _build_source(blockchain, interval_seconds)
+    events = notified = 0
+
+    async def keep_watching() -> None:
+        nonlocal events, notified
+        version = None
+        window_started = time.monotonic()
+        while True:
+            if version != _registry.version:
+                version = _registry.version
+                source.watch(wallet.address for wallet in _monitored_wallets(blockchain))
+            now = time.monotonic()
+            if now - window_started >= interval_seconds:
+                logger.info(
+                    "%s stream: events=%s notified=%s reconnects=%s in %.2fs",
+                    blockchain,
+                    events,
+                    notified,
+                    getattr(source, "reconnects", 0),
+                    now - window_started,
+                )
+                events = notified = 0
+                window_started = now
+            await asyncio.sleep(1)
+
+    watching = asyncio.create_task(keep_watching())
+    try:
+        _log_report(await _check_chain(blockchain, found))
+        async for event in source.events():
+            events += 1
+            wallet = _registry.get(wallet_key(blockchain, event.address))
+            if wallet is None:
+                continue
+            new_txs = _apply_event(wallet, event.transactions)
+            if new_txs:
+                _save_cursor(wallet)
+                notified += 1
+                await found.put((wallet, new_txs))
+    finally:
+        watching.cancel()
+        await asyncio.gather(watching, return_exceptions=True)
+        await source.close()
+
+
+def _monitor_mode(blockchain: str) -> str:
+    """Действующий режим мониторинга сети: poll, blocks или stream"""
+    if blockchain == "TON":
+        mode = config.ton_monitor_mode
+    else:
+        mode = evm_chains[blockchain].monitor_mode
+    if mode == "stream" or (mode == "blocks" and blockchain != "TON"):
+        return mode
+    return "poll"
+
+
+def _chain_monitor(blockchain: str):
+    """Цикл мониторинга сети в зависимости от настроенного режима"""
+    mode = _monitor_mode(blockchain)
+    if mode == "stream":
+        return _monitor_chain_source
+    if mode == "blocks":
+        return _monitor_chain_blocks
+    return _monitor_chain
+
+
+async def run_monitors(
+    interval_seconds: int, found: asyncio.Queue, blockchains: Optional[Iterable[str]] = None
+) -> None:
+    """Мониторинг сетей (по умолчанию всех); кошельки с новыми транзакциями попадают в found"""
+    tasks = [
+        asyncio.create_task(_chain_monitor(blockchain)(blockchain, interval_seconds, found))
+        for blockchain in (trackers if blockchains is None else blockchains)
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def restore_tracked_wallet(wallet: TrackedWallet) -> None:
+    """Добавление кошелька без подписчиков (процесс-шард мониторинга)"""
+    _registry.restore(wallet)
+
+
+def discard_tracked_wallet(key: tuple[str, str]) -> None:
+    """Удаление кошелька из мониторинга (процесс-шард мониторинга)"""
+    _registry.discard(key)
+
+
+def _accept_shard_result(state: TrackedWallet, new_txs: List[Transaction], found: asyncio.Queue) -> None:
+    """Перенос курсора, найденного процессом-шардом, и постановка уведомления в очередь
+
+    Без new_txs это только сдвиг курсора: его тоже нужно сохранить, иначе
+    после перезапуска весь пройденный промежуток пришлось бы читать заново.
+    """
+    wallet = _registry.get(state.key)
+    if wallet is None:
+        # Кошелек удалили, пока шард его опрашивал
+        return
+    wallet.last_seen_hash = state.last_seen_hash
+    wallet.last_block = state.last_block
+    wallet.last_lt = state.last_lt
+    _save_cursor(wallet)
+    if new_txs:
+        found.put_nowait((wallet, new_txs))
+
+
+async def monitor_wallets(bot: Bot, interval_seconds: int) -> None:
+    logger.info("Notification loop started with interval=%s seconds", interval_seconds)
+    outbox = _build_outbox(bot)
+    outbox.start()
+    found: asyncio.Queue = asyncio.Queue()
+    preparing = asyncio.create_task(_prepare_notifications(found, outbox))
+    try:
+        if config.monitor_workers > 0:
+            coordinator = ShardCoordinator(
+                _registry,
+                config.monitor_workers,
+                interval_seconds,
+                lambda state, new_txs: _accept_shard_result(state, new_txs, found),
+                owns=_owns,
+                # Блоки и потоки сети читаются один раз: такая сеть целиком у одного процесса
+                whole_chains=[blockchain for blockchain in trackers if _monitor_mode(blockchain) != "poll"],
+            )
+            await coordinator.run()
+        else:
+            await run_monitors(interval_seconds, found)
+    except asyncio.CancelledError:
+        logger.info("Notification loop stopped")
+        raise
+    finally:
+        preparing.cancel()
+        await asyncio.gather(preparing, return_exceptions=True)
+        await outbox.stop()
+        logger.info("Outbox stats: %s", outbox.stats())
+
+
+async def lead_monitoring(bot: Bot, interval_seconds: int, election: LeaderElection) -> None:
+    """Мониторинг только на реплике, которая держит аренду лидера"""
+    async def monitor() -> None:
+        if _store is not None and _store.shared:
+            await sync_tracked_wallets()
+            await refresh_cursors()
+        await monitor_wallets(bot, interval_seconds)
+
+    await election.run(monitor)
@@ -0,0 +1,205 @@
+"""
+Очередь исходящих уведомлений с соблюдением лимитов Telegram
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, Optional, Set
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter
+
+from utils import TELEGRAM_MESSAGE_LIMIT, split_message, telegram_length
+from utils.metrics import metrics
+from utils.network import TokenBucketRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Разделитель уведомлений, объединенных в одно сообщение
+MESSAGE_SEPARATOR = "\n\n➖➖➖\n\n"
+
+queue_depth = metrics.gauge("notification_queue_depth", "Notification parts waiting to be sent")
+sent_messages = metrics.counter("notification_messages_sent_total", "Telegram messages sent")
+send_failures = metrics.counter(
+    "notification_send_failures_total", "Telegram send attempts that failed", ("reason",)
+)
+dropped_messages = metrics.counter("notification_messages_dropped_total", "Telegram messages given up on")
+
+
+class NotificationOutbox:
+    """Очередь уведомлений: глобальный лимит, лимит на чат и объединение сообщений
+
+    Уведомления копятся по чатам. Когда чату снова можно писать, все накопленные
+    сообщения склеиваются в одно (до 4096 символов) и отправляются с учетом
+    глобального token bucket. На 429 чат откладывается на retry_after секунд.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        global_rate: float = 30.0,
+        per_chat_interval: float = 1.0,
+        workers: int = 8,
+        max_retries: int = 5,
+    ):
+        self._bot = bot
+        self._global_limiter = TokenBucketRateLimiter(rate=global_rate, burst=max(1, int(global_rate)))
+        self._per_chat_interval = per_chat_interval
+        self._workers_count = workers
+        self._max_retries = max_retries
+        self._pending: Dict[int, Deque[str]] = {}
+        self._attempts: Dict[int, int] = {}
+        self._next_allowed: Dict[int, float] = {}
+        # Чат находится либо в очереди готовых, либо ждет таймера, либо отправляется
+        self._scheduled: Set[int] = set()
+        self._ready: asyncio.Queue = asyncio.Queue()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._workers: list[asyncio.Task] = []
+        self.sent = 0
+        self.merged = 0
+        self.retried = 0
+        self.failed = 0
+
+    def depth(self) -> int:
+        """Число уведомлений, ожидающих отправки"""
+        return sum(len(messages) for messages in self._pending.values())
+
+    def put(self, chat_id: int, message: str) -> None:
+        self.broadcast((chat_id,), message)
+
+    def broadcast(self, chat_ids: Iterable[int], message: str) -> None:
+        """Одно уведомление многим чатам: текст режется на части один раз"""
+        parts = split_message(message)
+        for chat_id in chat_ids:
+            self._pending.setdefault(chat_id, deque()).extend(parts)
+            queue_depth.inc(len(parts))
+            self._idle.clear()
+            self._schedule(chat_id)
+
+    def start(self) -> None:
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self._workers_count)]
+
+    async def stop(self) -> None:
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        undelivered = self.depth()
+        if undelivered:
+            queue_depth.dec(undelivered)
+            logger.warning("Outbox stopped with %s undelivered notifications", undelivered)
+
+    async def join(self) -> None:
+        """Ожидание, пока все поставленные уведомления будут обработаны"""
+        await self._idle.wait()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "depth": self.depth(),
+            "sent": self.sent,
+            "merged": self.merged,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+    def _schedule(self, chat_id: int, not_before: Optional[float] = None) -> None:
+        if chat_id in self._scheduled:
+            return
+        self._scheduled.add(chat_id)
+        ready_at = self._next_allowed.get(chat_id, 0.0)
+        if not_before is not None:
+            ready_at = max(ready_at, not_before)
+        delay = ready_at - time.monotonic()
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self._ready.put_nowait, chat_id)
+        else:
+            self._ready.put_nowait(chat_id)
+
+    def _take_batch(self, chat_id: int) -> str:
+        """Склейка накопленных уведомлений чата в одно сообщение"""
+        messages = self._pending[chat_id]
+        batch = [messages.popleft()]
+        if not messages:
+            queue_depth.dec()
+            return batch[0]
+        length = telegram_length(batch[0])
+        separator_length = telegram_length(MESSAGE_SEPARATOR)
+        while messages:
+            next_length = telegram_length(messages[0])
+            if length + separator_length + next_length > TELEGRAM_MESSAGE_LIMIT:
+                break
+            batch.append(messages.popleft())
+            length += separator_length + next_length
+            self.merged += 1
+        queue_depth.dec(len(batch))
+        return MESSAGE_SEPARATOR.join(batch)
+
+    async def _worker(self) -> None:
+        while True:
+            chat_id = await self._ready.get()
+            retry_at: Optional[float] = None
+            text = self._take_batch(chat_id)
+            try:
+                await self._global_limiter.wait()
+                await self._bot.send_message(
+                    chat_id,
+                    text,
+                    parse_mode="HTML",
+                    disable_web_page_preview=True,
+                )
+                self.sent += 1
+                sent_messages.inc()
+                self._attempts.pop(chat_id, None)
+            except TelegramRetryAfter as e:
+                send_failures.labels("flood_control").inc()
+                retry_at = time.monotonic() + e.retry_after
+                self._requeue(chat_id, text)
+                logger.warning("Flood control for chat %s, retry after %ss", chat_id, e.retry_after)
+            except TelegramNetworkError:
+                send_failures.labels("network").inc()
+                attempt = self._attempts.get(chat_id, 0) + 1
+                if attempt <= self._max_retries:
+                    self._attempts[chat_id] = attempt
+                    retry_at = time.monotonic() + min(60.0, 2.0 ** attempt)
+                    self._requeue(chat_id, text)
+                    logger.warning("Network error sending to chat %s, attempt %s", chat_id, attempt)
+                else:
+                    self._attempts.pop(chat_id, None)
+                    self.failed += 1
+                    dropped_messages.inc()
+                    logger.error("Giving up on notification to chat %s after %s attempts", chat_id, attempt)
+            except asyncio.CancelledError:
+                self._requeue(chat_id, text)
+                raise
+            except Exception:
+                self.failed += 1
+                send_failures.labels("error").inc()
+                dropped_messages.inc()
+                logger.exception("Failed to send notification to chat %s", chat_id)
+            finally:
+                self._finish(chat_id, retry_at)
+
+    def _requeue(self, chat_id: int, text: str) -> None:
+        self._pending.setdefault(chat_id, deque()).appendleft(text)
+        queue_depth.inc()
+        self.retried += 1
+
+    def _finish(self, chat_id: int, retry_at: Optional[float]) -> None:
+        self._scheduled.discard(chat_id)
+        self._next_allowed[chat_id] = time.monotonic() + self._per_chat_interval
+        if self._pending.get(chat_id):
+            self._schedule(chat_id, retry_at)
+        else:
+            self._pending.pop(chat_id, None)
+        if len(self._next_allowed) > 10_000:
+            now = time.monotonic()
+            self._next_allowed = {
+                chat: allowed for chat, allowed in self._next_allowed.items() if allowed > now
+            }
+        if not self._pending:
+            self._idle.set()
@@ -0,0 +1,108 @@
+"""
+Сводка по адресу во всех совместимых сетях
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+from blockchain.models import Transaction
+from config import config
+from services.trackers import evm_trackers, trackers
+from utils.validators import detect_blockchain
+
+logger = logging.getLogger(__name__)
+
+# Сети, в которых может существовать адрес данного формата
+COMPATIBLE_CHAINS: Dict[str, tuple[str, ...]] = {
+    "TON": ("TON",),
+    "ETH": tuple(evm_trackers),
+}
+
+
+@dataclass
+class ChainView:
+    """Данные адреса в одной сети; None — запрос не успел или завершился ошибкой"""
+
+    blockchain: str
+    explorer_link: str
+    balance_data: Optional[dict] = None
+    transactions: Optional[List[Transaction]] = None
+
+    @property
+    def complete(self) -> bool:
+        return self.balance_data is not None and self.transactions is not None
+
+    @property
+    def active(self) -> bool:
+        """Есть ли у адреса баланс или транзакции в этой сети"""
+        if self.transactions:
+            return True
+        return bool(self.balance_data and self.balance_data.get("balance"))
+
+
+@dataclass
+class Portfolio:
+    address: str
+    chains: List[ChainView] = field(default_factory=list)
+
+    @property
+    def active_chains(self) -> List[str]:
+        return [view.blockchain for view in self.chains if view.active]
+
+
+def compatible_chains(address: str) -> tuple[str, ...]:
+    return COMPATIBLE_CHAINS.get(detect_blockchain(address), ())
+
+
+async def lookup_portfolio(
+    address: str,
+    blockchains: Optional[Sequence[str]] = None,
+    tx_limit: int = 5,
+    deadline_seconds: Optional[float] = None,
+) -> Portfolio:
+    """Баланс и последние транзакции адреса во всех сетях одновременно
+
+    Все запросы (по два на сеть) запускаются сразу и ждутся не дольше
+    общего срока. Не успевшие к сроку запросы перестают ждаться, но сами
+    не отменяются (SingleFlight их экранирует) и дозаполняют кэш трекера,
+    поэтому повторный запрос того же адреса будет быстрым.
+    """
+    if blockchains is None:
+        blockchains = compatible_chains(address)
+    if deadline_seconds is None:
+        deadline_seconds = config.portfolio_deadline_seconds
+
+    portfolio = Portfolio(address=address)
+    requests: Dict[asyncio.Task, tuple[ChainView, str]] = {}
+    for blockchain in blockchains:
+        tracker = trackers[blockchain]
+        view = ChainView(blockchain=blockchain, explorer_link=tracker.get_explorer_link(address))
+        portfolio.chains.append(view)
+        requests[asyncio.create_task(tracker.get_balance(address))] = (view, "balance_data")
+        requests[asyncio.create_task(tracker.get_transactions(address, limit=tx_limit))] = (
+            view,
+            "transactions",
+        )
+
+    if not requests:
+        return portfolio
+    done, pending = await asyncio.wait(requests, timeout=deadline_seconds)
+    for task in pending:
+        task.cancel()
+    for task in done:
+        view, attribute = requests[task]
+        if task.exception() is not None:
+            logger.error("Portfolio %s lookup failed for %s: %r", view.blockchain, address, task.exception())
+            continue
+        setattr(view, attribute, task.result())
+    if pending:
+        logger.warning(
+            "Portfolio lookup for %s hit the %.1fs deadline with %s requests pending",
+            address,
+            deadline_seconds,
+            len(pending),
+        )
+    return portfolio
@@ -0,0 +1,145 @@
+"""
+Реестр подписок на кошельки с индексами по кошельку и по чату
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from utils.validators import address_key
+
+# Ключ кошелька: (сеть, канонический адрес в байтах); EQ/UQ/raw-формы TON
+# и разный регистр EVM-адреса дают один и тот же ключ
+WalletKey = Tuple[str, bytes]
+
+
+def wallet_key(blockchain: str, address: str) -> WalletKey:
+    return (blockchain, address_key(blockchain, address))
+
+
+@dataclass
+class TrackedWallet:
+    address: str
+    blockchain: str
+    last_seen_hash: Optional[str] = None
+    # Курсор инкрементального опроса EVM: последний полностью обработанный блок
+    last_block: Optional[int] = None
+    # Курсор TON: logical time последней обработанной транзакции (хеш в last_seen_hash)
+    last_lt: Optional[int] = None
+    # Канонический адрес считается один раз; address остается в том виде, как его ввели
+    canonical: bytes = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self.canonical = address_key(self.blockchain, self.address)
+
+    @property
+    def key(self) -> WalletKey:
+        return (self.blockchain, self.canonical)
+
+
+class SubscriptionRegistry:
+    """Подписки чатов на кошельки
+
+    Каждый кошелек хранится один раз вместе со своим курсором, поэтому опрашивается
+    один раз за цикл независимо от числа подписчиков. Добавление и удаление
+    подписки работают за O(1).
+    """
+
+    def __init__(self):
+        self._wallets: Dict[WalletKey, TrackedWallet] = {}
+        self._subscribers: Dict[WalletKey, Dict[int, None]] = {}
+        self._by_chat: Dict[int, Dict[WalletKey, None]] = {}
+        self._by_blockchain: Dict[str, Dict[WalletKey, None]] = {}
+        # Растет при каждом изменении набора кошельков; по нему перестраиваются индексы
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self._wallets)
+
+    def get(self, key: WalletKey) -> Optional[TrackedWallet]:
+        return self._wallets.get(key)
+
+    def restore(self, wallet: TrackedWallet) -> None:
+        """Регистрация кошелька с уже известным курсором (загрузка из хранилища)"""
+        if wallet.key not in self._wallets:
+            self.version += 1
+            self._wallets[wallet.key] = wallet
+            self._subscribers[wallet.key] = {}
+            self._by_blockchain.setdefault(wallet.blockchain, {})[wallet.key] = None
+
+    def add(self, chat_id: int, address: str, blockchain: str) -> Tuple[TrackedWallet, bool]:
+        """Подписка чата на кошелек; возвращает кошелек и признак новой подписки"""
+        key = wallet_key(blockchain, address)
+        wallet = self._wallets.get(key)
+        if wallet is None:
+            wallet = TrackedWallet(address=address, blockchain=blockchain)
+            self.restore(wallet)
+
+        chat_keys = self._by_chat.setdefault(chat_id, {})
+        if key in chat_keys:
+            return wallet, False
+        chat_keys[key] = None
+        self._subscribers[key][chat_id] = None
+        return wallet, True
+
+    def remove(self, chat_id: int, key: WalletKey) -> bool:
+        chat_keys = self._by_chat.get(chat_id)
+        if not chat_keys or key not in chat_keys:
+            return False
+        del chat_keys[key]
+        if not chat_keys:
+            del self._by_chat[chat_id]
+
+        subscribers = self._subscribers[key]
+        subscribers.pop(chat_id, None)
+        if not subscribers:
+            # Последний подписчик ушел — кошелек больше не опрашивается
+            del self._subscribers[key]
+            del self._wallets[key]
+            del self._by_blockchain[key[0]][key]
+            self.version += 1
+        return True
+
+    def discard(self, key: WalletKey) -> bool:
+        """Удаление кошелька вместе со всеми подписками на него"""
+        if key not in self._wallets:
+            return False
+        for chat_id in self._subscribers.pop(key):
+            chat_keys = self._by_chat[chat_id]
+            del chat_keys[key]
+            if not chat_keys:
+                del self._by_chat[chat_id]
+        del self._wallets[key]
+        del self._by_blockchain[key[0]][key]
+        self.version += 1
+        return True
+
+    def remove_address(self, chat_id: int, address: str) -> List[TrackedWallet]:
+        """Удаление подписок чата на адрес во всех сетях; возвращает затронутые кошельки"""
+        removed = [
+            self._wallets[key]
+            for key in self._by_chat.get(chat_id, {})
+            if key[1] == address_key(key[0], address)
+        ]
+        for wallet in removed:
+            self.remove(chat_id, wallet.key)
+        return removed
+
+    def wallets(self, blockchain: Optional[str] = None) -> List[TrackedWallet]:
+        if blockchain is None:
+            return list(self._wallets.values())
+        return [self._wallets[key] for key in self._by_blockchain.get(blockchain, {})]
+
+    def wallets_for_chat(self, chat_id: int) -> List[TrackedWallet]:
+        return [self._wallets[key] for key in self._by_chat.get(chat_id, {})]
+
+    def subscriptions(self) -> List[Tuple[int, str, str]]:
+        """Все подписки в виде (chat_id, сеть, адрес кошелька)"""
+        return [
+            (chat_id, key[0], self._wallets[key].address)
+            for chat_id, keys in self._by_chat.items()
+            for key in keys
+        ]
+
+    def subscribers(self, key: WalletKey) -> List[int]:
+        return list(self._subscribers.get(key, {}))
@@ -0,0 +1,118 @@
+"""
+Адаптивное расписание опроса кошельков
+"""
+from __future__ import annotations
+
+import heapq
+import itertools
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from services.registry import WalletKey
+
+
+@dataclass
+class _Schedule:
+    interval: float
+    due: float
+    seq: int
+
+
+class PollScheduler:
+    """Очередь кошельков с приоритетом по времени следующей проверки
+
+    Интервал опроса кошелька сбрасывается до минимального, когда у него появляются
+    новые транзакции, и растет в backoff раз до потолка, пока кошелек простаивает.
+    Активные кошельки проверяются чаще, спящие почти не тратят квоту.
+    """
+
+    def __init__(
+        self,
+        base_interval: float,
+        min_interval: float,
+        max_interval: float,
+        backoff_factor: float = 1.5,
+    ):
+        self._base_interval = min(max(base_interval, min_interval), max_interval)
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._backoff_factor = backoff_factor
+        self._heap: List[Tuple[float, int, WalletKey]] = []
+        self._schedules: Dict[WalletKey, _Schedule] = {}
+        self._counter = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._schedules)
+
+    def __contains__(self, key: WalletKey) -> bool:
+        return key in self._schedules
+
+    def add(
+        self, key: WalletKey, now: Optional[float] = None, delay: Optional[float] = None
+    ) -> None:
+        """Новый кошелек проверяется через delay (по умолчанию — базовый интервал)"""
+        if key in self._schedules:
+            return
+        now = time.monotonic() if now is None else now
+        delay = self._base_interval if delay is None else delay
+        self._push(key, self._base_interval, now + delay)
+
+    def discard(self, key: WalletKey) -> None:
+        # Элемент кучи остается и будет пропущен при извлечении
+        self._schedules.pop(key, None)
+
+    def sync(
+        self, keys: Iterable[WalletKey], now: Optional[float] = None, delay: Optional[float] = None
+    ) -> None:
+        """Приведение расписания к актуальному набору кошельков"""
+        keys = set(keys)
+        for key in list(self._schedules):
+            if key not in keys:
+                self.discard(key)
+        for key in keys:
+            self.add(key, now, delay)
+
+    def next_due(self) -> Optional[float]:
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: Optional[float] = None, limit: Optional[int] = None) -> List[WalletKey]:
+        """Кошельки, время проверки которых наступило, начиная с самых просроченных"""
+        now = time.monotonic() if now is None else now
+        due: List[WalletKey] = []
+        while self._heap and (limit is None or len(due) < limit):
+            self._drop_stale()
+            if not self._heap or self._heap[0][0] > now:
+                break
+            _, _, key = heapq.heappop(self._heap)
+            # Пока кошелек опрашивается, он не стоит в очереди
+            self._schedules[key].seq = -1
+            due.append(key)
+        return due
+
+    def reschedule(self, key: WalletKey, active: bool, now: Optional[float] = None) -> float:
+        """Планирование следующей проверки по итогам опроса; возвращает интервал"""
+        schedule = self._schedules.get(key)
+        if schedule is None:
+            return 0.0
+        if active:
+            interval = self._min_interval
+        else:
+            interval = min(self._max_interval, schedule.interval * self._backoff_factor)
+        now = time.monotonic() if now is None else now
+        self._push(key, interval, now + interval)
+        return interval
+
+    def _push(self, key: WalletKey, interval: float, due: float) -> None:
+        seq = next(self._counter)
+        self._schedules[key] = _Schedule(interval=interval, due=due, seq=seq)
+        heapq.heappush(self._heap, (due, seq, key))
+
+    def _drop_stale(self) -> None:
+        while self._heap:
+            _, seq, key = self._heap[0]
+            schedule = self._schedules.get(key)
+            if schedule is not None and schedule.seq == seq:
+                return
+            heapq.heappop(self._heap)
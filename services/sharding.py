@@ -0,0 +1,323 @@
+"""
+Мониторинг кошельков в отдельных процессах, разделенных по шардам
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import RotatingFileHandler
+from typing import Callable, Dict, Iterable, List, Optional
+
+from blockchain.models import Transaction
+from config import config
+from services.registry import SubscriptionRegistry, TrackedWallet, WalletKey
+from services.trackers import http_client, share_quotas, trackers
+
+logger = logging.getLogger(__name__)
+
+# Как часто координатор сверяет шарды с реестром и проверяет живость процессов
+SYNC_INTERVAL_SECONDS = 1.0
+# Сколько ждать завершения процесса-шарда перед terminate()
+STOP_TIMEOUT_SECONDS = 10.0
+# Пауза перед перезапуском упавшего шарда растет вдвое с каждым падением подряд, до этого предела
+RESTART_BACKOFF_MAX_SECONDS = 60.0
+# Сколько падений подряд допускается; дальше координатор останавливается с ошибкой
+MAX_CONSECUTIVE_RESTARTS = 5
+# Процесс, проработавший столько, считается поднявшимся: счетчик падений сбрасывается
+STABLE_UPTIME_SECONDS = 60.0
+# Как часто шард передает родителю курсоры, сдвинувшиеся без новых транзакций
+CURSOR_SYNC_INTERVAL_SECONDS = 5.0
+
+
+def shard_of(key: WalletKey, shards: int, salt: str = "") -> int:
+    """Номер шарда кошелька; crc32 не зависит от PYTHONHASHSEED и одинаков во всех процессах
+
+    Разные salt дают независимые разбиения, например реплик и процессов внутри реплики.
+    """
+    blockchain, address = key
+    return zlib.crc32(address, zlib.crc32(f"{salt}{blockchain}:".encode())) % shards
+
+
+def chain_shard(blockchain: str, shards: int) -> int:
+    """Номер шарда, которому целиком достается сеть"""
+    return zlib.crc32(blockchain.encode()) % shards
+
+
+class ShardCoordinator:
+    """Распределение кошельков по процессам мониторинга
+
+    Каждый из workers процессов опрашивает свою часть пространства
+    (сеть, адрес) и возвращает найденные транзакции вместе с новым курсором
+    через общую очередь. Сети из whole_chains (режимы blocks и stream) не
+    делятся по адресам: каждый блок такой сети читает только один процесс.
+    Координатор досылает шардам добавленные и удаленные кошельки по мере
+    изменения реестра, а упавший процесс перезапускает с нарастающей паузой
+    и заново передает ему его кошельки с последними известными курсорами.
+    Telegram, хранилище и рассылка остаются в процессе бота.
+    """
+
+    def __init__(
+        self,
+        registry: SubscriptionRegistry,
+        workers: int,
+        interval_seconds: int,
+        on_result: Callable[[TrackedWallet, List[Transaction]], None],
+        owns: Optional[Callable[[WalletKey], bool]] = None,
+        whole_chains: Iterable[str] = (),
+    ):
+        self._registry = registry
+        self._owns = owns
+        self._workers = max(1, workers)
+        self._whole_chains = set(whole_chains)
+        self._interval = interval_seconds
+        self._on_result = on_result
+        # spawn: дочерний процесс не наследует event loop и открытые соединения бота
+        self._context = multiprocessing.get_context("spawn")
+        self._results = self._context.Queue()
+        self._commands: List[multiprocessing.Queue] = []
+        self._processes: List[Optional[multiprocessing.Process]] = [None] * self._workers
+        self._started_at = [0.0] * self._workers
+        self._failures = [0] * self._workers
+        self._restart_at: List[Optional[float]] = [None] * self._workers
+        self._assigned: Dict[WalletKey, int] = {}
+        self._version: Optional[int] = None
+        self._reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shard-results")
+        self.restarts = 0
+
+    async def run(self) -> None:
+        # Ключи API общие для бота и всех шардов, поэтому каждому достается равная доля квоты
+        share_quotas(self._workers + 1)
+        for shard_id in range(self._workers):
+            self._commands.append(self._context.Queue())
+            self._spawn(shard_id)
+        reading = asyncio.create_task(self._read_results())
+        try:
+            while True:
+                self._sync()
+                self._check_workers()
+                await asyncio.sleep(SYNC_INTERVAL_SECONDS)
+        finally:
+            reading.cancel()
+            await asyncio.gather(reading, return_exceptions=True)
+            await asyncio.get_running_loop().run_in_executor(None, self._stop)
+            self._reader.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, object]:
+        sizes = [0] * self._workers
+        for shard_id in self._assigned.values():
+            sizes[shard_id] += 1
+        return {"workers": self._workers, "wallets": sizes, "restarts": self.restarts}
+
+    def _chains_of(self, shard_id: int) -> List[str]:
+        """Сети, которые ведет шард: все опрашиваемые и доставшиеся ему целиком"""
+        return [
+            blockchain
+            for blockchain in trackers
+            if blockchain not in self._whole_chains or chain_shard(blockchain, self._workers) == shard_id
+        ]
+
+    def _shard_for(self, key: WalletKey) -> int:
+        if key[0] in self._whole_chains:
+            return chain_shard(key[0], self._workers)
+        return shard_of(key, self._workers)
+
+    def _spawn(self, shard_id: int) -> None:
+        process = self._context.Process(
+            target=_worker_main,
+            args=(
+                shard_id,
+                self._workers + 1,
+                self._commands[shard_id],
+                self._results,
+                self._interval,
+                self._chains_of(shard_id),
+            ),
+            name=f"monitor-shard-{shard_id}",
+            daemon=True,
+        )
+        process.start()
+        self._processes[shard_id] = process
+        self._started_at[shard_id] = time.monotonic()
+        logger.info("Started monitor shard %s/%s (pid=%s)", shard_id, self._workers, process.pid)
+
+    def _sync(self) -> None:
+        """Передача шардам изменений реестра"""
+        if self._version == self._registry.version:
+            return
+        self._version = self._registry.version
+        current = {
+            wallet.key: wallet
+            for wallet in self._registry.wallets()
+            if self._owns is None or self._owns(wallet.key)
+        }
+        for key in [key for key in self._assigned if key not in current]:
+            self._commands[self._assigned.pop(key)].put(("remove", key))
+        for key, wallet in current.items():
+            if key not in self._assigned:
+                shard_id = self._shard_for(key)
+                self._assigned[key] = shard_id
+                self._commands[shard_id].put(("add", wallet))
+
+    def _check_workers(self) -> None:
+        """Перезапуск упавших процессов с их кошельками
+
+        Пауза перед перезапуском растет с каждым падением подряд; после
+        MAX_CONSECUTIVE_RESTARTS падений координатор завершается с ошибкой,
+        и мониторинг перезапускает держатель аренды лидера.
+        """
+        now = time.monotonic()
+        for shard_id, process in enumerate(self._processes):
+            if process is None or process.is_alive():
+                continue
+            if self._restart_at[shard_id] is None:
+                if now - self._started_at[shard_id] >= STABLE_UPTIME_SECONDS:
+                    self._failures[shard_id] = 0
+                self._failures[shard_id] += 1
+                if self._failures[shard_id] > MAX_CONSECUTIVE_RESTARTS:
+                    raise RuntimeError(
+                        f"monitor shard {shard_id} crashed {self._failures[shard_id]} times in a row"
+                    )
+                delay = min(RESTART_BACKOFF_MAX_SECONDS, 2.0 ** (self._failures[shard_id] - 1))
+                self._restart_at[shard_id] = now + delay
+                logger.warning(
+                    "Monitor shard %s exited with code %s, restarting in %.0fs",
+                    shard_id,
+                    process.exitcode,
+                    delay,
+                )
+            if now < self._restart_at[shard_id]:
+                continue
+            self._restart_at[shard_id] = None
+            self.restarts += 1
+            # Очередь команд пересоздается: в старой могли остаться устаревшие команды
+            self._commands[shard_id] = self._context.Queue()
+            self._spawn(shard_id)
+            for key, assigned in self._assigned.items():
+                wallet = self._registry.get(key)
+                if assigned == shard_id and wallet is not None:
+                    self._commands[shard_id].put(("add", wallet))
+
+    def _next_result(self):
+        try:
+            return self._results.get(timeout=SYNC_INTERVAL_SECONDS)
+        except queue.Empty:
+            return None
+
+    async def _read_results(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await loop.run_in_executor(self._reader, self._next_result)
+            if item is None:
+                continue
+            state, new_txs = item
+            try:
+                self._on_result(state, new_txs)
+            except Exception:
+                logger.exception("Failed to handle shard result for %s", state.address)
+
+    def _stop(self) -> None:
+        for commands in self._commands:
+            commands.put(("stop", None))
+        for process in self._processes:
+            if process is None:
+                continue
+            process.join(STOP_TIMEOUT_SECONDS)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+
+
+def _configure_worker_logging(shard_id: int) -> None:
+    log_file = os.path.join(config.log_dir, f"monitor-shard-{shard_id}.log")
+    logging.basicConfig(
+        level=getattr(logging, config.log_level.upper(), logging.INFO),
+        format=f'%(asctime)s - shard {shard_id} - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler(),
+            RotatingFileHandler(log_file, maxBytes=5_000_000, backupCount=3),
+        ],
+        force=True,
+    )
+
+
+def _worker_main(
+    shard_id: int,
+    quota_parts: int,
+    commands: multiprocessing.Queue,
+    results: multiprocessing.Queue,
+    interval_seconds: int,
+    blockchains: List[str],
+) -> None:
+    """Точка входа процесса-шарда"""
+    os.makedirs(config.log_dir, exist_ok=True)
+    _configure_worker_logging(shard_id)
+    try:
+        asyncio.run(_run_worker(quota_parts, commands, results, interval_seconds, blockchains))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _run_worker(
+    quota_parts: int,
+    commands: multiprocessing.Queue,
+    results: multiprocessing.Queue,
+    interval_seconds: int,
+    blockchains: List[str],
+) -> None:
+    # notifications сам импортирует этот модуль
+    from services import notifications
+
+    share_quotas(quota_parts)
+    await http_client.start()
+    loop = asyncio.get_running_loop()
+    found: asyncio.Queue = asyncio.Queue()
+    command_reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shard-commands")
+    # Курсоры, сдвинувшиеся с последней передачи; уходят родителю пачкой
+    moved: Dict[WalletKey, TrackedWallet] = {}
+    notifications.set_cursor_listener(lambda wallet: moved.__setitem__(wallet.key, wallet))
+
+    def send_cursors() -> None:
+        pending = list(moved.values())
+        moved.clear()
+        for wallet in pending:
+            results.put((wallet, []))
+
+    async def forward() -> None:
+        while True:
+            wallet, new_txs = await found.get()
+            # Курсор уйдет вместе с транзакциями
+            moved.pop(wallet.key, None)
+            results.put((wallet, new_txs))
+
+    async def sync_cursors() -> None:
+        while True:
+            await asyncio.sleep(CURSOR_SYNC_INTERVAL_SECONDS)
+            send_cursors()
+
+    tasks = [
+        asyncio.create_task(notifications.run_monitors(interval_seconds, found, blockchains)),
+        asyncio.create_task(forward()),
+        asyncio.create_task(sync_cursors()),
+    ]
+    try:
+        while True:
+            command, payload = await loop.run_in_executor(command_reader, commands.get)
+            if command == "add":
+                notifications.restore_tracked_wallet(payload)
+            elif command == "remove":
+                notifications.discard_tracked_wallet(payload)
+            elif command == "stop":
+                break
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        send_cursors()
+        command_reader.shutdown(wait=False)
+        await http_client.close()
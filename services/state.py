@@ -0,0 +1,407 @@
+"""
+Общее состояние бота: FSM, подписки, курсоры и аренда лидера
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from config import config
+from services.registry import TrackedWallet
+from services.storage import WalletStore
+from utils.redis_client import RedisClient, RedisError
+
+logger = logging.getLogger(__name__)
+
+# Подписка: (chat_id, сеть, адрес)
+Subscription = Tuple[int, str, str]
+
+
+class StateBackend(ABC):
+    """Хранилище состояния бота
+
+    Запись подписок и курсоров буферизуется и сбрасывается пачками, как в
+    WalletStore. shared=True означает, что состояние видят другие реплики:
+    тогда изменения подписок отслеживаются через version(), а опрос сетей
+    ведет только держатель аренды (см. LeaderElection).
+    """
+
+    shared = False
+
+    @abstractmethod
+    def fsm_storage(self) -> BaseStorage:
+        """Хранилище FSM для Dispatcher"""
+
+    @abstractmethod
+    async def open(self) -> None: ...
+
+    @abstractmethod
+    async def close(self) -> None: ...
+
+    @abstractmethod
+    async def load(self) -> Tuple[List[TrackedWallet], List[Subscription]]:
+        """Кошельки с курсорами и подписки"""
+
+    @abstractmethod
+    def add_subscription(self, chat_id: int, blockchain: str, address: str) -> None: ...
+
+    @abstractmethod
+    def remove_subscription(self, chat_id: int, blockchain: str, address: str) -> None: ...
+
+    @abstractmethod
+    def remove_wallet(self, wallet: TrackedWallet) -> None: ...
+
+    @abstractmethod
+    def save_wallet(self, wallet: TrackedWallet) -> None:
+        """Сохранение курсора кошелька при следующем сбросе"""
+
+    @abstractmethod
+    async def flush(self) -> None: ...
+
+    @abstractmethod
+    async def version(self) -> int:
+        """Счетчик изменений подписок; растет при каждом добавлении и удалении"""
+
+    @abstractmethod
+    async def acquire_lease(self, name: str, owner: str, ttl_seconds: float) -> bool:
+        """Захват свободной аренды или продление своей"""
+
+    @abstractmethod
+    async def release_lease(self, name: str, owner: str) -> None: ...
+
+
+class LocalStateBackend(StateBackend):
+    """Состояние одной реплики: SQLite для подписок и курсоров, FSM в памяти"""
+
+    def __init__(self, store: WalletStore):
+        self._store = store
+        self._fsm = MemoryStorage()
+        self._version = 0
+        self._leases: Dict[str, Tuple[str, float]] = {}
+
+    def fsm_storage(self) -> BaseStorage:
+        return self._fsm
+
+    async def open(self) -> None:
+        await self._store.open()
+
+    async def close(self) -> None:
+        await self._store.close()
+        await self._fsm.close()
+
+    async def load(self) -> Tuple[List[TrackedWallet], List[Subscription]]:
+        return await self._store.load()
+
+    def add_subscription(self, chat_id: int, blockchain: str, address: str) -> None:
+        self._version += 1
+        self._store.add_subscription(chat_id, blockchain, address)
+
+    def remove_subscription(self, chat_id: int, blockchain: str, address: str) -> None:
+        self._version += 1
+        self._store.remove_subscription(chat_id, blockchain, address)
+
+    def remove_wallet(self, wallet: TrackedWallet) -> None:
+        self._store.remove_wallet(wallet)
+
+    def save_wallet(self, wallet: TrackedWallet) -> None:
+        self._store.save_wallet(wallet)
+
+    async def flush(self) -> None:
+        await self._store.flush()
+
+    async def version(self) -> int:
+        return self._version
+
+    async def acquire_lease(self, name: str, owner: str, ttl_seconds: float) -> bool:
+        now = time.monotonic()
+        holder = self._leases.get(name)
+        if holder is not None and holder[0] != owner and holder[1] > now:
+            return False
+        self._leases[name] = (owner, now + ttl_seconds)
+        return True
+
+    async def release_lease(self, name: str, owner: str) -> None:
+        if self._leases.get(name, (None,))[0] == owner:
+            del self._leases[name]
+
+
+class RedisFSMStorage(BaseStorage):
+    """FSM aiogram поверх протокола Redis: состояние и данные в отдельных ключах"""
+
+    def __init__(self, client: RedisClient, prefix: str):
+        self._client = client
+        self._prefix = prefix
+
+    def _key(self, key: StorageKey, part: str) -> str:
+        parts = [self._prefix, "fsm", str(key.bot_id), str(key.chat_id), str(key.user_id)]
+        if key.thread_id is not None:
+            parts.append(str(key.thread_id))
+        parts.extend([key.destiny, part])
+        return ":".join(parts)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        value = state.state if isinstance(state, State) else state
+        if value is None:
+            await self._client.execute("DEL", self._key(key, "state"))
+        else:
+            await self._client.execute("SET", self._key(key, "state"), value)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return await self._client.execute("GET", self._key(key, "state"))
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        if not data:
+            await self._client.execute("DEL", self._key(key, "data"))
+        else:
+            await self._client.execute("SET", self._key(key, "data"), json.dumps(data))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        value = await self._client.execute("GET", self._key(key, "data"))
+        return json.loads(value) if value else {}
+
+    async def close(self) -> None:
+        # Соединение принадлежит RedisStateBackend и закрывается вместе с ним
+        pass
+
+
+class RedisStateBackend(StateBackend):
+    """Состояние, общее для нескольких реплик, на сервере с протоколом Redis
+
+    Раскладка ключей (prefix по умолчанию "wallet_tracker"):
+        {prefix}:wallets        hash "сеть:адрес" -> JSON с курсором
+        {prefix}:subscriptions  hash "chat_id:сеть:адрес" -> время подписки
+        {prefix}:version        счетчик изменений подписок
+        {prefix}:lease:{name}   владелец аренды, истекает через PX
+    """
+
+    shared = True
+
+    def __init__(self, url: str, prefix: str = "wallet_tracker", flush_interval_seconds: float = 1.0):
+        self._client = RedisClient(url)
+        self._prefix = prefix
+        self._flush_interval_seconds = flush_interval_seconds
+        self._fsm = RedisFSMStorage(self._client, prefix)
+        self._operations: List[tuple] = []
+        # Ключ — поле хеша wallets: "сеть:адрес" в том виде, как адрес хранится
+        self._dirty_wallets: Dict[str, TrackedWallet] = {}
+        # Кошельки, удаленные во время текущего сброса: их курсоры не возвращаются в буфер
+        self._removed_while_flushing: Set[str] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+    def _key(self, name: str) -> str:
+        return f"{self._prefix}:{name}"
+
+    def fsm_storage(self) -> BaseStorage:
+        return self._fsm
+
+    async def open(self) -> None:
+        await self._client.execute("PING")
+        self._flush_task = asyncio.create_task(self._flush_forever())
+
+    async def close(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+        await self._client.close()
+
+    async def load(self) -> Tuple[List[TrackedWallet], List[Subscription]]:
+        wallets_raw, subscriptions_raw = await self._client.pipeline([
+            ("HGETALL", self._key("wallets")),
+            ("HGETALL", self._key("subscriptions")),
+        ])
+        wallets = []
+        for field, value in _pairs(wallets_raw):
+            blockchain, address = field.split(":", 1)
+            cursor = json.loads(value)
+            wallets.append(
+                TrackedWallet(
+                    address=address,
+                    blockchain=blockchain,
+                    last_seen_hash=cursor.get("last_seen_hash"),
+                    last_block=cursor.get("last_block"),
+                    last_lt=cursor.get("last_lt"),
+                )
+            )
+        subscriptions = []
+        for field, created_at in sorted(_pairs(subscriptions_raw), key=lambda item: float(item[1])):
+            chat_id, blockchain, address = field.split(":", 2)
+            subscriptions.append((int(chat_id), blockchain, address))
+        return wallets, subscriptions
+
+    def add_subscription(self, chat_id: int, blockchain: str, address: str) -> None:
+        self._operations.append(
+            ("HSETNX", self._key("subscriptions"), f"{chat_id}:{blockchain}:{address}", time.time())
+        )
+        self._operations.append(("INCR", self._key("version")))
+
+    def remove_subscription(self, chat_id: int, blockchain: str, address: str) -> None:
+        self._operations.append(
+            ("HDEL", self._key("subscriptions"), f"{chat_id}:{blockchain}:{address}")
+        )
+        self._operations.append(("INCR", self._key("version")))
+
+    def remove_wallet(self, wallet: TrackedWallet) -> None:
+        field = _wallet_field(wallet)
+        self._dirty_wallets.pop(field, None)
+        self._removed_while_flushing.add(field)
+        self._operations.append(("HDEL", self._key("wallets"), field))
+
+    def save_wallet(self, wallet: TrackedWallet) -> None:
+        self._dirty_wallets[_wallet_field(wallet)] = wallet
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            if not self._operations and not self._dirty_wallets:
+                return
+            operations, self._operations = self._operations, []
+            dirty, self._dirty_wallets = self._dirty_wallets, {}
+            self._removed_while_flushing = set()
+            commands = list(operations)
+            if dirty:
+                fields: List[Any] = []
+                for field, wallet in dirty.items():
+                    fields.append(field)
+                    fields.append(json.dumps({
+                        "last_seen_hash": wallet.last_seen_hash,
+                        "last_block": wallet.last_block,
+                        "last_lt": wallet.last_lt,
+                    }))
+                commands.append(("HSET", self._key("wallets"), *fields))
+            try:
+                replies = await self._client.pipeline(commands)
+            except Exception:
+                # Несохраненное вернется в буфер и уйдет со следующим сбросом;
+                # удаленные за время сброса кошельки не должны воскреснуть через HSET
+                self._operations[:0] = operations
+                for field, wallet in dirty.items():
+                    if field not in self._removed_while_flushing:
+                        self._dirty_wallets.setdefault(field, wallet)
+                raise
+            for reply in replies:
+                if isinstance(reply, RedisError):
+                    logger.warning("State backend rejected a write: %s", reply)
+
+    async def _flush_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self._flush_interval_seconds)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to flush state backend")
+
+    async def version(self) -> int:
+        return int(await self._client.execute("GET", self._key("version")) or 0)
+
+    async def acquire_lease(self, name: str, owner: str, ttl_seconds: float) -> bool:
+        key = self._key(f"lease:{name}")
+        ttl_ms = int(ttl_seconds * 1000)
+        if await self._client.execute("SET", key, owner, "NX", "PX", ttl_ms) == "OK":
+            return True
+        # Продление только своей аренды: WATCH не даст перезаписать чужую
+        return await self._client.compare_and_execute(key, owner, [("SET", key, owner, "PX", ttl_ms)])
+
+    async def release_lease(self, name: str, owner: str) -> None:
+        key = self._key(f"lease:{name}")
+        await self._client.compare_and_execute(key, owner, [("DEL", key)])
+
+
+def _pairs(flat: Optional[List[str]]) -> List[Tuple[str, str]]:
+    flat = flat or []
+    return list(zip(flat[::2], flat[1::2]))
+
+
+def _wallet_field(wallet: TrackedWallet) -> str:
+    return f"{wallet.blockchain}:{wallet.address}"
+
+
+class LeaderElection:
+    """Выполнение задачи только на той реплике, которая держит аренду
+
+    Аренда продлевается каждые ttl/3 секунд. Если продлить не удалось
+    (другая реплика перехватила аренду или хранилище недоступно дольше ttl),
+    задача отменяется, и реплика снова ждет освобождения аренды.
+    """
+
+    def __init__(self, backend: StateBackend, name: str, ttl_seconds: float = 15.0):
+        self._backend = backend
+        self._name = name
+        self._ttl = ttl_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+
+    async def run(self, task_factory: Callable[[], Awaitable[None]]) -> None:
+        try:
+            while True:
+                if not await self._try_acquire():
+                    await asyncio.sleep(self._ttl / 3)
+                    continue
+                logger.info("Acquired lease %s as %s", self._name, self.owner)
+                self.is_leader = True
+                task = asyncio.create_task(task_factory())
+                try:
+                    await self._hold(task)
+                finally:
+                    self.is_leader = False
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
+                await asyncio.sleep(self._ttl / 3)
+        finally:
+            try:
+                await self._backend.release_lease(self._name, self.owner)
+            except Exception:
+                logger.exception("Failed to release lease %s", self._name)
+
+    async def _hold(self, task: asyncio.Task) -> None:
+        """Продление аренды, пока задача работает"""
+        renewed_at = time.monotonic()
+        while True:
+            await asyncio.wait({task}, timeout=self._ttl / 3)
+            if task.done():
+                if not task.cancelled() and task.exception() is not None:
+                    logger.error("Leader task for lease %s failed: %r", self._name, task.exception())
+                return
+            renewed = await self._try_acquire()
+            if renewed:
+                renewed_at = time.monotonic()
+            elif renewed is False or time.monotonic() - renewed_at >= self._ttl * 2 / 3:
+                # Аренду перехватили или она вот-вот истечет без продления
+                logger.warning("Lost lease %s, stopping leader task", self._name)
+                return
+
+    async def _try_acquire(self) -> Optional[bool]:
+        """True/False — ответ хранилища, None — хранилище недоступно"""
+        try:
+            return await self._backend.acquire_lease(self._name, self.owner, self._ttl)
+        except Exception:
+            logger.exception("Failed to renew lease %s", self._name)
+            return None
+
+
+def build_state_backend() -> StateBackend:
+    """Хранилище состояния согласно STATE_BACKEND"""
+    if config.state_backend == "redis":
+        return RedisStateBackend(
+            config.redis_url,
+            prefix=config.redis_prefix,
+            flush_interval_seconds=config.database_flush_interval_seconds,
+        )
+    return LocalStateBackend(
+        WalletStore(config.database_path, config.database_flush_interval_seconds)
+    )
@@ -0,0 +1,196 @@
+"""
+Постоянное хранилище подписок и курсоров в SQLite
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+
+from services.registry import TrackedWallet
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS wallets (
+    blockchain TEXT NOT NULL,
+    address TEXT NOT NULL,
+    last_seen_hash TEXT,
+    last_block INTEGER,
+    last_lt INTEGER,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (blockchain, address)
+);
+CREATE TABLE IF NOT EXISTS subscriptions (
+    chat_id INTEGER NOT NULL,
+    blockchain TEXT NOT NULL,
+    address TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (chat_id, blockchain, address)
+);
+CREATE INDEX IF NOT EXISTS idx_subscriptions_wallet ON subscriptions (blockchain, address);
+"""
+
+# Операция над подписками: (SQL, параметры)
+_Operation = Tuple[str, tuple]
+
+
+class WalletStore:
+    """Хранилище подписок и курсоров кошельков в SQLite (WAL)
+
+    Запись копится в памяти и сбрасывается одной транзакцией раз в
+    flush_interval_seconds в отдельном потоке, поэтому event loop не блокируется.
+    Курсоры одного кошелька между сбросами схлопываются в одну запись.
+    """
+
+    def __init__(self, path: str, flush_interval_seconds: float = 1.0):
+        self._path = path
+        self._flush_interval_seconds = flush_interval_seconds
+        # Один поток: соединение SQLite используется только из него
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="wallet-store")
+        self._connection: Optional[sqlite3.Connection] = None
+        self._operations: List[_Operation] = []
+        # Ключ — (сеть, адрес) в том виде, в каком строка лежит в таблице
+        self._dirty_wallets: Dict[Tuple[str, str], tuple] = {}
+        # Кошельки, удаленные во время текущего сброса: их курсоры не возвращаются в буфер
+        self._removed_while_flushing: Set[Tuple[str, str]] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+    async def open(self) -> None:
+        await self._run(self._open)
+        self._flush_task = asyncio.create_task(self._flush_forever())
+
+    async def close(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+        await self._run(self._close)
+        self._executor.shutdown(wait=True)
+
+    async def load(self) -> Tuple[List[TrackedWallet], List[Tuple[int, str, str]]]:
+        """Кошельки с курсорами и подписки (chat_id, сеть, адрес)"""
+        return await self._run(self._load)
+
+    def add_subscription(self, chat_id: int, blockchain: str, address: str) -> None:
+        self._operations.append((
+            "INSERT OR IGNORE INTO subscriptions (chat_id, blockchain, address, created_at) "
+            "VALUES (?, ?, ?, ?)",
+            (chat_id, blockchain, address, time.time()),
+        ))
+
+    def remove_subscription(self, chat_id: int, blockchain: str, address: str) -> None:
+        self._operations.append((
+            "DELETE FROM subscriptions WHERE chat_id = ? AND blockchain = ? AND address = ?",
+            (chat_id, blockchain, address),
+        ))
+
+    def remove_wallet(self, wallet: TrackedWallet) -> None:
+        row = (wallet.blockchain, wallet.address)
+        self._dirty_wallets.pop(row, None)
+        self._removed_while_flushing.add(row)
+        self._operations.append((
+            "DELETE FROM wallets WHERE blockchain = ? AND address = ?",
+            row,
+        ))
+
+    def save_wallet(self, wallet: TrackedWallet) -> None:
+        """Сохранение курсора кошелька при следующем сбросе"""
+        self._dirty_wallets[(wallet.blockchain, wallet.address)] = (
+            wallet.blockchain,
+            wallet.address,
+            wallet.last_seen_hash,
+            wallet.last_block,
+            wallet.last_lt,
+            time.time(),
+        )
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            if not self._operations and not self._dirty_wallets:
+                return
+            operations, self._operations = self._operations, []
+            dirty, self._dirty_wallets = self._dirty_wallets, {}
+            self._removed_while_flushing = set()
+            try:
+                await self._run(self._write, operations, list(dirty.values()))
+            except Exception:
+                # Несохраненное вернется в буфер и уйдет со следующим сбросом;
+                # более новые курсоры, записанные за время сброса, важнее
+                self._operations[:0] = operations
+                for row, values in dirty.items():
+                    if row not in self._removed_while_flushing:
+                        self._dirty_wallets.setdefault(row, values)
+                raise
+
+    async def _flush_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self._flush_interval_seconds)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to flush wallet store")
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _open(self) -> None:
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(self._path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(_SCHEMA)
+        self._connection.commit()
+
+    def _close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _load(self) -> Tuple[List[TrackedWallet], List[Tuple[int, str, str]]]:
+        wallets = [
+            TrackedWallet(
+                address=address,
+                blockchain=blockchain,
+                last_seen_hash=last_seen_hash,
+                last_block=last_block,
+                last_lt=last_lt,
+            )
+            for blockchain, address, last_seen_hash, last_block, last_lt in self._connection.execute(
+                "SELECT blockchain, address, last_seen_hash, last_block, last_lt FROM wallets"
+            )
+        ]
+        subscriptions = list(
+            self._connection.execute(
+                "SELECT chat_id, blockchain, address FROM subscriptions ORDER BY created_at"
+            )
+        )
+        return wallets, subscriptions
+
+    def _write(self, operations: List[_Operation], wallets: List[tuple]) -> None:
+        with self._connection:
+            for sql, params in operations:
+                self._connection.execute(sql, params)
+            self._connection.executemany(
+                "INSERT INTO wallets "
+                "(blockchain, address, last_seen_hash, last_block, last_lt, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (blockchain, address) DO UPDATE SET "
+                "last_seen_hash = excluded.last_seen_hash, "
+                "last_block = excluded.last_block, "
+                "last_lt = excluded.last_lt, "
+                "updated_at = excluded.updated_at",
+                wallets,
+            )
@@ -1,22 +1,176 @@
 """
 Единая инициализация трекеров блокчейнов
 """
-from blockchain import TONWalletTracker, ETHWalletTracker, BSCWalletTracker
-from config import config
+from blockchain import EVMWalletTracker, TONWalletTracker
+from config import ProviderQuota, config
+from utils import transaction_renderer
+from utils.metrics import metrics
+from utils.network import CacheSweeper, HttpClient, SingleFlight, TokenBucketRateLimiter
+
+# Общий пул соединений для всех трекеров; открывается и закрывается в bot.py
+http_client = HttpClient(
+    limit=config.http_pool_limit,
+    limit_per_host=config.http_pool_limit_per_host,
+    dns_cache_ttl=config.http_dns_cache_ttl,
+    keepalive_timeout=config.http_keepalive_timeout,
+    timeout_seconds=config.http_timeout_seconds,
+)
+# Общий слой объединения одинаковых запросов; ключ включает сеть
+single_flight = SingleFlight()
+
+
+def _build_rate_limiter(quota: ProviderQuota) -> TokenBucketRateLimiter:
+    return TokenBucketRateLimiter(
+        rate=quota.rate,
+        burst=quota.burst,
+        daily_budget=quota.daily_limit,
+    )
+
+
+provider_quotas = {"TON": config.toncenter_quota}
+rate_limiters = {"TON": _build_rate_limiter(config.toncenter_quota)}
+
+
+def _share_evm_limiters() -> None:
+    """Квота Etherscan API v2 считается по ключу, а не по сети: сети с одним ключом делят лимитер"""
+    quotas: dict = {}
+    limiters: dict = {}
+    for chain in config.evm_chains:
+        if chain.api_key not in limiters:
+            quotas[chain.api_key] = chain.quota
+            limiters[chain.api_key] = _build_rate_limiter(chain.quota)
+        provider_quotas[chain.blockchain] = quotas[chain.api_key]
+        rate_limiters[chain.blockchain] = limiters[chain.api_key]
+
+
+_share_evm_limiters()
 
 ton_tracker = TONWalletTracker(
     cache_ttl_seconds=config.cache_ttl_seconds,
+    cache_max_entries=config.cache_max_entries,
+    cache_max_bytes=config.cache_max_bytes,
     rate_limit_min_interval=config.rate_limit_min_interval,
+    http_client=http_client,
+    single_flight=single_flight,
+    rate_limiter=rate_limiters["TON"],
+    batch_window_seconds=config.ton_batch_window_ms / 1000,
+    batch_max_size=config.ton_batch_max_size,
+    base_url=config.toncenter_api_url,
 )
-eth_tracker = ETHWalletTracker(
-    api_key=config.etherscan_api_key,
-    cache_ttl_seconds=config.cache_ttl_seconds,
-    rate_limit_min_interval=config.rate_limit_min_interval,
+evm_trackers = {
+    chain.blockchain: EVMWalletTracker(
+        blockchain=chain.blockchain,
+        chain_id=chain.chain_id,
+        currency=chain.currency,
+        explorer_url=chain.explorer_url,
+        api_key=chain.api_key,
+        cache_ttl_seconds=config.cache_ttl_seconds,
+        cache_max_entries=config.cache_max_entries,
+        cache_max_bytes=config.cache_max_bytes,
+        rate_limit_min_interval=config.rate_limit_min_interval,
+        http_client=http_client,
+        single_flight=single_flight,
+        rate_limiter=rate_limiters[chain.blockchain],
+        base_url=config.etherscan_api_url,
+    )
+    for chain in config.evm_chains
+}
+evm_chains = {chain.blockchain: chain for chain in config.evm_chains}
+trackers = {"TON": ton_tracker, **evm_trackers}
+
+# Число параллельных воркеров опроса для каждой сети
+monitor_concurrency = {
+    blockchain: quota.concurrency for blockchain, quota in provider_quotas.items()
+}
+
+
+def share_quotas(parts: int) -> None:
+    """Ограничение трекеров долей квот, когда мониторинг разделен на parts процессов
+
+    Общий для нескольких сетей лимитер перенастраивается несколько раз одной и той же долей.
+    """
+    for blockchain, quota in provider_quotas.items():
+        share = quota.split(parts)
+        rate_limiters[blockchain].reconfigure(share.rate, share.burst, share.daily_limit)
+        monitor_concurrency[blockchain] = share.concurrency
+
+
+cache_sweeper = CacheSweeper(
+    (cache for tracker in trackers.values() for cache in tracker.caches().values()),
+    config.cache_sweep_interval_seconds,
 )
-bsc_tracker = BSCWalletTracker(
-    api_key=config.bscscan_api_key,
-    cache_ttl_seconds=config.cache_ttl_seconds,
-    rate_limit_min_interval=config.rate_limit_min_interval,
+
+cache_hits = metrics.counter("cache_hits_total", "Cache lookups that found a value", ("owner", "cache"))
+cache_misses = metrics.counter("cache_misses_total", "Cache lookups that found nothing", ("owner", "cache"))
+cache_evictions = metrics.counter("cache_evictions_total", "Entries evicted by size limits", ("owner", "cache"))
+cache_entries = metrics.gauge("cache_entries", "Entries held in a cache", ("owner", "cache"))
+# Лимитер Etherscan общий для сетей с одним ключом, поэтому метка — список этих сетей
+limiter_acquired = metrics.counter(
+    "rate_limiter_acquired_total", "Tokens taken from a rate limiter", ("limiter",)
+)
+limiter_wait = metrics.counter(
+    "rate_limiter_wait_seconds_total", "Time callers were told to wait by a rate limiter", ("limiter",)
+)
+limiter_used_today = metrics.gauge(
+    "rate_limiter_used_today", "Requests counted against the daily budget", ("limiter",)
+)
+limiter_daily_budget = metrics.gauge("rate_limiter_daily_budget", "Daily request budget", ("limiter",))
+http_requests = metrics.counter("http_client_requests_total", "Requests sent through the shared HTTP pool")
+http_connections = metrics.counter(
+    "http_client_connections_total", "Connections opened or reused by the shared HTTP pool", ("state",)
 )
+single_flight_calls = metrics.counter(
+    "single_flight_calls_total", "Identical concurrent requests executed or coalesced", ("result",)
+)
+
+
+def _collect_metrics() -> None:
+    """Перенос счетчиков stats() трекеров, лимитеров и пула в метрики"""
+    caches = [
+        (blockchain, name, cache)
+        for blockchain, tracker in trackers.items()
+        for name, cache in tracker.caches().items()
+    ]
+    caches.append(("formatter", "rendered_transactions", transaction_renderer))
+    for owner, name, cache in caches:
+        stats = cache.stats()
+        cache_hits.labels(owner, name).set(stats["hits"])
+        cache_misses.labels(owner, name).set(stats["misses"])
+        cache_evictions.labels(owner, name).set(stats["evictions"])
+        cache_entries.labels(owner, name).set(stats["size"])
+
+    shared: dict = {}
+    for blockchain, limiter in rate_limiters.items():
+        shared.setdefault(id(limiter), (limiter, []))[1].append(blockchain)
+    for limiter, chains in shared.values():
+        label = ",".join(chains)
+        stats = limiter.stats()
+        limiter_acquired.labels(label).set(stats["acquired"])
+        limiter_wait.labels(label).set(limiter.wait_seconds_total)
+        limiter_used_today.labels(label).set(stats["used_today"])
+        if stats["daily_budget"] is not None:
+            limiter_daily_budget.labels(label).set(stats["daily_budget"])
+
+    stats = http_client.stats()
+    http_requests.labels().set(stats["requests"])
+    http_connections.labels("created").set(stats["connections_created"])
+    http_connections.labels("reused").set(stats["connections_reused"])
+    stats = single_flight.stats()
+    single_flight_calls.labels("executed").set(stats["executed"])
+    single_flight_calls.labels("coalesced").set(stats["coalesced"])
+
+
+metrics.add_collector(_collect_metrics)
 
-__all__ = ["ton_tracker", "eth_tracker", "bsc_tracker"]
+__all__ = [
+    "http_client",
+    "single_flight",
+    "cache_sweeper",
+    "trackers",
+    "monitor_concurrency",
+    "rate_limiters",
+    "share_quotas",
+    "ton_tracker",
+    "evm_trackers",
+    "evm_chains",
+]
@@ -0,0 +1,138 @@
+"""
+HTTP-сервер бота: прием обновлений через webhook и проверки живости
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Callable, Dict, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class HealthState:
+    """Состояние для /healthz и /readyz; рядом выдается /metrics
+
+    Живость — процесс отвечает на запросы. Готовность — запуск завершен
+    и остановка еще не началась; балансировщик снимает трафик с реплики,
+    как только ready становится False.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self._details: Dict[str, Callable[[], Any]] = {}
+
+    def add_detail(self, name: str, getter: Callable[[], Any]) -> None:
+        """Дополнительное поле ответа /readyz (например, является ли реплика лидером)"""
+        self._details[name] = getter
+
+    async def healthz(self, request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok"})
+
+    async def readyz(self, request: web.Request) -> web.Response:
+        body = {"status": "ready" if self.ready else "not ready"}
+        for name, getter in self._details.items():
+            body[name] = getter()
+        return web.json_response(body, status=200 if self.ready else 503)
+
+    async def metrics(self, request: web.Request) -> web.Response:
+        """Метрики процесса в текстовом формате Prometheus"""
+        return web.Response(
+            text=metrics.render(),
+            content_type="text/plain",
+            headers={"Cache-Control": "no-cache"},
+        )
+
+    def register(self, app: web.Application) -> None:
+        app.router.add_get("/healthz", self.healthz)
+        app.router.add_get("/readyz", self.readyz)
+        app.router.add_get("/metrics", self.metrics)
+
+
+class BoundedRequestHandler(SimpleRequestHandler):
+    """Обработчик webhook с ограничением числа одновременно обрабатываемых обновлений
+
+    Ответ Telegram задерживается, пока не освободится слот, поэтому при
+    всплеске очередь остается на стороне Telegram, а не растет в памяти.
+    При остановке новые обновления не принимаются, а начатые дорабатываются
+    не дольше shutdown_timeout секунд.
+    """
+
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        bot: Bot,
+        secret_token: Optional[str],
+        max_concurrent_updates: int = 32,
+        shutdown_timeout: float = 10.0,
+        **data: Any,
+    ):
+        super().__init__(dispatcher, bot, handle_in_background=True, secret_token=secret_token, **data)
+        self._semaphore = asyncio.Semaphore(max_concurrent_updates)
+        self._shutdown_timeout = shutdown_timeout
+        self._closing = False
+
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+        if self._closing:
+            # Telegram повторит доставку, и ее примет другая реплика или этот процесс после перезапуска
+            return web.Response(status=503)
+        update = await request.json(loads=bot.session.json_loads)
+        await self._semaphore.acquire()
+        task = asyncio.create_task(self._background_feed_update(bot=bot, update=update))
+        self._background_feed_update_tasks.add(task)
+        task.add_done_callback(self._background_feed_update_tasks.discard)
+        task.add_done_callback(lambda _: self._semaphore.release())
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+    async def close(self) -> None:
+        self._closing = True
+        pending = set(self._background_feed_update_tasks)
+        if pending:
+            logger.info("Waiting for %s webhook updates to finish", len(pending))
+            _, not_done = await asyncio.wait(pending, timeout=self._shutdown_timeout)
+            for task in not_done:
+                task.cancel()
+        await super().close()
+
+
+def build_webhook_app(
+    dispatcher: Dispatcher,
+    bot: Bot,
+    health: HealthState,
+    path: str,
+    secret_token: Optional[str],
+    max_concurrent_updates: int,
+    shutdown_timeout: float,
+) -> web.Application:
+    app = web.Application()
+    BoundedRequestHandler(
+        dispatcher,
+        bot,
+        secret_token=secret_token,
+        max_concurrent_updates=max_concurrent_updates,
+        shutdown_timeout=shutdown_timeout,
+    ).register(app, path=path)
+    health.register(app)
+    setup_application(app, dispatcher, bot=bot)
+    return app
+
+
+async def start_site(app: web.Application, host: str, port: int) -> web.AppRunner:
+    """Запуск приложения; runner.cleanup() останавливает прием и вызывает on_shutdown"""
+    runner = web.AppRunner(app, handle_signals=False)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info("HTTP server listening on %s:%s", host, port)
+    return runner
+
+
+def build_health_app(health: HealthState) -> web.Application:
+    app = web.Application()
+    health.register(app)
+    return app
@@ -38,11 +38,12 @@ async def test_ton():
     if transactions:
         print(f"   Найдено транзакций: {len(transactions)}")
         for i, tx in enumerate(transactions[:3], 1):
-            print(f"   {i}. {tx['type']}: {tx['amount']} TON")
+            print(f"   {i}. {tx.type}: {tx.amount} TON")
     else:
         print("   ❌ Транзакции не найдены")
     
     print(f"\n🔗 Explorer: {tracker.get_explorer_link(address)}")
+    await tracker.close()
 
 async def test_eth():
     """Тест Ethereum API"""
@@ -70,11 +71,12 @@ async def test_eth():
     if transactions:
         print(f"   Найдено транзакций: {len(transactions)}")
         for i, tx in enumerate(transactions[:3], 1):
-            print(f"   {i}. {tx['type']}: {tx['amount']} ETH")
+            print(f"   {i}. {tx.type}: {tx.amount} ETH")
     else:
         print("   ❌ Транзакции не найдены")
     
     print(f"\n🔗 Explorer: {tracker.get_explorer_link(address)}")
+    await tracker.close()
 
 async def test_bsc():
     """Тест BSC API"""
@@ -102,11 +104,12 @@ async def test_bsc():
     if transactions:
         print(f"   Найдено транзакций: {len(transactions)}")
         for i, tx in enumerate(transactions[:3], 1):
-            print(f"   {i}. {tx['type']}: {tx['amount']} BNB")
+            print(f"   {i}. {tx.type}: {tx.amount} BNB")
     else:
         print("   ❌ Транзакции не найдены")
     
     print(f"\n🔗 Explorer: {tracker.get_explorer_link(address)}")
+    await tracker.close()
 
 async def main():
     """Главная функция"""
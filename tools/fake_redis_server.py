@@ -0,0 +1,312 @@
+"""
+Локальная замена сервера Redis для проверки нескольких реплик без внешних зависимостей
+
+    python tools/fake_redis_server.py --port 6390
+
+Затем в .env каждой реплики:
+    STATE_BACKEND=redis
+    REDIS_URL=redis://127.0.0.1:6390/0
+
+Поддерживается подмножество команд, которое использует бот: строки с
+истечением (SET NX/XX/PX/EX), счетчики, хеши и оптимистичные транзакции
+WATCH/MULTI/EXEC. Данные живут только в памяти процесса.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("fake_redis_server")
+
+
+class CommandError(Exception):
+    pass
+
+
+class Database:
+    def __init__(self):
+        self.values: Dict[str, Any] = {}
+        self.expires: Dict[str, float] = {}
+        # Номер изменения ключа: по нему EXEC определяет, трогали ли ключи после WATCH
+        self.revisions: Dict[str, int] = {}
+        self.commands = 0
+
+    def touch(self, key: str) -> None:
+        self.revisions[key] = self.revisions.get(key, 0) + 1
+
+    def get(self, key: str) -> Any:
+        expires_at = self.expires.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.values[key]
+            del self.expires[key]
+            self.touch(key)
+        return self.values.get(key)
+
+    def set(self, key: str, value: Any, ttl_ms: Optional[int] = None) -> None:
+        self.values[key] = value
+        if ttl_ms is None:
+            self.expires.pop(key, None)
+        else:
+            self.expires[key] = time.monotonic() + ttl_ms / 1000
+        self.touch(key)
+
+    def delete(self, key: str) -> bool:
+        existed = self.get(key) is not None
+        self.values.pop(key, None)
+        self.expires.pop(key, None)
+        if existed:
+            self.touch(key)
+        return existed
+
+    def hash(self, key: str, create: bool = False) -> Optional[Dict[str, str]]:
+        value = self.get(key)
+        if value is None and create:
+            value = {}
+            self.values[key] = value
+        if value is not None and not isinstance(value, dict):
+            raise CommandError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return value
+
+
+class Session:
+    """Состояние одного клиентского соединения: WATCH и очередь MULTI"""
+
+    def __init__(self, db: Database):
+        self.db = db
+        self.watched: Dict[str, int] = {}
+        self.queued: Optional[List[List[str]]] = None
+
+    def execute(self, args: List[str]) -> Any:
+        name = args[0].upper()
+        if self.queued is not None and name not in ("EXEC", "DISCARD", "MULTI", "WATCH"):
+            self.queued.append(args)
+            return "+QUEUED"
+        handler = getattr(self, f"cmd_{name.lower()}", None)
+        if handler is None:
+            raise CommandError(f"ERR unknown command '{args[0]}'")
+        self.db.commands += 1
+        return handler(*args[1:])
+
+    def cmd_ping(self, *args):
+        return args[0] if args else "+PONG"
+
+    def cmd_auth(self, *args):
+        return "+OK"
+
+    def cmd_select(self, index):
+        return "+OK"
+
+    def cmd_quit(self):
+        return "+OK"
+
+    def cmd_flushall(self, *args):
+        for key in list(self.db.values):
+            self.db.delete(key)
+        return "+OK"
+
+    def cmd_dbsize(self):
+        return sum(1 for key in list(self.db.values) if self.db.get(key) is not None)
+
+    def cmd_get(self, key):
+        value = self.db.get(key)
+        if isinstance(value, dict):
+            raise CommandError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return value
+
+    def cmd_set(self, key, value, *options):
+        ttl_ms = None
+        only_new = only_existing = False
+        options = [option.upper() for option in options]
+        i = 0
+        while i < len(options):
+            option = options[i]
+            if option == "NX":
+                only_new = True
+            elif option == "XX":
+                only_existing = True
+            elif option in ("PX", "EX"):
+                i += 1
+                ttl_ms = int(options[i]) * (1 if option == "PX" else 1000)
+            else:
+                raise CommandError("ERR syntax error")
+            i += 1
+        exists = self.db.get(key) is not None
+        if (only_new and exists) or (only_existing and not exists):
+            return None
+        self.db.set(key, value, ttl_ms)
+        return "+OK"
+
+    def cmd_del(self, *keys):
+        return sum(self.db.delete(key) for key in keys)
+
+    def cmd_exists(self, *keys):
+        return sum(self.db.get(key) is not None for key in keys)
+
+    def cmd_incr(self, key):
+        value = int(self.db.get(key) or 0) + 1
+        self.db.set(key, str(value))
+        return value
+
+    def cmd_hset(self, key, *pairs):
+        if not pairs or len(pairs) % 2:
+            raise CommandError("ERR wrong number of arguments for 'hset' command")
+        data = self.db.hash(key, create=True)
+        added = 0
+        for field, value in zip(pairs[::2], pairs[1::2]):
+            added += field not in data
+            data[field] = value
+        self.db.touch(key)
+        return added
+
+    def cmd_hsetnx(self, key, field, value):
+        data = self.db.hash(key, create=True)
+        if field in data:
+            return 0
+        data[field] = value
+        self.db.touch(key)
+        return 1
+
+    def cmd_hget(self, key, field):
+        data = self.db.hash(key)
+        return data.get(field) if data else None
+
+    def cmd_hdel(self, key, *fields):
+        data = self.db.hash(key)
+        if not data:
+            return 0
+        removed = sum(data.pop(field, None) is not None for field in fields)
+        if removed:
+            if not data:
+                self.db.delete(key)
+            self.db.touch(key)
+        return removed
+
+    def cmd_hgetall(self, key):
+        data = self.db.hash(key) or {}
+        return [item for pair in data.items() for item in pair]
+
+    def cmd_watch(self, *keys):
+        if self.queued is not None:
+            raise CommandError("ERR WATCH inside MULTI is not allowed")
+        for key in keys:
+            self.db.get(key)
+            self.watched[key] = self.db.revisions.get(key, 0)
+        return "+OK"
+
+    def cmd_unwatch(self):
+        self.watched.clear()
+        return "+OK"
+
+    def cmd_multi(self):
+        if self.queued is not None:
+            raise CommandError("ERR MULTI calls can not be nested")
+        self.queued = []
+        return "+OK"
+
+    def cmd_discard(self):
+        if self.queued is None:
+            raise CommandError("ERR DISCARD without MULTI")
+        self.queued = None
+        self.watched.clear()
+        return "+OK"
+
+    def cmd_exec(self):
+        if self.queued is None:
+            raise CommandError("ERR EXEC without MULTI")
+        queued, self.queued = self.queued, None
+        watched, self.watched = self.watched, {}
+        for key, revision in watched.items():
+            self.db.get(key)
+            if self.db.revisions.get(key, 0) != revision:
+                return None
+        results = []
+        for args in queued:
+            try:
+                results.append(self.execute(args))
+            except CommandError as e:
+                results.append(e)
+        return results
+
+
+def encode(value: Any) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, CommandError):
+        return f"-{value}\r\n".encode()
+    if isinstance(value, bool):
+        value = int(value)
+    if isinstance(value, int):
+        return f":{value}\r\n".encode()
+    if isinstance(value, list):
+        return f"*{len(value)}\r\n".encode() + b"".join(encode(item) for item in value)
+    if isinstance(value, str) and value.startswith("+"):
+        return f"{value}\r\n".encode()
+    data = str(value).encode()
+    return b"$%d\r\n%s\r\n" % (len(data), data)
+
+
+async def read_command(reader: asyncio.StreamReader) -> Optional[List[str]]:
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        # Inline-команда (например, из telnet)
+        return line.decode().split()
+    args = []
+    for _ in range(int(line[1:-2])):
+        length = int((await reader.readline())[1:-2])
+        args.append((await reader.readexactly(length + 2))[:-2].decode())
+    return args
+
+
+async def handle_client(db: Database, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    session = Session(db)
+    try:
+        while True:
+            args = await read_command(reader)
+            if not args:
+                break
+            try:
+                reply = session.execute(args)
+            except CommandError as e:
+                reply = e
+            except (TypeError, ValueError):
+                reply = CommandError(f"ERR wrong arguments for '{args[0]}' command")
+            writer.write(encode(reply))
+            await writer.drain()
+            if args[0].upper() == "QUIT":
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host: str, port: int) -> None:
+    db = Database()
+    server = await asyncio.start_server(lambda r, w: handle_client(db, r, w), host, port)
+    logger.info("Fake Redis listening on %s:%s", host, port)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        logger.info("Served %s commands, %s keys", db.commands, len(db.values))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
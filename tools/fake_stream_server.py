@@ -0,0 +1,203 @@
+"""
+Локальная замена потоковых API для проверки и нагрузочного тестирования push-режима
+
+    python tools/fake_stream_server.py --port 8765 --interval 1 --evm-address 0x...
+
+Затем в .env:
+    TON_MONITOR_MODE=stream
+    TON_STREAM_URL=ws://127.0.0.1:8765/ton
+    ETH_MONITOR_MODE=stream
+    ETH_WS_URL=ws://127.0.0.1:8765/evm
+
+/ton  — подписка {"operation": "subscribe", "addresses": [...]}, в ответ периодически
+        приходят синтетические транзакции подписанных адресов в формате toncenter v3
+/evm  — JSON-RPC: eth_subscribe("newHeads"), eth_getBlockByNumber, eth_blockNumber;
+        часть транзакций каждого блока адресована кошелькам из --evm-address
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import time
+from typing import Dict, List
+
+from aiohttp import WSMsgType, web
+
+logger = logging.getLogger("fake_stream_server")
+
+
+def _hex_hash(*parts) -> str:
+    return "0x" + hashlib.sha256("/".join(map(str, parts)).encode()).hexdigest()
+
+
+def _random_evm_address() -> str:
+    return "0x" + "".join(random.choice("0123456789abcdef") for _ in range(40))
+
+
+class FakeStreamServer:
+    def __init__(self, interval: float, txs_per_event: int, evm_addresses: List[str], match_ratio: float):
+        self.interval = interval
+        self.txs_per_event = txs_per_event
+        self.evm_addresses = evm_addresses
+        self.match_ratio = match_ratio
+        self.started = time.time()
+        self.head = 1_000_000
+        self.lt = 50_000_000_000_000
+        self.sent_events = 0
+        self.sent_transactions = 0
+
+    async def ton(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse(heartbeat=30.0)
+        await ws.prepare(request)
+        addresses: List[str] = []
+
+        async def emit() -> None:
+            while True:
+                await asyncio.sleep(self.interval)
+                if addresses:
+                    await ws.send_json(self._ton_event(random.choice(addresses)))
+
+        sender = asyncio.create_task(emit())
+        try:
+            async for message in ws:
+                if message.type != WSMsgType.TEXT:
+                    continue
+                data = json.loads(message.data)
+                if data.get("operation") == "subscribe":
+                    addresses[:] = data.get("addresses", [])
+                    await ws.send_json({"id": data.get("id"), "status": "subscribed"})
+                    logger.info("TON client subscribed to %s addresses", len(addresses))
+        finally:
+            sender.cancel()
+        return ws
+
+    def _ton_event(self, address: str) -> Dict:
+        account = "0:" + hashlib.sha256(address.encode()).hexdigest()
+        transactions = []
+        for _ in range(self.txs_per_event):
+            self.lt += 1000
+            transactions.append(
+                {
+                    "account": account,
+                    "hash": _hex_hash("ton", self.lt),
+                    "lt": str(self.lt),
+                    "now": int(time.time()),
+                    "in_msg": {
+                        "source": "0:" + "1" * 64,
+                        "destination": account,
+                        "value": str(random.randint(1, 10**10)),
+                    },
+                    "out_msgs": [],
+                }
+            )
+        self.sent_events += 1
+        self.sent_transactions += len(transactions)
+        return {
+            "type": "transactions",
+            "finality": "finalized",
+            "transactions": transactions,
+            "address_book": {account: {"user_friendly": address}},
+        }
+
+    async def evm(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse(heartbeat=30.0)
+        await ws.prepare(request)
+        sender = None
+
+        async def emit(subscription: str) -> None:
+            while True:
+                await asyncio.sleep(self.interval)
+                self.head += 1
+                self.sent_events += 1
+                await ws.send_json(
+                    {
+                        "jsonrpc": "2.0",
+                        "method": "eth_subscription",
+                        "params": {"subscription": subscription, "result": self._header(self.head)},
+                    }
+                )
+
+        try:
+            async for message in ws:
+                if message.type != WSMsgType.TEXT:
+                    continue
+                data = json.loads(message.data)
+                method, params = data.get("method"), data.get("params", [])
+                result = None
+                if method == "eth_subscribe" and sender is None:
+                    result = "0x1"
+                    sender = asyncio.create_task(emit(result))
+                elif method == "eth_blockNumber":
+                    result = hex(self.head)
+                elif method == "eth_getBlockByNumber":
+                    result = self._block(int(params[0], 16))
+                await ws.send_json({"jsonrpc": "2.0", "id": data.get("id"), "result": result})
+        finally:
+            if sender is not None:
+                sender.cancel()
+        return ws
+
+    def _header(self, number: int) -> Dict:
+        return {
+            "number": hex(number),
+            "hash": _hex_hash("evm", number),
+            "parentHash": _hex_hash("evm", number - 1),
+            "timestamp": hex(int(self.started) + number - 1_000_000),
+        }
+
+    def _block(self, number: int) -> Dict:
+        # Содержимое блока детерминировано номером: повторный запрос дает тот же ответ
+        rng = random.Random(number)
+        transactions = []
+        for index in range(self.txs_per_event):
+            to_address = _random_evm_address()
+            if self.evm_addresses and rng.random() < self.match_ratio:
+                to_address = rng.choice(self.evm_addresses)
+            transactions.append(
+                {
+                    "hash": _hex_hash("evm", number, index),
+                    "blockNumber": hex(number),
+                    "from": _random_evm_address(),
+                    "to": to_address,
+                    "value": hex(rng.randint(1, 10**18)),
+                }
+            )
+        self.sent_transactions += len(transactions)
+        return dict(self._header(number), transactions=transactions)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--interval", type=float, default=1.0, help="секунд между событиями")
+    parser.add_argument("--txs-per-event", type=int, default=5)
+    parser.add_argument("--evm-address", action="append", default=[], help="адрес получателя в блоках")
+    parser.add_argument("--match-ratio", type=float, default=0.2, help="доля транзакций на --evm-address")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    server = FakeStreamServer(args.interval, args.txs_per_event, args.evm_address, args.match_ratio)
+    app = web.Application()
+    app.router.add_get("/ton", server.ton)
+    app.router.add_get("/evm", server.evm)
+
+    async def report(_app: web.Application) -> None:
+        elapsed = time.time() - server.started
+        logger.info(
+            "Sent %s events / %s transactions in %.0fs",
+            server.sent_events,
+            server.sent_transactions,
+            elapsed,
+        )
+
+    app.on_shutdown.append(report)
+    web.run_app(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,40 @@
 """
 Утилиты проекта
 """
-from .formatters import format_balance, format_transaction, format_wallet_info
-from .validators import detect_blockchain, is_valid_eth_address, is_valid_ton_address
+from .formatters import (
+    BLOCKCHAIN_EMOJI,
+    TELEGRAM_MESSAGE_LIMIT,
+    format_balance,
+    format_portfolio,
+    format_transaction,
+    format_wallet_info,
+    split_message,
+    telegram_length,
+    transaction_renderer,
+)
+from .validators import (
+    address_key,
+    detect_blockchain,
+    evm_address_key,
+    is_valid_eth_address,
+    is_valid_ton_address,
+    ton_address_key,
+)
 
 __all__ = [
+    "BLOCKCHAIN_EMOJI",
+    "TELEGRAM_MESSAGE_LIMIT",
     "format_balance",
+    "format_portfolio",
     "format_transaction",
     "format_wallet_info",
+    "split_message",
+    "telegram_length",
+    "transaction_renderer",
+    "address_key",
     "detect_blockchain",
+    "evm_address_key",
+    "ton_address_key",
     "is_valid_eth_address",
     "is_valid_ton_address",
 ]
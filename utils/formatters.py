@@ -1,8 +1,32 @@
 """
 Утилиты для форматирования данных
 """
-from datetime import datetime
-from typing import Dict, List
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, Iterable, List, Tuple
+
+if TYPE_CHECKING:
+    from blockchain.models import Transaction
+    from services.portfolio import Portfolio
+
+# Максимальная длина сообщения Telegram
+TELEGRAM_MESSAGE_LIMIT = 4096
+# Язык сообщений по умолчанию
+DEFAULT_LOCALE = "ru"
+# Сколько отрисованных транзакций держать в кэше
+RENDER_CACHE_MAX_ENTRIES = 10_000
+
+BLOCKCHAIN_EMOJI = {
+    'TON': '💎',
+    'ETH': '⟠',
+    'BNB': '🟡',
+    'POL': '🟣',
+    'ARB': '🔵',
+    'OP': '🔴',
+    'BASE': '🔷'
+}
 
 def format_balance(balance_data: Dict) -> str:
     """Форматирование баланса для отображения"""
@@ -14,88 +38,212 @@ def format_balance(balance_data: Dict) -> str:
     
     return f"💰 Баланс: {balance:.6f} {currency}"
 
-def format_transaction(tx: Dict, blockchain: str) -> str:
-    """Форматирование транзакции для отображения"""
-    tx_type = tx['type']
-    amount = tx['amount']
-    timestamp = tx['timestamp']
-    
-    # Форматирование даты
-    try:
-        date = datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
-    except:
-        date = "Unknown"
-    
-    # Иконка в зависимости от типа транзакции
-    icon = "📥" if tx_type == "incoming" else "📤"
-    
-    # Форматирование адресов
-    if tx_type == "incoming":
-        address = tx.get('from', 'Unknown')
-        address_label = "От"
-    else:
-        address = tx.get('to', 'Unknown')
-        address_label = "Кому"
-    
-    # Сокращение адреса
-    if len(address) > 10:
-        short_address = f"{address[:6]}...{address[-4:]}"
-    else:
-        short_address = address
-    
-    # Статус (если есть)
-    status = ""
-    if 'status' in tx:
-        if tx['status'] == 'success':
-            status = "✅"
-        elif tx['status'] == 'failed':
-            status = "❌"
-        else:
-            status = "⚠️"
-    
-    # Хеш транзакции
-    tx_hash = tx.get('hash', 'N/A')
-    if len(tx_hash) > 10:
-        short_hash = f"{tx_hash[:6]}...{tx_hash[-4:]}"
-    else:
-        short_hash = tx_hash
-    
-    return (
-        f"{icon} {tx_type.capitalize()}: {amount:.6f}\n"
-        f"   {address_label}: {short_address}\n"
-        f"   Дата: {date}\n"
-        f"   Hash: {short_hash} {status}"
-    )
-
-def format_wallet_info(address: str, blockchain: str, balance_data: Dict, transactions: List[Dict], explorer_link: str) -> str:
+def format_transaction(tx: Transaction, blockchain: str, locale: str = DEFAULT_LOCALE) -> str:
+    """Форматирование транзакции для отображения (через общий кэш отрисовки)"""
+    return transaction_renderer.render(tx, blockchain, locale)
+
+
+class TransactionRenderer:
+    """Отрисовка транзакций по заранее собранным шаблонам с ограниченным LRU-кэшем
+
+    Ключ — (сеть, хеш, локаль) плюс направление, адреса, сумма и статус:
+    у одного хеша бывает несколько переводов (сообщения TON), его видят обе
+    стороны, а статус из блока может уточниться по txlist. Одна транзакция,
+    попавшая в уведомления многих чатов и кошельков, отрисовывается один раз.
+    """
+
+    def __init__(self, max_entries: int = RENDER_CACHE_MAX_ENTRIES):
+        self._max_entries = max_entries
+        self._cache: OrderedDict[tuple, str] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def render(self, tx: Transaction, blockchain: str, locale: str = DEFAULT_LOCALE) -> str:
+        key = (
+            blockchain, tx.hash, locale, tx.type, tx.from_address, tx.to_address, tx.amount_raw, tx.status
+        )
+        text = self._cache.get(key)
+        if text is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return text
+        self.misses += 1
+        text = self._render(tx, _TEMPLATES.get(locale) or _TEMPLATES[DEFAULT_LOCALE])
+        self._cache[key] = text
+        if len(self._cache) > self._max_entries:
+            self._cache.popitem(last=False)
+            self.evictions += 1
+        return text
+
+    @staticmethod
+    def _render(tx: Transaction, templates: Dict) -> str:
+        try:
+            date = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(tx.timestamp))
+        except (OverflowError, OSError, ValueError):
+            date = templates["unknown_date"]
+        incoming = tx.incoming
+        icon, kind, label = templates["incoming" if incoming else "outgoing"]
+        # Аргументы позиционные: str.format с именованными заметно медленнее
+        return templates["transaction"](
+            icon,
+            kind,
+            # Сумма переводится из минимальных единиц только здесь, при отображении
+            tx.amount,
+            label,
+            _shorten(tx.from_address if incoming else tx.to_address),
+            date,
+            _shorten(tx.hash),
+            _STATUS_ICONS.get(tx.status, "⚠️") if tx.status is not None else "",
+        )
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "size": len(self._cache)}
+
+
+def _shorten(value: str) -> str:
+    return f"{value[:6]}...{value[-4:]}" if len(value) > 10 else value
+
+
+_STATUS_ICONS = {"success": "✅", "failed": "❌"}
+
+# Шаблоны собираются один раз: на каждую транзакцию остается один вызов str.format
+_TEMPLATES: Dict[str, Dict] = {
+    "ru": {
+        # Иконка, тип, сумма, подпись и адрес контрагента, дата, хеш, статус
+        "transaction": (
+            "{} {}: {:.6f}\n"
+            "   {}: {}\n"
+            "   Дата: {}\n"
+            "   Hash: {} {}"
+        ).format,
+        "incoming": ("📥", "Incoming", "От"),
+        "outgoing": ("📤", "Outgoing", "Кому"),
+        "unknown_date": "Unknown",
+    },
+}
+
+transaction_renderer = TransactionRenderer()
+
+
+def format_wallet_info(address: str, blockchain: str, balance_data: Dict, transactions: List[Transaction], explorer_link: str) -> str:
     """Форматирование полной информации о кошельке"""
-    
-    # Заголовок
-    blockchain_emoji = {
-        'TON': '💎',
-        'ETH': '⟠',
-        'BNB': '🟡'
-    }
-    emoji = blockchain_emoji.get(blockchain, '💼')
-    
-    message = f"{emoji} <b>{blockchain} Кошелек</b>\n\n"
-    
-    # Адрес
-    short_address = f"{address[:8]}...{address[-6:]}"
-    message += f"📍 Адрес: <code>{short_address}</code>\n\n"
-    
-    # Баланс
-    message += format_balance(balance_data) + "\n\n"
-    
-    # Транзакции
+    emoji = BLOCKCHAIN_EMOJI.get(blockchain, '💼')
+    # Блоки разделяются пустой строкой и склеиваются один раз в конце
+    blocks = [
+        f"{emoji} <b>{blockchain} Кошелек</b>",
+        f"📍 Адрес: <code>{address[:8]}...{address[-6:]}</code>",
+        format_balance(balance_data),
+    ]
+
     if transactions:
-        message += "📊 <b>Последние транзакции:</b>\n\n"
-        for i, tx in enumerate(transactions[:5], 1):
-            message += f"{i}. {format_transaction(tx, blockchain)}\n\n"
+        blocks.append("📊 <b>Последние транзакции:</b>")
+        blocks.extend(
+            f"{i}. {format_transaction(tx, blockchain)}" for i, tx in enumerate(transactions[:5], 1)
+        )
     else:
-        message += "📊 Транзакции не найдены\n\n"
-    
-    # Ссылка на explorer
-    message += f'🔗 <a href="{explorer_link}">Смотреть в Explorer</a>'
-    
-    return message
+        blocks.append("📊 Транзакции не найдены")
+
+    blocks.append(f'🔗 <a href="{explorer_link}">Смотреть в Explorer</a>')
+    return "\n\n".join(blocks)
+
+
+def format_portfolio(portfolio: Portfolio, tx_per_chain: int = 3) -> str:
+    """Сводка по адресу во всех сетях с отметкой сетей, где есть активность"""
+    address = portfolio.address
+    lines = [
+        "🧭 <b>Кошелек во всех сетях</b>",
+        "",
+        f"📍 Адрес: <code>{address[:8]}...{address[-6:]}</code>",
+    ]
+    active = portfolio.active_chains
+    if active:
+        names = ", ".join(f"{BLOCKCHAIN_EMOJI.get(name, '💼')} {name}" for name in active)
+        lines.append(f"🔥 Активность: {names}")
+    else:
+        lines.append("💤 Активность не найдена")
+
+    for view in portfolio.chains:
+        emoji = BLOCKCHAIN_EMOJI.get(view.blockchain, '💼')
+        if not view.complete:
+            mark = "⏳ данные получены не полностью"
+        elif view.active:
+            mark = "✅ есть активность"
+        else:
+            mark = "▫️ нет активности"
+        lines.append("")
+        lines.append(f"{emoji} <b>{view.blockchain}</b> — {mark}")
+        if view.balance_data is not None:
+            lines.append(format_balance(view.balance_data))
+        if view.transactions:
+            lines.extend(
+                f"{i}. {format_transaction(tx, view.blockchain)}"
+                for i, tx in enumerate(view.transactions[:tx_per_chain], 1)
+            )
+        lines.append(f'🔗 <a href="{view.explorer_link}">Смотреть в Explorer</a>')
+
+    return "\n".join(lines)
+
+
+def telegram_length(text: str) -> int:
+    """Длина текста так, как ее считает Telegram: в единицах UTF-16 (эмодзи — две)"""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def split_message(text: str, limit: int = TELEGRAM_MESSAGE_LIMIT) -> List[str]:
+    """Разбиение сообщения на части не длиннее limit (в единицах UTF-16)
+
+    Режем по границам блоков (пустая строка), затем по строкам, чтобы не
+    разрывать HTML-теги; строка длиннее limit режется жестко. Длины частей
+    считаются один раз, а каждая часть склеивается один раз.
+    """
+    if len(text) <= limit // 2 or telegram_length(text) <= limit:
+        return [text]
+    blocks = []
+    for block in text.split("\n\n"):
+        length = telegram_length(block)
+        if length <= limit:
+            blocks.append((block, length))
+        else:
+            lines = [chunk for line in block.split("\n") for chunk in _split_long_line(line, limit)]
+            blocks.extend(_pack(lines, "\n", limit))
+    return [part for part, _ in _pack(blocks, "\n\n", limit)]
+
+
+def _split_long_line(line: str, limit: int) -> List[Tuple[str, int]]:
+    length = telegram_length(line)
+    if length <= limit:
+        return [(line, length)]
+    chunks: List[Tuple[str, int]] = []
+    start = size = 0
+    for index, char in enumerate(line):
+        width = 2 if ord(char) > 0xFFFF else 1
+        if size + width > limit:
+            chunks.append((line[start:index], size))
+            start, size = index, 0
+        size += width
+    chunks.append((line[start:], size))
+    return chunks
+
+
+def _pack(pieces: Iterable[Tuple[str, int]], separator: str, limit: int) -> List[Tuple[str, int]]:
+    """Жадная склейка (текст, длина) через separator в части не длиннее limit"""
+    packed: List[Tuple[str, int]] = []
+    current: List[str] = []
+    current_length = -len(separator)
+    for piece, length in pieces:
+        if current and current_length + len(separator) + length > limit:
+            packed.append((separator.join(current), current_length))
+            current = []
+            current_length = -len(separator)
+        current.append(piece)
+        current_length += len(separator) + length
+    if current:
+        packed.append((separator.join(current), current_length))
+    return packed
@@ -1,46 +1,331 @@
 """
-Сетевые утилиты: простое кэширование и ограничение запросов
+Сетевые утилиты: пул HTTP-соединений, простое кэширование и ограничение запросов
 """
 from __future__ import annotations
 
 import asyncio
+import json
+import logging
+import sys
 import time
-from typing import Any, Optional
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Hashable, Iterable, Optional, TypeVar
+
+import aiohttp
+
+try:
+    import orjson
+except ImportError:  # необязательная зависимость: без нее работает стандартный json
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class HttpClient:
+    """Общий пул HTTP-соединений с keep-alive и кэшированием DNS"""
+
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 10,
+        dns_cache_ttl: int = 300,
+        keepalive_timeout: float = 30.0,
+        timeout_seconds: float = 10.0,
+    ):
+        self._limit = limit
+        self._limit_per_host = limit_per_host
+        self._dns_cache_ttl = dns_cache_ttl
+        self._keepalive_timeout = keepalive_timeout
+        self._timeout = aiohttp.ClientTimeout(total=timeout_seconds)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.requests = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+
+    async def start(self) -> None:
+        if self._session is not None and not self._session.closed:
+            return
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(self._on_request_start)
+        trace_config.on_connection_create_end.append(self._on_connection_created)
+        trace_config.on_connection_reuseconn.append(self._on_connection_reused)
+        connector = aiohttp.TCPConnector(
+            limit=self._limit,
+            limit_per_host=self._limit_per_host,
+            ttl_dns_cache=self._dns_cache_ttl,
+            keepalive_timeout=self._keepalive_timeout,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=self._timeout,
+            trace_configs=[trace_config],
+        )
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """Сессия пула; создается при первом обращении, если start() не вызывался"""
+        if self._session is None or self._session.closed:
+            await self.start()
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "requests": self.requests,
+            "connections_created": self.connections_created,
+            "connections_reused": self.connections_reused,
+        }
+
+    async def _on_request_start(self, session, context, params) -> None:
+        self.requests += 1
+
+    async def _on_connection_created(self, session, context, params) -> None:
+        self.connections_created += 1
+
+    async def _on_connection_reused(self, session, context, params) -> None:
+        self.connections_reused += 1
+
+
+class SingleFlight:
+    """Объединение одинаковых одновременных запросов: все ждут один общий вызов"""
+
+    def __init__(self):
+        self._in_flight: dict[Hashable, asyncio.Future] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[T]]) -> T:
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(factory())
+            self._in_flight[key] = future
+            future.add_done_callback(lambda done: self._forget(key, done))
+            self.executed += 1
+        else:
+            self.coalesced += 1
+        # shield: отмена одного ожидающего не отменяет запрос для остальных
+        return await asyncio.shield(future)
+
+    def _forget(self, key: Hashable, future: asyncio.Future) -> None:
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+        if not future.cancelled():
+            future.exception()  # помечаем исключение как полученное
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._in_flight),
+        }
+
+
+def json_loads(data: bytes | str) -> Any:
+    """Разбор JSON через orjson, если он установлен"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+async def read_json(response: aiohttp.ClientResponse) -> Any:
+    """Тело ответа как JSON без промежуточного декодирования в str"""
+    return json_loads(await response.read())
+
+
+def _estimate_size(value: Any) -> int:
+    """Грубая оценка занимаемой памяти значением кэша в байтах"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_estimate_size(k) + _estimate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(_estimate_size(item) for item in value)
+    elif isinstance(getattr(type(value), "__slots__", None), tuple):
+        size += sum(_estimate_size(getattr(value, name, None)) for name in type(value).__slots__)
+    return size
 
 
 class TTLCache:
-    """Простой in-memory кэш с TTL"""
+    """In-memory кэш с TTL, ограничением размера и LRU-вытеснением
+
+    Истекшие записи удаляются при чтении и фоновым проходом sweep(): очередь
+    сроков жизни упорядочена по времени, поэтому проход стоит O(истекших).
+    """
 
-    def __init__(self, ttl_seconds: int):
+    def __init__(
+        self,
+        ttl_seconds: int,
+        max_entries: Optional[int] = 10_000,
+        max_bytes: Optional[int] = None,
+    ):
         self._ttl_seconds = ttl_seconds
-        self._store: dict[str, tuple[float, Any]] = {}
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._store: OrderedDict[Hashable, tuple[float, Any, int]] = OrderedDict()
+        self._expiry: deque[tuple[float, Hashable]] = deque()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._store)
 
-    def get(self, key: str) -> Optional[Any]:
+    def get(self, key: Hashable) -> Optional[Any]:
         item = self._store.get(key)
-        if not item:
+        if item is None:
+            self.misses += 1
             return None
-        stored_at, value = item
-        if time.monotonic() - stored_at > self._ttl_seconds:
-            self._store.pop(key, None)
+        expires_at, value, _ = item
+        if time.monotonic() >= expires_at:
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
             return None
+        self._store.move_to_end(key)
+        self.hits += 1
         return value
 
-    def set(self, key: str, value: Any) -> None:
-        self._store[key] = (time.monotonic(), value)
+    def set(self, key: Hashable, value: Any) -> None:
+        if key in self._store:
+            self._remove(key)
+        size = _estimate_size(value) if self._max_bytes is not None else 0
+        expires_at = time.monotonic() + self._ttl_seconds
+        self._store[key] = (expires_at, value, size)
+        self._bytes += size
+        self._expiry.append((expires_at, key))
+        while self._store and (
+            (self._max_entries is not None and len(self._store) > self._max_entries)
+            or (self._max_bytes is not None and self._bytes > self._max_bytes)
+        ):
+            _, (_, _, evicted_size) = self._store.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+
+    def sweep(self) -> int:
+        """Удаление истекших записей; возвращает количество удаленных"""
+        now = time.monotonic()
+        removed = 0
+        while self._expiry and self._expiry[0][0] <= now:
+            expires_at, key = self._expiry.popleft()
+            item = self._store.get(key)
+            # Запись могла быть перезаписана или вытеснена — тогда элемент очереди устарел
+            if item is not None and item[0] == expires_at:
+                self._remove(key)
+                removed += 1
+        self.expirations += removed
+        return removed
+
+    def _remove(self, key: Hashable) -> None:
+        _, _, size = self._store.pop(key)
+        self._bytes -= size
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "size": len(self._store),
+            "bytes": self._bytes,
+        }
+
+
+class CacheSweeper:
+    """Фоновая задача, периодически удаляющая истекшие записи из кэшей"""
 
+    def __init__(self, caches: Iterable[TTLCache], interval_seconds: float):
+        self._caches = list(caches)
+        self._interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task] = None
 
-class AsyncRateLimiter:
-    """Минимальный интервал между запросами"""
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
 
-    def __init__(self, min_interval_seconds: float):
-        self._min_interval_seconds = min_interval_seconds
-        self._lock = asyncio.Lock()
-        self._last_call = 0.0
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval_seconds)
+            removed = sum(cache.sweep() for cache in self._caches)
+            if removed:
+                logger.debug("Cache sweeper removed %s expired entries", removed)
+
+
+class QuotaExceededError(Exception):
+    """Исчерпан суточный лимит запросов провайдера"""
+
+
+class TokenBucketRateLimiter:
+    """Token bucket: средняя скорость rate запросов/с, всплески до burst, суточный бюджет
+
+    Токен резервируется синхронно, а ожидание идет вне какой-либо блокировки,
+    поэтому конкурентные корутины не выстраиваются в очередь друг за другом.
+    """
+
+    def __init__(self, rate: float, burst: int = 1, daily_budget: Optional[int] = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self._rate = rate
+        self._burst = max(1, burst)
+        self._daily_budget = daily_budget
+        self._tokens = float(self._burst)
+        self._updated_at = time.monotonic()
+        self._day = time.gmtime().tm_yday
+        self._used_today = 0
+        self.acquired = 0
+        self.wait_seconds_total = 0.0
+
+    def _reserve(self) -> float:
+        """Забирает токен (баланс может уйти в минус) и возвращает время ожидания"""
+        day = time.gmtime().tm_yday
+        if day != self._day:
+            self._day = day
+            self._used_today = 0
+        if self._daily_budget is not None and self._used_today >= self._daily_budget:
+            raise QuotaExceededError(f"daily budget of {self._daily_budget} requests exhausted")
+
+        now = time.monotonic()
+        self._tokens = min(self._burst, self._tokens + (now - self._updated_at) * self._rate)
+        self._updated_at = now
+        self._tokens -= 1
+        self._used_today += 1
+        self.acquired += 1
+        return max(0.0, -self._tokens / self._rate)
+
+    def reconfigure(self, rate: float, burst: int = 1, daily_budget: Optional[int] = None) -> None:
+        """Смена параметров на ходу; накопленные токены урезаются до нового burst"""
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self._rate = rate
+        self._burst = max(1, burst)
+        self._daily_budget = daily_budget
+        self._tokens = min(self._tokens, float(self._burst))
 
     async def wait(self) -> None:
-        async with self._lock:
-            now = time.monotonic()
-            elapsed = now - self._last_call
-            if elapsed < self._min_interval_seconds:
-                await asyncio.sleep(self._min_interval_seconds - elapsed)
-            self._last_call = time.monotonic()
+        delay = self._reserve()
+        if delay > 0:
+            self.wait_seconds_total += delay
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "acquired": self.acquired,
+            "used_today": self._used_today,
+            "daily_budget": self._daily_budget,
+            "wait_seconds_total": round(self.wait_seconds_total, 3),
+        }
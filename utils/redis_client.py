@@ -0,0 +1,137 @@
+"""
+Минимальный асинхронный клиент протокола Redis (RESP2)
+"""
+from __future__ import annotations
+
+import asyncio
+from typing import Any, List, Optional, Sequence
+from urllib.parse import unquote, urlparse
+
+
+class RedisError(Exception):
+    """Ошибка, которую вернул сервер (-ERR ...)"""
+
+
+class RedisClient:
+    """Одно соединение с сервером Redis и сериализованные команды
+
+    Команды отправляются под блокировкой, поэтому ответы не перемешиваются;
+    pipeline() отправляет пачку команд одной записью и читает все ответы.
+    После сетевой ошибки соединение открывается заново при следующей команде.
+    """
+
+    def __init__(self, url: str = "redis://localhost:6379/0", timeout_seconds: float = 5.0):
+        parsed = urlparse(url)
+        self._host = parsed.hostname or "localhost"
+        self._port = parsed.port or 6379
+        self._password = unquote(parsed.password) if parsed.password else None
+        self._db = int(parsed.path.lstrip("/") or 0)
+        self._timeout = timeout_seconds
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock = asyncio.Lock()
+
+    async def close(self) -> None:
+        async with self._lock:
+            await self._disconnect()
+
+    async def execute(self, *args: Any) -> Any:
+        reply = (await self.pipeline([args]))[0]
+        if isinstance(reply, RedisError):
+            raise reply
+        return reply
+
+    async def pipeline(self, commands: Sequence[Sequence[Any]]) -> List[Any]:
+        """Выполнение команд одним обменом; ошибки сервера возвращаются как RedisError в списке"""
+        async with self._lock:
+            return await self._roundtrip(commands)
+
+    async def compare_and_execute(
+        self, key: str, expected: Optional[str], commands: Sequence[Sequence[Any]]
+    ) -> bool:
+        """Выполнение commands в MULTI/EXEC, только если значение key равно expected
+
+        WATCH гарантирует, что между проверкой и записью ключ никто не изменил.
+        """
+        async with self._lock:
+            current = (await self._roundtrip([("WATCH", key), ("GET", key)]))[1]
+            if current != expected:
+                await self._roundtrip([("UNWATCH",)])
+                return False
+            replies = await self._roundtrip([("MULTI",), *commands, ("EXEC",)])
+            return replies[-1] is not None
+
+    async def _roundtrip(self, commands: Sequence[Sequence[Any]]) -> List[Any]:
+        try:
+            if self._writer is None:
+                await self._connect()
+            self._writer.write(b"".join(self._encode(command) for command in commands))
+            await self._writer.drain()
+            return [
+                await asyncio.wait_for(self._read_reply(), self._timeout) for _ in commands
+            ]
+        except BaseException:
+            # Недочитанные ответы сбили бы очередность: соединение открывается заново
+            self._drop()
+            raise
+
+    async def _connect(self) -> None:
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self._host, self._port), self._timeout
+        )
+        handshake = []
+        if self._password:
+            handshake.append(("AUTH", self._password))
+        if self._db:
+            handshake.append(("SELECT", self._db))
+        for command in handshake:
+            self._writer.write(self._encode(command))
+            await self._writer.drain()
+            reply = await asyncio.wait_for(self._read_reply(), self._timeout)
+            if isinstance(reply, RedisError):
+                await self._disconnect()
+                raise reply
+
+    def _drop(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def _disconnect(self) -> None:
+        writer = self._writer
+        self._drop()
+        if writer is not None:
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    @staticmethod
+    def _encode(command: Sequence[Any]) -> bytes:
+        parts = [f"*{len(command)}\r\n".encode()]
+        for arg in command:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(parts)
+
+    async def _read_reply(self) -> Any:
+        line = await self._reader.readuntil(b"\r\n")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            return RedisError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = await self._reader.readexactly(length + 2)
+            return data[:-2].decode()
+        if kind == b"*":
+            length = int(payload)
+            if length < 0:
+                return None
+            return [await self._read_reply() for _ in range(length)]
+        raise RedisError(f"Unexpected reply: {line!r}")
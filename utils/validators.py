@@ -1,12 +1,16 @@
 """
-Валидация адресов кошельков и определение блокчейна
+Валидация адресов кошельков, определение блокчейна и канонические ключи адресов
 """
 from __future__ import annotations
 
+import base64
+import binascii
 import re
+from typing import Optional
 
 _ETH_ADDRESS_RE = re.compile(r"^0x[a-fA-F0-9]{40}$")
 _TON_ADDRESS_RE = re.compile(r"^(EQ|UQ)[A-Za-z0-9_-]{46}$")
+_TON_RAW_ADDRESS_RE = re.compile(r"^-?\d{1,3}:[a-fA-F0-9]{64}$")
 
 
 def is_valid_eth_address(address: str) -> bool:
@@ -14,9 +18,17 @@ def is_valid_eth_address(address: str) -> bool:
     return bool(_ETH_ADDRESS_RE.match(address))
 
 
+def _ton_raw_workchain(address: str) -> Optional[int]:
+    """Workchain raw-адреса TON или None, если адрес не raw либо workchain не помещается в int8"""
+    if not _TON_RAW_ADDRESS_RE.match(address):
+        return None
+    workchain = int(address.split(":", 1)[0])
+    return workchain if -128 <= workchain <= 127 else None
+
+
 def is_valid_ton_address(address: str) -> bool:
-    """Проверка валидности адреса TON"""
-    return bool(_TON_ADDRESS_RE.match(address))
+    """Проверка валидности адреса TON (EQ.../UQ... или raw 0:hex)"""
+    return bool(_TON_ADDRESS_RE.match(address)) or _ton_raw_workchain(address) is not None
 
 
 def detect_blockchain(address: str) -> str:
@@ -26,3 +38,43 @@ def detect_blockchain(address: str) -> str:
     if is_valid_eth_address(address):
         return "ETH"
     return "UNKNOWN"
+
+
+def ton_address_key(address: str) -> Optional[bytes]:
+    """33 байта TON-адреса: workchain (int8) и 32 байта хеша аккаунта
+
+    Одинаков для bounceable (EQ), non-bounceable (UQ) и raw-формы (0:hex).
+    Контрольная сумма user-friendly формы не проверяется: адрес проверяет API.
+    """
+    if ":" in address:
+        workchain = _ton_raw_workchain(address)
+        if workchain is None:
+            return None
+        return workchain.to_bytes(1, "big", signed=True) + bytes.fromhex(address.split(":", 1)[1])
+    try:
+        # Формат: флаги (1 байт), workchain (1), хеш (32), crc16 (2)
+        data = base64.urlsafe_b64decode(address.replace("+", "-").replace("/", "_"))
+    except (binascii.Error, ValueError):
+        return None
+    if len(data) != 36:
+        return None
+    return data[1:34]
+
+
+def evm_address_key(address: str) -> Optional[bytes]:
+    """20 байт EVM-адреса независимо от регистра (checksum-форма и нижний регистр совпадают)"""
+    if not address or len(address) != 42 or not address.startswith(("0x", "0X")):
+        return None
+    try:
+        return bytes.fromhex(address[2:])
+    except ValueError:
+        return None
+
+
+def address_key(blockchain: str, address: str) -> bytes:
+    """Канонический ключ адреса в сети: разные записи одного кошелька дают один ключ
+
+    Нераспознанный адрес остается строкой как есть (в байтах), чтобы ключ был всегда.
+    """
+    key = ton_address_key(address) if blockchain == "TON" else evm_address_key(address)
+    return key if key is not None else address.encode()